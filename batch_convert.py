@@ -0,0 +1,164 @@
+import os
+import sys
+import glob
+import time
+import argparse
+
+from conversion_pool import CONVERTERS, ConversionPool
+from ride_archive import RideArchive
+from ride_index import RideIndex
+from recording import RECORDING_MODES
+
+# Exit codes
+EXIT_OK = 0
+EXIT_FAILURES = 1   # some files could not be converted
+EXIT_NO_INPUT = 2   # nothing matched (argparse also uses 2 for usage errors)
+
+def find_inputs(patterns, recursive=False):
+    """Expand files, directories and glob patterns into a sorted, de-duplicated list of PWX paths."""
+    found = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            if recursive:
+                for root, _, files in os.walk(pattern):
+                    found.extend(os.path.join(root, name) for name in files if name.lower().endswith('.pwx'))
+            else:
+                found.extend(entry.path for entry in os.scandir(pattern)
+                             if entry.is_file() and entry.name.lower().endswith('.pwx'))
+        elif os.path.isfile(pattern):
+            found.append(pattern)
+        else:
+            found.extend(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+
+    seen = set()
+    inputs = []
+    for path in sorted(found):
+        key = os.path.realpath(path)
+        if key not in seen:
+            seen.add(key)
+            inputs.append(path)
+    return inputs
+
+def parse_formats(value):
+    formats = tuple(fmt.strip().lower() for fmt in value.split(',') if fmt.strip())
+    unknown = [fmt for fmt in formats if fmt not in CONVERTERS]
+    if not formats or unknown:
+        raise argparse.ArgumentTypeError(
+            f"expected a comma-separated list of {', '.join(sorted(CONVERTERS))}, got '{value}'")
+    return formats
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description='Convert many PWX files to TCX/FIT at once (e.g. to backfill an archive).')
+    parser.add_argument('inputs', nargs='+',
+                        help='PWX files, directories or glob patterns (quote globs, ** is supported)')
+    parser.add_argument('-o', '--output-dir', default='converted',
+                        help='Directory for the converted files (default: ./converted)')
+    parser.add_argument('-f', '--formats', type=parse_formats, default=('tcx', 'fit'),
+                        help='Comma-separated output formats (default: tcx,fit)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='Number of files to convert in parallel (default: CPU count)')
+    parser.add_argument('-r', '--recursive', action='store_true',
+                        help='Search directories recursively')
+    parser.add_argument('--strava', action='store_true',
+                        help='Write Strava-optimized output (static GPS, virtual ride)')
+    parser.add_argument('-z', '--gzip', action='store_true',
+                        help='Write gzip-compressed output (.tcx.gz, .fit.gz)')
+    parser.add_argument('--compact-fit', action='store_true',
+                        help='Write smaller FIT files using compressed timestamp records')
+    parser.add_argument('--recording', choices=RECORDING_MODES, default='every',
+                        help='Points to write: every sample, one per --interval (rate), or smart (default: every)')
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help='Seconds between points with --recording rate (default: 1)')
+    parser.add_argument('--archive', metavar='DIR',
+                        help='Also add each ride\'s samples to the ride archive in DIR')
+    parser.add_argument('--index', metavar='FILE',
+                        help='Also add each ride\'s summary to the ride index in FILE')
+    parser.add_argument('--rider', help='Rider for rides whose PWX has no athlete name (with --index)')
+    parser.add_argument('--skip-existing', action='store_true',
+                        help='Leave rides alone if their outputs are already in the output directory')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='Show the full converter output for each file')
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.interval <= 0:
+        parser.error("--interval must be positive")
+
+    inputs = find_inputs(args.inputs, recursive=args.recursive)
+    if not inputs:
+        print("No PWX files found.")
+        return EXIT_NO_INPUT
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    jobs = max(1, min(args.jobs, len(inputs)))
+    print(f"Converting {len(inputs)} file(s) to {', '.join(args.formats).upper()} "
+          f"in {args.output_dir} with {jobs} job(s)...")
+    sys.stdout.flush()
+
+    archive = RideArchive(args.archive) if args.archive else None
+    ride_index = RideIndex(args.index) if args.index else None
+    converted = skipped = failed = samples = 0
+    written_by = {}  # output base name -> input that produced it
+    start = time.perf_counter()
+    pool = ConversionPool(jobs)
+    try:
+        results = pool.run(inputs, args.output_dir, formats=args.formats,
+                           strava_optimized=args.strava, compress=args.gzip, capture_output=True,
+                           skip_existing=args.skip_existing, archive_dir=args.archive,
+                           recording=args.recording, recording_interval=args.interval,
+                           compact_fit=args.compact_fit)
+        for index, (input_path, result) in enumerate(results, 1):
+            prefix = f"[{index}/{len(inputs)}] {input_path}"
+            if args.verbose and result.log:
+                sys.stdout.write(result.log)
+            if result.ok and result.skipped:
+                skipped += 1
+                print(f"{prefix} skipped, {result.base_name} already converted")
+            elif result.ok:
+                converted += 1
+                samples += result.sample_count
+                names = ', '.join(os.path.basename(path) for path in result.outputs.values())
+                print(f"{prefix} -> {names}")
+                if archive is not None and result.archive:
+                    archive.add(result.archive)
+                if ride_index is not None and result.summary:
+                    ride_index.add(result.summary, filename=os.path.basename(input_path), rider=args.rider)
+                # Outputs are named after the ride start, so two inputs for the same ride collide
+                if result.base_name in written_by:
+                    print(f"  WARNING: same ride start as {written_by[result.base_name]}, its outputs were overwritten")
+                written_by[result.base_name] = input_path
+            else:
+                failed += 1
+                errors = [result.error] if result.error else [f"{fmt.upper()}: {msg}" for fmt, msg in result.errors.items()]
+                print(f"{prefix} FAILED: {'; '.join(errors)}")
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        print("\nInterrupted.")
+        failed += len(inputs) - converted - skipped - failed
+        # Don't wait for the rest of the queue, only for the rides already in a worker
+        pool.close(cancel=True)
+    finally:
+        pool.close()
+        if ride_index is not None:
+            ride_index.close()
+
+    elapsed = time.perf_counter() - start
+    rate = elapsed if elapsed > 0 else 1e-9
+    print("\nBatch Conversion Summary:")
+    print("--------------------")
+    print(f"Converted: {converted}")
+    if skipped:
+        print(f"Skipped:   {skipped}")
+    print(f"Failed:    {failed}")
+    print(f"Samples:   {samples}")
+    print(f"Time:      {elapsed:.2f}s")
+    print(f"Rate:      {converted / rate:.1f} files/s, {samples / rate:,.0f} samples/s")
+    print("--------------------")
+
+    return EXIT_FAILURES if failed else EXIT_OK
+
+if __name__ == "__main__":
+    sys.exit(main())
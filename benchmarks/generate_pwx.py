@@ -0,0 +1,110 @@
+"""Generate synthetic Velotron PWX rides for benchmarking.
+
+Rides follow a rolling course with noisy barometric altitude, a wandering power
+target, heart rate that lags the effort, and samples that randomly drop channels
+the way real Velotron exports do. The same arguments always produce the same file.
+
+    python benchmarks/generate_pwx.py ride.pwx --hours 6 --hz 4
+"""
+import os
+import sys
+import math
+import random
+import argparse
+import datetime
+
+ALL_CHANNELS = ('alt', 'dist', 'hr', 'cad', 'pwr', 'spd')
+
+def generate_pwx(path, hours=1.0, hz=1, seed=0, start=datetime.datetime(2025, 12, 3, 5, 48, 22),
+                 channels=ALL_CHANNELS, drop_rate=0.02, altitude_noise=0.3, with_summary=True):
+    """Write a synthetic ride to `path` and return the number of samples.
+
+    `channels` lists the channels the "device" records at all (leave out 'hr' for a
+    ride without a strap); each recorded channel is then missing from a sample with
+    probability `drop_rate`. `altitude_noise` is the standard deviation in meters of
+    the jitter added to the course profile.
+    """
+    rng = random.Random(seed)
+    count = int(hours * 3600 * hz)
+    step = 1.0 / hz
+    duration = (count - 1) * step if count else 0.0
+
+    power = 200.0
+    heart_rate = 95.0
+    distance = 0.0
+    base_altitude = 1600.0
+
+    with open(path, 'w', encoding='utf-8', buffering=1024 * 1024) as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n')
+        f.write('<pwx version="1.0" xmlns="http://www.peaksware.com/PWX/1/0">\n')
+        f.write('  <workout>\n')
+        f.write('    <athlete><name>Bench Rider</name></athlete>\n')
+        f.write('    <sportType>Bike</sportType>\n')
+        f.write(f'    <time>{start.strftime("%Y-%m-%dT%H:%M:%S")}</time>\n')
+        if with_summary:
+            f.write('    <summarydata>\n')
+            f.write('      <beginning>0</beginning>\n')
+            f.write(f'      <duration>{duration:.1f}</duration>\n')
+            f.write('    </summarydata>\n')
+
+        lines = []
+        for i in range(count):
+            t = i * step
+
+            # Power wanders around a target that changes every few minutes
+            target = 180 + 80 * math.sin(t / 900.0) + 40 * math.sin(t / 97.0)
+            power += (target - power) * 0.05 * step + rng.gauss(0, 12) * math.sqrt(step)
+            power = max(0.0, power)
+            heart_rate += ((90 + power * 0.3) - heart_rate) * 0.02 * step
+            cadence = max(0.0, 70 + power * 0.07 + rng.gauss(0, 3))
+
+            grade = 0.04 * math.sin(distance / 1500.0)
+            speed = max(1.0, 11.5 - grade * 120 + (power - 200) * 0.015 + rng.gauss(0, 0.2))
+            distance += speed * step
+            altitude = base_altitude + 60 * math.sin(distance / 1500.0) + rng.gauss(0, altitude_noise)
+
+            values = {
+                'alt': f"{altitude:.1f}",
+                'dist': f"{distance:.3f}",
+                'hr': f"{heart_rate:.0f}",
+                'cad': f"{cadence:.1f}",
+                'pwr': f"{power:.0f}",
+                'spd': f"{speed:.3f}",
+            }
+            parts = [f'    <sample><timeoffset>{t:.2f}</timeoffset>']
+            for channel in ALL_CHANNELS:
+                if channel in channels and rng.random() >= drop_rate:
+                    parts.append(f'<{channel}>{values[channel]}</{channel}>')
+            parts.append('</sample>\n')
+            lines.append(''.join(parts))
+
+            if len(lines) >= 4096:
+                f.write(''.join(lines))
+                lines = []
+
+        f.write(''.join(lines))
+        f.write('  </workout>\n')
+        f.write('</pwx>\n')
+
+    return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic PWX ride for benchmarks.')
+    parser.add_argument('output', help='Path of the PWX file to write')
+    parser.add_argument('--hours', type=float, default=1.0, help='Ride length in hours (default: 1)')
+    parser.add_argument('--hz', type=int, default=1, help='Samples per second (default: 1)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    parser.add_argument('--channels', default=','.join(ALL_CHANNELS),
+                        help='Comma-separated channels the device records (default: all)')
+    parser.add_argument('--drop-rate', type=float, default=0.02,
+                        help='Chance that a recorded channel is missing from a sample (default: 0.02)')
+    args = parser.parse_args(argv)
+
+    channels = tuple(channel.strip() for channel in args.channels.split(',') if channel.strip())
+    count = generate_pwx(args.output, hours=args.hours, hz=args.hz, seed=args.seed,
+                         channels=channels, drop_rate=args.drop_rate)
+    print(f"Wrote {count} samples ({os.path.getsize(args.output) / 1e6:.1f} MB) to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
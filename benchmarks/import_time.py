@@ -0,0 +1,89 @@
+"""Measure how long the monitor takes to import, and check it against a budget.
+
+Each run imports monitor_and_convert in a fresh interpreter with -X importtime and
+the best of --repeat runs is kept. The run fails if the import takes longer than
+--budget-ms, or if any module that should only load on first use (the HTTP client,
+the XML parser, multiprocessing, ...) was imported.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --budget-ms 80 --top 15
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+MODULE = 'monitor_and_convert'
+DEFAULT_BUDGET_MS = 100
+
+# Modules the monitor must not import until they are needed
+DEFERRED_MODULES = (
+    'requests',               # only with Strava configured
+    'urllib3',
+    'fit_tool',               # only for the reference FIT encoder
+    'multiprocessing',        # only with more than one worker
+    'xml.etree.ElementTree',  # on the first ride
+    'http.server',            # only with METRICS_PORT set
+)
+
+def parse_importtime(stderr):
+    """Parse -X importtime output into {module: (self_us, cumulative_us)}."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            continue  # the header line
+        modules[fields[2].strip()] = (self_us, cumulative_us)
+    return modules
+
+def measure(module=MODULE, python=sys.executable):
+    """Import `module` in a fresh interpreter; returns {module: (self_us, cumulative_us)}."""
+    env = dict(os.environ)
+    # Keep Strava off so the run measures the same path on every machine
+    for name in ('STRAVA_CLIENT_ID', 'STRAVA_CLIENT_SECRET', 'STRAVA_REFRESH_TOKEN'):
+        env.pop(name, None)
+    completed = subprocess.run([python, '-X', 'importtime', '-c', f'import {module}'], cwd=REPO_DIR,
+                               env=env, capture_output=True, text=True, check=True)
+    return parse_importtime(completed.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the import time of the monitor.')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help=f'Fail if the import takes longer than this (default: {DEFAULT_BUDGET_MS})')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs, best is kept (default: 5)')
+    parser.add_argument('--top', type=int, default=10, help='Slowest modules to list (default: 10)')
+    args = parser.parse_args(argv)
+
+    best = None
+    for _ in range(max(1, args.repeat)):
+        modules = measure()
+        if best is None or modules[MODULE][1] < best[MODULE][1]:
+            best = modules
+
+    total_ms = best[MODULE][1] / 1000
+    print(f"Slowest modules (self time) importing {MODULE}:")
+    for name, (self_us, cumulative_us) in sorted(best.items(), key=lambda item: -item[1][0])[:args.top]:
+        print(f"  {name:<40} {self_us / 1000:>7.1f} ms  (cumulative {cumulative_us / 1000:.1f} ms)")
+    print(f"\nimport {MODULE}: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    failed = False
+    loaded = [name for name in DEFERRED_MODULES if name in best]
+    if loaded:
+        print(f"FAIL: imported at startup but should load on first use: {', '.join(loaded)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"FAIL: over budget by {total_ms - args.budget_ms:.1f} ms")
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
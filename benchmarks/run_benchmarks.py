@@ -0,0 +1,241 @@
+"""Benchmark PWX parsing, TCX writing and FIT writing on synthetic rides.
+
+Each scenario is generated once into benchmarks/.cache and then timed (best of
+--repeat runs) for read_pwx, convert_pwx_to_tcx and convert_pwx_to_fit. Peak
+Python memory for each stage is measured in a separate tracemalloc run so tracing
+does not skew the timings. Results are written to benchmarks/results/<commit>.json;
+pass --compare with an earlier results file or commit to see the difference.
+
+    python benchmarks/run_benchmarks.py --quick
+    python benchmarks/run_benchmarks.py --compare 1a2b3c4 --fail-on-regression
+"""
+import os
+import sys
+import io
+import json
+import glob
+import time
+import argparse
+import platform
+import datetime
+import contextlib
+import subprocess
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from generate_pwx import generate_pwx
+from pwx_reader import read_pwx
+from convert_pwx_to_tcx import convert_pwx_to_tcx
+from convert_pwx_to_fit import convert_pwx_to_fit
+
+CACHE_DIR = os.path.join(BENCH_DIR, '.cache')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+# Bump when generate_pwx output changes so cached rides are regenerated
+GENERATOR_VERSION = 1
+
+# name -> generate_pwx arguments
+SCENARIOS = {
+    '1h-1hz': dict(hours=1, hz=1),
+    '1h-4hz': dict(hours=1, hz=4),
+    '1h-1hz-sparse': dict(hours=1, hz=1, channels=('alt', 'dist', 'cad', 'spd'), drop_rate=0.15),
+    '6h-1hz': dict(hours=6, hz=1),
+    '6h-4hz': dict(hours=6, hz=4),
+    '24h-1hz': dict(hours=24, hz=1),
+    '24h-4hz': dict(hours=24, hz=4),
+}
+QUICK_SCENARIOS = ('1h-1hz', '1h-4hz', '1h-1hz-sparse')
+
+# metric -> True if bigger is better
+METRICS = {
+    'parse_samples_per_s': True,
+    'tcx_samples_per_s': True,
+    'fit_samples_per_s': True,
+    'parse_peak_mb': False,
+    'tcx_peak_mb': False,
+    'fit_peak_mb': False,
+}
+
+def ride_path(name):
+    """Generate the scenario's ride if it is not cached yet, and return its path."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f"{name}-v{GENERATOR_VERSION}.pwx")
+    if not os.path.exists(path):
+        print(f"  generating {name}...", flush=True)
+        tmp_path = path + '.tmp'
+        generate_pwx(tmp_path, **SCENARIOS[name])
+        os.replace(tmp_path, path)
+    return path
+
+def best_time(func, repeat):
+    """Fastest of `repeat` calls, with the converters' progress output silenced."""
+    best = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def peak_memory(path, tcx_path, fit_path):
+    """Peak traced memory in MB for parse, TCX write and FIT write."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        tracemalloc.start()
+        try:
+            ride = read_pwx(path)
+            parse_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+            convert_pwx_to_tcx(path, tcx_path, ride=ride)
+            tcx_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+            convert_pwx_to_fit(path, fit_path, ride=ride)
+            fit_peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return parse_peak / 1e6, tcx_peak / 1e6, fit_peak / 1e6
+
+def run_scenario(name, repeat, out_dir):
+    path = ride_path(name)
+    tcx_path = os.path.join(out_dir, f"{name}.tcx")
+    fit_path = os.path.join(out_dir, f"{name}.fit")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        ride = read_pwx(path)
+    samples = len(ride.samples)
+
+    parse_s = best_time(lambda: read_pwx(path), repeat)
+    tcx_s = best_time(lambda: convert_pwx_to_tcx(path, tcx_path, ride=ride), repeat)
+    fit_s = best_time(lambda: convert_pwx_to_fit(path, fit_path, ride=ride), repeat)
+    parse_peak, tcx_peak, fit_peak = peak_memory(path, tcx_path, fit_path)
+
+    return {
+        'samples': samples,
+        'pwx_bytes': os.path.getsize(path),
+        'tcx_bytes': os.path.getsize(tcx_path),
+        'fit_bytes': os.path.getsize(fit_path),
+        'parse_s': parse_s,
+        'tcx_s': tcx_s,
+        'fit_s': fit_s,
+        'parse_samples_per_s': samples / parse_s,
+        'tcx_samples_per_s': samples / tcx_s,
+        'fit_samples_per_s': samples / fit_s,
+        'parse_peak_mb': parse_peak,
+        'tcx_peak_mb': tcx_peak,
+        'fit_peak_mb': fit_peak,
+    }
+
+def git_commit():
+    """(short commit hash, dirty) for the working tree, or ('unknown', False) outside git."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short=12', 'HEAD'], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        return commit, bool(status)
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+
+def load_results(reference):
+    """Load a results file by path, or by (a prefix of) the commit it was recorded at."""
+    if os.path.isfile(reference):
+        with open(reference) as f:
+            return json.load(f)
+    matches = sorted(glob.glob(os.path.join(RESULTS_DIR, f"{reference}*.json")))
+    if not matches:
+        raise FileNotFoundError(f"No benchmark results found for '{reference}' in {RESULTS_DIR}")
+    # Prefer a clean run over a -dirty one for the same commit
+    matches.sort(key=lambda path: path.endswith('-dirty.json'))
+    with open(matches[0]) as f:
+        return json.load(f)
+
+def compare(baseline, current, threshold):
+    """Print metric changes per scenario; return the list of regressions beyond `threshold`."""
+    regressions = []
+    print(f"\nComparison with {baseline['commit']}{' (dirty)' if baseline.get('dirty') else ''}:")
+    print(f"{'scenario':<16} {'metric':<22} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in current['scenarios'].items():
+        base = baseline['scenarios'].get(name)
+        if not base:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            if metric not in base or not base[metric]:
+                continue
+            change = (result[metric] - base[metric]) / base[metric]
+            worse = -change if higher_is_better else change
+            flag = ''
+            if worse > threshold:
+                flag = '  REGRESSION'
+                regressions.append((name, metric, change))
+            print(f"{name:<16} {metric:<22} {base[metric]:>12.1f} {result[metric]:>12.1f} {change:>+7.1%}{flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the PWX converters on synthetic rides.')
+    parser.add_argument('--scenarios', help=f"Comma-separated scenarios (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument('--quick', action='store_true', help='Only run the 1 hour scenarios')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per stage, best is kept (default: 3)')
+    parser.add_argument('--output', help='Results file (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', help='Results file or commit to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative change counted as a regression (default: 0.10)')
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help='Exit with status 1 if any metric regressed beyond the threshold')
+    args = parser.parse_args(argv)
+
+    if args.scenarios:
+        names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+        unknown = [name for name in names if name not in SCENARIOS]
+        if unknown:
+            parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    elif args.quick:
+        names = list(QUICK_SCENARIOS)
+    else:
+        names = list(SCENARIOS)
+
+    baseline = load_results(args.compare) if args.compare else None
+
+    commit, dirty = git_commit()
+    results = {
+        'commit': commit,
+        'dirty': dirty,
+        'recorded_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': f"{platform.system()} {platform.machine()}",
+        'repeat': args.repeat,
+        'scenarios': {},
+    }
+
+    out_dir = os.path.join(CACHE_DIR, 'out')
+    os.makedirs(out_dir, exist_ok=True)
+    print(f"{'scenario':<16} {'samples':>9} {'parse/s':>11} {'tcx/s':>11} {'fit/s':>11} {'peak MB (parse/tcx/fit)':>24}")
+    for name in names:
+        result = run_scenario(name, args.repeat, out_dir)
+        results['scenarios'][name] = result
+        peaks = f"{result['parse_peak_mb']:.1f}/{result['tcx_peak_mb']:.1f}/{result['fit_peak_mb']:.1f}"
+        print(f"{name:<16} {result['samples']:>9} {result['parse_samples_per_s']:>11,.0f} "
+              f"{result['tcx_samples_per_s']:>11,.0f} {result['fit_samples_per_s']:>11,.0f} {peaks:>24}",
+              flush=True)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{commit}{'-dirty' if dirty else ''}.json")
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if baseline:
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+            if args.fail_on_regression:
+                return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+import os
+import io
+import time
+import importlib
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+from output_files import output_name
+from input_staging import mapped_input
+from ride_index import ride_stats
+from recording import recorded_samples
+
+# Output format -> (module, function). The converters are imported on first use so
+# the monitor starts without loading the XML and FIT stacks.
+CONVERTERS = {
+    'tcx': ('convert_pwx_to_tcx', 'convert_pwx_to_tcx'),
+    'fit': ('convert_pwx_to_fit', 'convert_pwx_to_fit'),
+}
+
+def get_converter(fmt):
+    """The converter function for an output format."""
+    module, name = CONVERTERS[fmt]
+    return getattr(importlib.import_module(module), name)
+
+class ConversionResult:
+    """Outcome of converting one PWX file. Picklable so it can come back from a worker."""
+
+    def __init__(self, input_path):
+        self.input_path = input_path
+        self.base_name = None
+        self.sample_count = 0
+        self.outputs = {}   # format -> output path
+        self.errors = {}    # format -> error message
+        self.error = None   # set if the PWX itself could not be read
+        self.fingerprint = None
+        self.skipped = False  # fingerprint was already known, nothing written
+        self.log = ""       # captured converter output (only when capture_output is set)
+        self.timings = {}   # stage ('parse', 'tcx', 'fit', 'archive', 'curve') -> seconds
+        self.archive = None  # manifest entry of the ride's columns in the ride archive
+        self.summary = None  # ride_stats() of the ride, for the ride index
+        self.curve = None    # power/HR curve of an archived ride, for the all-time curve
+
+    @property
+    def ok(self):
+        return self.error is None and not self.errors
+
+def convert_ride(input_path, output_dir, formats=('tcx', 'fit'), strava_optimized=False,
+                 concurrent_outputs=True, capture_output=False, skip_fingerprints=(), skip_existing=False,
+                 compress=False, archive_dir=None, recording='every', recording_interval=1.0,
+                 compact_fit=False):
+    """Parse a PWX file once and write each requested output format into `output_dir`.
+
+    With `concurrent_outputs` the formats are written on separate threads so slow
+    writes to a network share overlap. Errors are recorded on the result rather than
+    raised, so one bad file never takes down a worker. Rides whose fingerprint is in
+    `skip_fingerprints` are parsed but not written; the result is marked `skipped`.
+    With `skip_existing`, a ride whose outputs are all already in `output_dir` is also
+    marked `skipped`, with those files as its outputs. With `compress` the outputs are
+    gzipped (.tcx.gz, .fit.gz). With `archive_dir` the decoded samples are also written
+    to that ride archive, and `result.archive` is the entry to add to its manifest and
+    `result.curve` the ride's power/HR curve (see power_curve.py).
+    Converted rides also get `result.summary`, their row for the ride index.
+    `recording` ('every', 'rate' or 'smart', see recording.py) thins out the points
+    written to TCX/FIT; the ride totals, summary and archive keep every sample.
+    `compact_fit` writes FIT records with compressed timestamp headers.
+    """
+    from pwx_reader import read_pwx
+
+    result = ConversionResult(input_path)
+    buffer = io.StringIO() if capture_output else None
+
+    with contextlib.redirect_stdout(buffer) if capture_output else contextlib.nullcontext():
+        start = time.perf_counter()
+        try:
+            # Parsed from a memory map rather than through many small reads
+            with mapped_input(input_path) as source:
+                ride = read_pwx(source)
+        except Exception as e:
+            result.error = f"Error parsing PWX file: {e}"
+        else:
+            result.timings['parse'] = time.perf_counter() - start
+            result.base_name = ride.base_name
+            result.sample_count = len(ride.samples)
+            result.fingerprint = ride.fingerprint
+            if result.fingerprint in skip_fingerprints:
+                result.skipped = True
+                formats = ()
+            elif skip_existing:
+                existing = {fmt: os.path.join(output_dir, output_name(ride.base_name, fmt, compress))
+                            for fmt in formats}
+                if all(os.path.exists(path) for path in existing.values()):
+                    result.skipped = True
+                    result.outputs.update(existing)
+                    formats = ()
+
+            points = recorded_samples(ride.samples, recording, recording_interval) if formats else ride.samples
+            if points is not ride.samples:
+                print(f"{recording.capitalize()} recording: writing {len(points)} of {len(ride.samples)} samples")
+
+            def write(fmt):
+                output_path = os.path.join(output_dir, output_name(ride.base_name, fmt, compress))
+                write_start = time.perf_counter()
+                options = {'compact': True} if fmt == 'fit' and compact_fit else {}
+                get_converter(fmt)(input_path, output_path, strava_optimized=strava_optimized, ride=ride,
+                                   points=points, **options)
+                result.timings[fmt] = time.perf_counter() - write_start
+                return output_path
+
+            if concurrent_outputs and len(formats) > 1:
+                with ThreadPoolExecutor(max_workers=len(formats)) as threads:
+                    futures = {fmt: threads.submit(write, fmt) for fmt in formats}
+                outcomes = {}
+                for fmt, future in futures.items():
+                    try:
+                        outcomes[fmt] = (future.result(), None)
+                    except Exception as e:
+                        outcomes[fmt] = (None, e)
+            else:
+                outcomes = {}
+                for fmt in formats:
+                    try:
+                        outcomes[fmt] = (write(fmt), None)
+                    except Exception as e:
+                        outcomes[fmt] = (None, e)
+
+            for fmt in formats:
+                output_path, error = outcomes[fmt]
+                if error is None:
+                    result.outputs[fmt] = output_path
+                else:
+                    result.errors[fmt] = str(error)
+
+            if not result.skipped:
+                result.summary = ride_stats(ride)
+
+            if archive_dir and not result.skipped:
+                from ride_archive import write_ride
+                archive_start = time.perf_counter()
+                try:
+                    result.archive = write_ride(ride, archive_dir)
+                    result.timings['archive'] = time.perf_counter() - archive_start
+                except Exception as e:
+                    # The archive is for analysis; a failure there never fails the conversion
+                    print(f"Warning: could not archive ride samples: {e}")
+                else:
+                    from power_curve import samples_curve
+                    curve_start = time.perf_counter()
+                    try:
+                        result.curve = samples_curve(ride.samples)
+                        result.timings['curve'] = time.perf_counter() - curve_start
+                    except Exception as e:
+                        print(f"Warning: could not compute the power curve: {e}")
+
+    if buffer is not None:
+        result.log = buffer.getvalue()
+    return result
+
+def finished(future):
+    """Whether a future completed with a result."""
+    return future.done() and not future.cancelled() and future.exception() is None
+
+def worker_failed(input_path, error):
+    """The result for a ride whose worker process failed, treated like a failed read."""
+    result = ConversionResult(input_path)
+    result.error = f"Conversion worker failed: {error}"
+    return result
+
+class ConversionPool:
+    """Convert several PWX files at once in worker processes.
+
+    `run()` yields results in the order the inputs were given, so callers can move
+    files and upload rides in a predictable order even though conversions finish out
+    of order. With one worker everything runs inline in the current process.
+    """
+
+    def __init__(self, workers=1):
+        self.workers = max(1, int(workers))
+        self.executor = None
+        if self.workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def run(self, input_paths, output_dir, **kwargs):
+        """Convert each input; yields (input_path, ConversionResult) in input order."""
+        if self.executor is None:
+            for input_path in input_paths:
+                yield input_path, convert_ride(input_path, output_dir, **kwargs)
+            return
+
+        from concurrent.futures.process import BrokenProcessPool
+
+        # Worker output is captured and handed back so logs from parallel rides don't interleave
+        kwargs.setdefault('capture_output', True)
+        futures = self._submit(input_paths, output_dir, kwargs)
+        retried = False
+        position = 0
+        while position < len(futures):
+            input_path, future = futures[position]
+            try:
+                result = future.result()
+            except BrokenProcessPool as e:
+                if not retried:
+                    # A worker died (e.g. out of memory) and took every unfinished ride
+                    # with it; try those once more on a fresh pool
+                    retried = True
+                    self._restart()
+                    futures[position:] = [
+                        (path, pending) if finished(pending)
+                        else (path, self.executor.submit(convert_ride, path, output_dir, **kwargs))
+                        for path, pending in futures[position:]]
+                    continue
+                result = worker_failed(input_path, e)
+            except Exception as e:
+                result = worker_failed(input_path, e)
+            yield input_path, result
+            position += 1
+
+    def _submit(self, input_paths, output_dir, kwargs):
+        from concurrent.futures.process import BrokenProcessPool
+
+        try:
+            return [(input_path, self.executor.submit(convert_ride, input_path, output_dir, **kwargs))
+                    for input_path in input_paths]
+        except BrokenProcessPool:
+            # A worker died after the last batch; a broken pool never recovers by itself
+            self._restart()
+            return [(input_path, self.executor.submit(convert_ride, input_path, output_dir, **kwargs))
+                    for input_path in input_paths]
+
+    def _restart(self):
+        """Replace the worker processes after one of them died."""
+        from concurrent.futures import ProcessPoolExecutor
+
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def close(self, cancel=False):
+        """Wait for the workers to exit; with `cancel`, rides not yet started are dropped first."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=cancel)
+            self.executor = None
@@ -1,58 +1,37 @@
-import datetime
-from fit_tool.fit_file_builder import FitFileBuilder
-from fit_tool.profile.messages.file_id_message import FileIdMessage
-from fit_tool.profile.messages.record_message import RecordMessage
-from fit_tool.profile.messages.lap_message import LapMessage
-from fit_tool.profile.messages.session_message import SessionMessage
-from fit_tool.profile.messages.event_message import EventMessage
-from fit_tool.profile.profile_type import Manufacturer, FileType, Sport, SubSport, Event, EventType
-import xml.etree.ElementTree as ET
+import os
 import sys
-
-def convert_pwx_to_fit(pwx_file_path, fit_file_path, strava_optimized=False):
-    # Namespaces
-    ns_pwx = {'pwx': 'http://www.thierrys-world.de/pwx/'} # Adjust if different
-    
-    # Parse XML
-    tree = ET.parse(pwx_file_path)
-    root = tree.getroot()
-
-    # robust namespace handling
-    if '}' in root.tag:
-        ns_url = root.tag.split('}')[0].strip('{')
-        ns_pwx = {'pwx': ns_url}
-    else:
-        ns_pwx = {}
-
-    # Find workout
-    if ns_pwx:
-        workout_node = root.find('pwx:workout', ns_pwx)
-    else:
-        workout_node = root.find('workout')
-
-    if workout_node is None:
-        raise ValueError("No 'workout' element found in PWX file")
+import datetime
+from pwx_reader import read_pwx
+from fit_encoder import encode_activity
+from output_files import open_output
+
+def ride_totals(ride):
+    """(total_dist, max_speed, total_ascent, elapsed_time) for the lap and session messages."""
+    samples = ride.samples
+    return (samples.max_value('dist'), samples.max_value('spd'),
+            samples.elevation_gain(), ride.elapsed_time)
+
+def sample_timestamps_ms(ride, samples=None):
+    """Unix epoch milliseconds of every sample (of `samples`, if given, else of the ride)."""
+    return ride.clock.epoch_ms_column((ride.samples if samples is None else samples).timeoffset)
+
+def build_fit_with_fit_tool(ride, timestamps_ms, totals, strava_optimized=False):
+    """Reference FIT encoder built on fit_tool's message classes.
+
+    This was the production path before fit_encoder existed. It is kept so tests can
+    check the direct encoder decodes to the same messages; it needs fit_tool installed.
+    """
+    from fit_tool.fit_file_builder import FitFileBuilder
+    from fit_tool.profile.messages.file_id_message import FileIdMessage
+    from fit_tool.profile.messages.record_message import RecordMessage
+    from fit_tool.profile.messages.lap_message import LapMessage
+    from fit_tool.profile.messages.session_message import SessionMessage
+    from fit_tool.profile.messages.event_message import EventMessage
+    from fit_tool.profile.profile_type import Manufacturer, FileType, Sport, SubSport, Event, EventType
 
     builder = FitFileBuilder(auto_define=True, min_string_size=50)
 
-    # Time parsing
-    time_str = workout_node.find('pwx:time', ns_pwx).text
-    try:
-        start_time = datetime.datetime.strptime(time_str, "%Y-%m-%dT%H:%M:%S")
-    except ValueError:
-        # Try with fractional seconds
-        start_time = datetime.datetime.strptime(time_str, "%Y-%m-%dT%H:%M:%S.%f")
-    
-    # If no timezone info, assume it's local time and add timezone
-    if start_time.tzinfo is None:
-        import time as time_module
-        # Get local timezone offset
-        if time_module.daylight:
-            utc_offset = -time_module.altzone
-        else:
-            utc_offset = -time_module.timezone
-        tz = datetime.timezone(datetime.timedelta(seconds=utc_offset))
-        start_time = start_time.replace(tzinfo=tz)
+    start_time = ride.start_time
 
     # 1. File ID
     file_id = FileIdMessage()
@@ -64,13 +43,16 @@ def convert_pwx_to_fit(pwx_file_path, fit_file_path, strava_optimized=False):
     builder.add(file_id)
 
     # Convert samples to records
-    samples = workout_node.findall('pwx:sample', ns_pwx)
+    samples = ride.samples
     records = []
-    
-    total_dist = 0.0
-    max_speed = 0.0
-    total_ascent = 0.0
-    prev_alt = None
+    total_dist, max_speed, total_ascent, elapsed_time_val = totals
+
+    alt_values, alt_present = samples.values['alt'], samples.present['alt']
+    dist_values, dist_present = samples.values['dist'], samples.present['dist']
+    hr_values, hr_present = samples.values['hr'], samples.present['hr']
+    cad_values, cad_present = samples.values['cad'], samples.present['cad']
+    pwr_values, pwr_present = samples.values['pwr'], samples.present['pwr']
+    spd_values, spd_present = samples.values['spd'], samples.present['spd']
     
     # Start Event
     event_start = EventMessage()
@@ -79,17 +61,8 @@ def convert_pwx_to_fit(pwx_file_path, fit_file_path, strava_optimized=False):
     event_start.timestamp = round(start_time.timestamp() * 1000)
     builder.add(event_start)
 
-    print(f"Converting {len(samples)} samples to FIT...")
-    for i, sample in enumerate(samples):
-        # Progress update every 10%
-        if len(samples) > 0 and i % (len(samples) // 10 if len(samples) >= 10 else 1) == 0:
-            percent = int((i / len(samples)) * 100)
-            sys.stdout.write(f"\rProgress: {percent}%")
-            sys.stdout.flush()
-
-        time_offset = float(sample.find('pwx:timeoffset', ns_pwx).text)
-        current_time = start_time + datetime.timedelta(seconds=time_offset)
-        timestamp_ms = round(current_time.timestamp() * 1000)
+    for i in range(len(samples)):
+        timestamp_ms = timestamps_ms[i]
 
         record = RecordMessage()
         record.timestamp = timestamp_ms
@@ -100,60 +73,39 @@ def convert_pwx_to_fit(pwx_file_path, fit_file_path, strava_optimized=False):
             record.position_long = -105.2705
 
         # Distance
-        dist_node = sample.find('pwx:dist', ns_pwx)
-        if dist_node is not None:
-            dist = float(dist_node.text)
-            record.distance = dist # meters
-            total_dist = max(total_dist, dist)
+        if dist_present[i]:
+            record.distance = dist_values[i] # meters
 
         # Altitude
-        alt_node = sample.find('pwx:alt', ns_pwx)
-        if alt_node is not None:
-            alt = float(alt_node.text)
+        if alt_present[i]:
+            alt = alt_values[i]
             record.altitude = alt           # legacy field
             record.enhanced_altitude = alt  # High precision field
-            if prev_alt is not None:
-                diff = alt - prev_alt
-                if diff > 0:
-                    total_ascent += diff
-            prev_alt = alt
 
         # Heart Rate
-        hr_node = sample.find('pwx:hr', ns_pwx)
-        if hr_node is not None:
-            record.heart_rate = int(float(hr_node.text))
+        if hr_present[i]:
+            record.heart_rate = int(hr_values[i])
 
         # Cadence
-        cad_node = sample.find('pwx:cad', ns_pwx)
-        if cad_node is not None:
-            record.cadence = int(float(cad_node.text))
+        if cad_present[i]:
+            record.cadence = int(cad_values[i])
 
         # Power
-        pwr_node = sample.find('pwx:pwr', ns_pwx)
-        if pwr_node is not None:
-            record.power = int(float(pwr_node.text))
+        if pwr_present[i]:
+            record.power = int(pwr_values[i])
 
         # Speed
-        spd_node = sample.find('pwx:spd', ns_pwx)
-        if spd_node is not None:
-            speed = float(spd_node.text)
-            record.speed = speed
-            max_speed = max(max_speed, speed)
+        if spd_present[i]:
+            record.speed = spd_values[i]
 
         builder.add(record)
         records.append(record)
 
-    # Final progress
-    sys.stdout.write("\rProgress: 100%\n")
-    sys.stdout.flush()
-
     # LAP
     lap = LapMessage()
     lap.timestamp = records[-1].timestamp if records else round(start_time.timestamp() * 1000)
     lap.start_time = round(start_time.timestamp() * 1000)
-    
-    elapsed_time_val = float(samples[-1].find('pwx:timeoffset', ns_pwx).text) if samples else 0.0
-    
+
     lap.total_elapsed_time = elapsed_time_val
     lap.total_timer_time = elapsed_time_val
     lap.total_distance = total_dist
@@ -183,8 +135,29 @@ def convert_pwx_to_fit(pwx_file_path, fit_file_path, strava_optimized=False):
     session.num_laps = 1
     builder.add(session)
 
-    fit_file = builder.build()
-    fit_file.to_file(fit_file_path)
+    return builder.build().to_bytes()
+
+def convert_pwx_to_fit(pwx_file_path, fit_file_path, strava_optimized=False, ride=None, points=None,
+                       compact=False):
+    """Convert a PWX file to FIT (gzipped if `fit_file_path` ends in .gz).
+
+    Pass an already parsed `ride` to skip re-reading the input, and `points` (see
+    recording.recorded_samples) to write fewer records than there are samples. Lap
+    and session totals always come from every sample. `compact` writes a smaller
+    file with compressed timestamp record headers (see fit_encoder.write_compact_records).
+    """
+    if ride is None:
+        ride = read_pwx(pwx_file_path)
+
+    records = ride.samples if points is None else points
+    print(f"Converting {len(records)} samples to FIT...")
+    totals = ride_totals(ride)
+    data = encode_activity(ride, sample_timestamps_ms(ride, records), totals,
+                           strava_optimized=strava_optimized, records=records, compact=compact)
+    with open_output(fit_file_path) as f:
+        f.write(data)
+
+    total_dist, max_speed, total_ascent, elapsed_time_val = totals
 
     # Print Summary
     dist_miles = total_dist * 0.000621371
@@ -197,3 +170,18 @@ def convert_pwx_to_fit(pwx_file_path, fit_file_path, strava_optimized=False):
     print(f"Duration:  {dur_str}")
     print(f"Elevation: {elev_feet:.0f} feet")
     print("--------------------")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python convert_pwx_to_fit.py <input_pwx> [output_fit]")
+        print("For many files at once use batch_convert.py")
+        sys.exit(1)
+
+    input_pwx = sys.argv[1]
+    if len(sys.argv) >= 3:
+        output_fit = sys.argv[2]
+    else:
+        # Default to the input filename with a .fit extension, next to the input
+        output_fit = os.path.splitext(input_pwx)[0] + ".fit"
+
+    convert_pwx_to_fit(input_pwx, output_fit)
@@ -0,0 +1,173 @@
+import os
+import sys
+import time
+import select
+
+# inotify event mask: anything that may mean a file appeared or finished writing
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+# Filesystems where inotify does not see writes made by other machines
+NETWORK_FS_TYPES = ('cifs', 'smb3', 'smbfs', 'nfs', 'nfs4', 'afpfs', 'fuse', '9p', 'ceph', 'glusterfs')
+
+def mount_fs_type(path):
+    """Return the filesystem type of the mount containing `path`, or None if unknown."""
+    try:
+        with open('/proc/mounts') as f:
+            mounts = [line.split()[1:3] for line in f if len(line.split()) >= 3]
+    except OSError:
+        return None
+
+    path = os.path.realpath(path)
+    best, best_type = '', None
+    for mount_point, fs_type in mounts:
+        mount_point = mount_point.replace('\\040', ' ')
+        if (path == mount_point or path.startswith(mount_point.rstrip('/') + '/')) and len(mount_point) > len(best):
+            best, best_type = mount_point, fs_type
+    return best_type
+
+def is_network_path(path):
+    """Best-effort check for SMB/NFS/FUSE mounts (including macOS /Volumes shares)."""
+    if sys.platform == 'darwin':
+        return os.path.realpath(path).startswith('/Volumes/')
+    fs_type = mount_fs_type(path)
+    return fs_type is not None and fs_type.split('.')[0] in NETWORK_FS_TYPES
+
+class InotifyWaiter:
+    """Block until something changes in a directory, using Linux inotify via ctypes."""
+
+    def __init__(self, path):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {path}")
+
+    def wait(self, timeout):
+        """Wait up to `timeout` seconds; return True if any event arrived."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        # We only care that something happened; drain the queue and rescan
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+class DirectoryWatcher:
+    """Report files in a directory once they have stopped being written.
+
+    A file is handed out when its size and mtime are unchanged across two scans at
+    least `settle_time` seconds apart, so half-copied files from the Velotron PC are
+    left alone. Between scans we block on inotify when it is usable, otherwise we
+    poll with an interval that backs off from `min_interval` to `max_interval` while
+    the directory is idle.
+    """
+
+    def __init__(self, path, suffix='.pwx', settle_time=2.0, min_interval=1.0, max_interval=10.0,
+                 mode='auto'):
+        self.path = path
+        self.suffix = suffix.lower()
+        self.settle_time = settle_time
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.pending = {}  # filename -> ((size, mtime_ns), first time seen with that signature)
+        self.waiter = None
+
+        if mode == 'auto':
+            mode = 'poll' if is_network_path(path) or not sys.platform.startswith('linux') else 'inotify'
+        if mode == 'inotify':
+            try:
+                self.waiter = InotifyWaiter(path)
+            except (OSError, AttributeError) as e:
+                print(f"Warning: inotify unavailable ({e}), falling back to polling.")
+                mode = 'poll'
+        self.mode = mode
+
+    def scan(self, now=None):
+        """Rescan the directory and return the names of files that are ready, sorted."""
+        now = time.monotonic() if now is None else now
+        ready = []
+        seen = set()
+
+        try:
+            entries = list(os.scandir(self.path))
+        except FileNotFoundError:
+            entries = []
+
+        for entry in entries:
+            if not entry.name.lower().endswith(self.suffix):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+
+            seen.add(entry.name)
+            signature = (st.st_size, st.st_mtime_ns)
+            previous = self.pending.get(entry.name)
+            if previous is None or previous[0] != signature:
+                # New file, or still being written
+                self.pending[entry.name] = (signature, now)
+            elif now - previous[1] >= self.settle_time:
+                ready.append(entry.name)
+
+        # Forget files that vanished, and hand out ready ones only once
+        for name in list(self.pending):
+            if name not in seen:
+                del self.pending[name]
+        for name in ready:
+            del self.pending[name]
+
+        return sorted(ready)
+
+    def wait(self):
+        """Block until it is worth rescanning."""
+        if self.pending:
+            # Something is settling; check back soon regardless of mode
+            timeout = min(self.min_interval, max(self.settle_time, 0.1))
+            if self.waiter:
+                self.waiter.wait(timeout)
+            else:
+                time.sleep(timeout)
+            self.interval = self.min_interval
+            return
+
+        if self.waiter:
+            # Idle: sleep until inotify fires, with a periodic safety rescan
+            self.waiter.wait(self.max_interval)
+            return
+
+        time.sleep(self.interval)
+        self.interval = min(self.interval * 1.5, self.max_interval)
+
+    def poll(self):
+        """Wait for changes and return files that are ready to process."""
+        ready = self.scan()
+        while not ready:
+            self.wait()
+            ready = self.scan()
+        self.interval = self.min_interval
+        return ready
+
+    def close(self):
+        if self.waiter:
+            self.waiter.close()
+            self.waiter = None
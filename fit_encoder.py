@@ -0,0 +1,269 @@
+import struct
+
+# FIT timestamps count seconds from 1989-12-31T00:00:00Z
+FIT_EPOCH_MS = 631065600000
+SEMICIRCLES_PER_DEGREE = 2 ** 31 / 180
+
+PROTOCOL_VERSION = 0x20   # 2.0
+PROFILE_VERSION = 2160    # 21.60
+
+# Global message numbers
+MESG_FILE_ID = 0
+MESG_SESSION = 18
+MESG_LAP = 19
+MESG_RECORD = 20
+MESG_EVENT = 21
+
+# Enum values from the FIT profile
+FILE_TYPE_ACTIVITY = 4
+MANUFACTURER_GARMIN = 1
+SPORT_CYCLING = 2
+SUB_SPORT_INDOOR_CYCLING = 6
+SUB_SPORT_VIRTUAL_ACTIVITY = 58
+EVENT_TIMER = 0
+EVENT_TYPE_START = 0
+
+class BaseType:
+    """A FIT base type: type byte, struct format code, invalid value and valid range."""
+
+    def __init__(self, type_byte, code, invalid, low, high):
+        self.type_byte = type_byte
+        self.code = code
+        self.size = struct.calcsize(code)
+        self.invalid = invalid
+        self.low = low
+        self.high = high
+
+ENUM = BaseType(0x00, 'B', 0xFF, 0, 0xFE)
+UINT8 = BaseType(0x02, 'B', 0xFF, 0, 0xFE)
+UINT16 = BaseType(0x84, 'H', 0xFFFF, 0, 0xFFFE)
+SINT32 = BaseType(0x85, 'i', 0x7FFFFFFF, -0x7FFFFFFF, 0x7FFFFFFE)
+UINT32 = BaseType(0x86, 'I', 0xFFFFFFFF, 0, 0xFFFFFFFE)
+UINT32Z = BaseType(0x8C, 'I', 0x00000000, 1, 0xFFFFFFFF)
+
+def _make_crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return tuple(table)
+
+_CRC_TABLE = _make_crc_table()
+
+def crc16(data, crc=0):
+    """FIT CRC-16 (CRC-16/ARC), byte-table variant of the SDK's nibble algorithm."""
+    table = _CRC_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+def fit_timestamp(timestamp_ms):
+    """Convert Unix epoch milliseconds to a FIT date_time (same rounding as fit_tool)."""
+    return round((timestamp_ms - FIT_EPOCH_MS) * 0.001)
+
+def encode_value(value, base_type, scale=1, offset=0):
+    """Scale a value into its FIT integer form, or the invalid value if it is out of range."""
+    if value is None:
+        return base_type.invalid
+    if scale == 1 and offset == 0:
+        encoded = int(value)
+    else:
+        encoded = round((value + offset) * scale)
+    if encoded < base_type.low or encoded > base_type.high:
+        return base_type.invalid
+    return encoded
+
+def encode_column(values, present, base_type, scale=1, offset=0):
+    """Encode a whole sample column, using the invalid value where the mask is 0."""
+    invalid = base_type.invalid
+    return [encode_value(value, base_type, scale, offset) if is_present else invalid
+            for value, is_present in zip(values, present)]
+
+class FitEncoder:
+    """Minimal FIT activity file writer.
+
+    Each local message type is defined once with `define()`; data messages are then
+    packed straight into the output buffer with a precompiled struct.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.structs = {}
+
+    def define(self, local_type, global_id, fields):
+        """Write a definition message. `fields` is a list of (field number, BaseType)."""
+        self.buffer += struct.pack('<BBBHB', 0x40 | local_type, 0, 0, global_id, len(fields))
+        for field_num, base_type in fields:
+            self.buffer += struct.pack('BBB', field_num, base_type.size, base_type.type_byte)
+        self.structs[local_type] = struct.Struct(
+            '<B' + ''.join(base_type.code for _, base_type in fields))
+
+    def write(self, local_type, *values):
+        """Write one data message for a previously defined local type."""
+        self.buffer += self.structs[local_type].pack(local_type, *values)
+
+    def write_rows(self, local_type, rows):
+        """Write many data messages of one local type from an iterable of value tuples."""
+        pack = self.structs[local_type].pack
+        self.buffer += b''.join([pack(local_type, *row) for row in rows])
+
+    def write_compressed(self, local_type, timestamp, *values):
+        """Write a data message with a compressed timestamp header (local types 0-3 only).
+
+        The header carries the low 5 bits of `timestamp`; readers add it to the last
+        full timestamp, so it must be less than 32 seconds after the previous message.
+        """
+        self.buffer += self.structs[local_type].pack(
+            COMPRESSED_HEADER | local_type << 5 | timestamp & COMPRESSED_OFFSET_MASK, *values)
+
+    def write_message(self, local_type, global_id, fields):
+        """Define and write a single message from a list of (field number, BaseType, value)."""
+        self.define(local_type, global_id, [(num, base_type) for num, base_type, _ in fields])
+        self.write(local_type, *[value for _, _, value in fields])
+
+    def to_bytes(self):
+        """Return the complete file: 14-byte header, messages and trailing CRC."""
+        header = struct.pack('<BBHI4s', 14, PROTOCOL_VERSION, PROFILE_VERSION,
+                             len(self.buffer), b'.FIT')
+        header += struct.pack('<H', crc16(header))
+        body = header + self.buffer
+        return bytes(body) + struct.pack('<H', crc16(body))
+
+# Compressed timestamp record header: flag bit, local type in bits 5-6, time offset in bits 0-4
+COMPRESSED_HEADER = 0x80
+COMPRESSED_OFFSET_MASK = 0x1F
+
+# Local message types used in our activity files
+LOCAL_FILE_ID = 0
+LOCAL_EVENT = 1
+LOCAL_RECORD = 2              # also the compressed-header records of compact files, so below 4
+LOCAL_LAP = 3
+LOCAL_SESSION = 4
+LOCAL_RECORD_TIMESTAMPED = 5  # compact files: records too far from the previous one to compress
+
+def write_compact_records(encoder, fields, columns):
+    """Write records with compressed timestamp headers where possible.
+
+    `fields` and `columns` are the full record layout, timestamp first. Every record
+    keeps all of its fields; only the timestamp moves into the header, except for
+    records 32 seconds or more after the previous one, which keep a full timestamp.
+    """
+    encoder.define(LOCAL_RECORD_TIMESTAMPED, MESG_RECORD, fields)
+    encoder.define(LOCAL_RECORD, MESG_RECORD, fields[1:])
+    last = None
+    for timestamp, *row in zip(*columns):
+        if last is not None and 0 <= timestamp - last <= COMPRESSED_OFFSET_MASK:
+            encoder.write_compressed(LOCAL_RECORD, timestamp, *row)
+        else:
+            encoder.write(LOCAL_RECORD_TIMESTAMPED, timestamp, *row)
+        last = timestamp
+
+def encode_activity(ride, timestamps_ms, totals, strava_optimized=False, records=None, compact=False):
+    """Encode a ride as a FIT activity and return the file bytes.
+
+    Record messages are written for `records` (a SampleColumns, default every sample of
+    the ride). `timestamps_ms` holds the Unix epoch milliseconds of each of them and
+    `totals` the ride totals (total_dist, max_speed, total_ascent, elapsed_time). The
+    record layout is fixed for the ride: one definition with every channel that appears
+    at least once, with the invalid value written wherever a sample lacks that channel.
+    With `compact`, records use compressed timestamp headers (see write_compact_records);
+    a ride with no channels to write keeps plain records.
+    """
+    samples = ride.samples if records is None else records
+    start_ms = round(ride.start_time.timestamp() * 1000)
+    start_ts = fit_timestamp(start_ms)
+    encoder = FitEncoder()
+
+    # 1. File ID
+    encoder.write_message(LOCAL_FILE_ID, MESG_FILE_ID, [
+        (0, ENUM, FILE_TYPE_ACTIVITY),
+        (1, UINT16, MANUFACTURER_GARMIN),  # need this.
+        (2, UINT16, 3121),                 # Garmin Edge 530 (from working reference file)
+        (3, UINT32Z, 12345),
+        (4, UINT32, start_ts),
+    ])
+
+    # Start Event
+    encoder.write_message(LOCAL_EVENT, MESG_EVENT, [
+        (253, UINT32, start_ts),
+        (0, ENUM, EVENT_TIMER),
+        (1, ENUM, EVENT_TYPE_START),
+    ])
+
+    # Records: build the fixed layout, then pack all samples column-wise
+    fields = [(253, UINT32)]
+    columns = [[fit_timestamp(ms) for ms in timestamps_ms]]
+    count = len(samples)
+
+    if strava_optimized:
+        # Position: Required for Strava to display HR/Power graphs and respect elevation
+        fields += [(0, SINT32), (1, SINT32)]
+        columns.append([encode_value(40.0150, SINT32, SEMICIRCLES_PER_DEGREE)] * count)
+        columns.append([encode_value(-105.2705, SINT32, SEMICIRCLES_PER_DEGREE)] * count)
+
+    def add_channel(channel, field_num, base_type, scale=1, offset=0):
+        present = samples.present[channel]
+        if any(present):
+            fields.append((field_num, base_type))
+            columns.append(encode_column(samples.values[channel], present, base_type, scale, offset))
+
+    add_channel('dist', 5, UINT32, 100)          # distance, meters
+    add_channel('alt', 2, UINT16, 5, 500)        # altitude (legacy field)
+    add_channel('alt', 78, UINT32, 5, 500)       # enhanced_altitude (high precision field)
+    add_channel('hr', 3, UINT8)                  # heart_rate
+    add_channel('cad', 4, UINT8)                 # cadence
+    add_channel('pwr', 7, UINT16)                # power
+    add_channel('spd', 6, UINT16, 1000)          # speed, m/s
+
+    if count and compact and len(fields) > 1:
+        write_compact_records(encoder, fields, columns)
+    elif count:
+        encoder.define(LOCAL_RECORD, MESG_RECORD, fields)
+        encoder.write_rows(LOCAL_RECORD, zip(*columns))
+
+    # LAP
+    total_dist, max_speed, total_ascent, elapsed_time = totals
+    end_ts = columns[0][-1] if count else start_ts
+    lap_fields = [
+        (253, UINT32, end_ts),
+        (2, UINT32, start_ts),
+        (7, UINT32, encode_value(elapsed_time, UINT32, 1000)),
+        (8, UINT32, encode_value(elapsed_time, UINT32, 1000)),
+        (9, UINT32, encode_value(total_dist, UINT32, 100)),
+        (14, UINT16, encode_value(max_speed, UINT16, 1000)),
+        (21, UINT16, encode_value(total_ascent, UINT16)),
+    ]
+    if strava_optimized:
+        lap_fields.append((22, UINT16, 0))  # Strava often needs total_descent to trust the profile
+    encoder.write_message(LOCAL_LAP, MESG_LAP, lap_fields)
+
+    # SESSION
+    session_fields = [
+        (253, UINT32, end_ts),
+        (2, UINT32, start_ts),
+        (7, UINT32, encode_value(elapsed_time, UINT32, 1000)),
+        (8, UINT32, encode_value(elapsed_time, UINT32, 1000)),
+        (9, UINT32, encode_value(total_dist, UINT32, 100)),
+        (15, UINT16, encode_value(max_speed, UINT16, 1000)),
+        (22, UINT16, encode_value(total_ascent, UINT16)),
+    ]
+    if strava_optimized:
+        session_fields += [
+            (23, UINT16, 0),
+            (5, ENUM, SPORT_CYCLING),
+            (6, ENUM, SUB_SPORT_VIRTUAL_ACTIVITY),
+        ]
+    else:
+        session_fields += [
+            (5, ENUM, SPORT_CYCLING),
+            (6, ENUM, SUB_SPORT_INDOOR_CYCLING),
+        ]
+    session_fields += [
+        (25, UINT16, 0),  # first_lap_index
+        (26, UINT16, 1),  # num_laps
+    ]
+    encoder.write_message(LOCAL_SESSION, MESG_SESSION, session_fields)
+
+    return encoder.to_bytes()
@@ -0,0 +1,80 @@
+import os
+import mmap
+import hashlib
+import tempfile
+import contextlib
+
+from job_journal import file_hash
+
+# Network inputs are copied in large sequential reads instead of the parser's small ones
+STAGE_CHUNK_SIZE = 8 * 1024 * 1024
+
+class StagedInput:
+    """A PWX input ready to be parsed from local storage.
+
+    `path` is the local copy, or the original `source` if it was already local.
+    `content_hash` is the file's SHA-256 when it was asked for. Use as a context
+    manager (or call `close()`) to remove the local copy.
+    """
+
+    def __init__(self, source, path, content_hash=None, staged=False):
+        self.source = source
+        self.path = path
+        self.content_hash = content_hash
+        self.staged = staged
+
+    def close(self):
+        if self.staged:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.staged = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def stage_input(path, network=True, staging_dir=None, with_hash=True):
+    """Prepare `path` for parsing, copying it to local temp storage if it is on a `network` share.
+
+    The copy is made with a few large sequential reads and hashed on the way, so the
+    share is read exactly once. Local files are used in place.
+    """
+    if not network:
+        return StagedInput(path, path, file_hash(path) if with_hash else None)
+
+    digest = hashlib.sha256() if with_hash else None
+    fd, local_path = tempfile.mkstemp(prefix='velotron-', suffix=f"-{os.path.basename(path)}", dir=staging_dir)
+    try:
+        with open(path, 'rb', buffering=0) as src, os.fdopen(fd, 'wb') as dst:
+            while True:
+                chunk = src.read(STAGE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if digest is not None:
+                    digest.update(chunk)
+                dst.write(chunk)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(local_path)
+        raise
+    return StagedInput(path, local_path, digest.hexdigest() if digest is not None else None, staged=True)
+
+@contextlib.contextmanager
+def mapped_input(path):
+    """The file's contents as a read-only memory map, for parsing from memory.
+
+    Yields an object with `read()`, so it can be handed to read_pwx like a file.
+    Empty files cannot be mapped and are yielded as the open file instead.
+    """
+    with open(path, 'rb') as f:
+        try:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            yield f
+            return
+        with mapping:
+            yield mapping
@@ -0,0 +1,157 @@
+import time
+import hashlib
+import sqlite3
+import threading
+
+# Stages a ride goes through, in order. 'failed' (conversion failed) and 'rejected'
+# (Strava refused the file) are terminal and sit outside the ordering.
+STAGES = ('parsed', 'tcx', 'fit', 'upload_queued', 'uploaded', 'confirmed')
+FAILED = 'failed'
+REJECTED = 'rejected'
+DUPLICATE = 'duplicate'  # same ride as one converted earlier, nothing redone
+
+JOURNAL_FILENAME = "velotron_journal.sqlite3"
+
+FIELDS = ('base_name', 'sample_count', 'tcx_path', 'fit_path', 'upload_path',
+          'upload_id', 'activity_id', 'error', 'archived')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    filename TEXT PRIMARY KEY,
+    stage TEXT NOT NULL,
+    base_name TEXT,
+    sample_count INTEGER,
+    tcx_path TEXT,
+    fit_path TEXT,
+    upload_path TEXT,
+    upload_id INTEGER,
+    activity_id INTEGER,
+    error TEXT,
+    archived INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rides (
+    content_hash TEXT PRIMARY KEY,
+    fingerprint TEXT,
+    filename TEXT,
+    base_name TEXT,
+    tcx_path TEXT,
+    fit_path TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rides_fingerprint ON rides (fingerprint);
+"""
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's contents, as hex."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def stage_reached(stage, target):
+    """True if `stage` is at or past `target` in the normal progression."""
+    if stage not in STAGES or target not in STAGES:
+        return False
+    return STAGES.index(stage) >= STAGES.index(target)
+
+class JobJournal:
+    """Records how far each PWX file got, so a restart picks up where it left off.
+
+    Rows are keyed by the PWX filename. `archived` is set once the original has been
+    moved out of original/, so a later file with the same name starts a fresh job.
+    Safe to use from the monitor and the upload thread at the same time.
+
+    The `rides` table indexes every ride converted so far by content hash and by
+    fingerprint (start time, duration, distance), so copies of a ride that was already
+    converted can be recognised.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+    def get(self, filename):
+        """Return the job row for `filename` as a dict, or None."""
+        with self.lock:
+            row = self.db.execute("SELECT * FROM jobs WHERE filename = ?", (filename,)).fetchone()
+        return dict(row) if row else None
+
+    def record(self, filename, stage=None, **fields):
+        """Create or update a job. Only the given fields change.
+
+        `stage` never moves backwards, so re-recording 'tcx' for a job that has already
+        been uploaded just updates the fields.
+        """
+        unknown = set(fields) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown journal fields: {', '.join(sorted(unknown))}")
+
+        with self.lock:
+            row = self.db.execute("SELECT stage FROM jobs WHERE filename = ?", (filename,)).fetchone()
+            if row is None:
+                columns = ['filename', 'stage', 'updated_at'] + list(fields)
+                values = [filename, stage or STAGES[0], time.time()] + list(fields.values())
+                self.db.execute(f"INSERT INTO jobs ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                                values)
+                return
+
+            updates = dict(fields, updated_at=time.time())
+            if stage and not (stage in STAGES and stage_reached(row['stage'], stage)):
+                updates['stage'] = stage
+            assignments = ', '.join(f"{column} = ?" for column in updates)
+            self.db.execute(f"UPDATE jobs SET {assignments} WHERE filename = ?",
+                            list(updates.values()) + [filename])
+
+    def start(self, filename):
+        """Begin a job for a file found in original/, discarding any archived job of the same name.
+
+        Returns the existing row if the file is part of an unfinished job.
+        """
+        job = self.get(filename)
+        if job and not job['archived']:
+            return job
+        with self.lock:
+            self.db.execute("DELETE FROM jobs WHERE filename = ?", (filename,))
+        return None
+
+    def pending_uploads(self):
+        """Jobs whose upload never finished: queued but not sent, or sent but unconfirmed."""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT * FROM jobs WHERE stage IN ('upload_queued', 'uploaded') "
+                "ORDER BY updated_at").fetchall()
+        return [dict(row) for row in rows]
+
+    def remember_ride(self, content_hash, fingerprint, filename, base_name, tcx_path, fit_path=None):
+        """Add a converted ride to the duplicate index."""
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO rides (content_hash, fingerprint, filename, base_name, tcx_path, "
+                "fit_path, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (content_hash, fingerprint, filename, base_name, tcx_path, fit_path, time.time()))
+
+    def find_ride(self, content_hash=None, fingerprint=None):
+        """Return the first indexed ride matching the content hash or fingerprint, or None."""
+        with self.lock:
+            row = None
+            if content_hash:
+                row = self.db.execute("SELECT * FROM rides WHERE content_hash = ?", (content_hash,)).fetchone()
+            if row is None and fingerprint:
+                row = self.db.execute("SELECT * FROM rides WHERE fingerprint = ? ORDER BY created_at",
+                                      (fingerprint,)).fetchone()
+        return dict(row) if row else None
+
+    def known_fingerprints(self):
+        """Fingerprints of every indexed ride."""
+        with self.lock:
+            rows = self.db.execute("SELECT DISTINCT fingerprint FROM rides WHERE fingerprint IS NOT NULL")
+            return frozenset(row[0] for row in rows)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
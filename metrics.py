@@ -0,0 +1,166 @@
+import os
+import time
+import threading
+import contextlib
+
+# Histogram buckets in seconds; parsing takes well under a second, Strava processing can take minutes
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(labels, extra=None):
+    items = list(labels) + (list(extra) if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in items) + '}'
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class Metrics:
+    """A tiny thread-safe metrics registry that renders Prometheus text format.
+
+    Metrics must be declared with `describe()` before use. Collectors registered with
+    `add_collector()` run just before each render, for gauges that are cheaper to read
+    on demand (like queue depths) than to keep up to date.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.meta = {}        # name -> (type, help)
+        self.values = {}      # name -> {labels: value}; histograms: {labels: [bucket counts, sum, count]}
+        self.buckets = {}     # histogram name -> bucket bounds
+        self.collectors = []
+
+    def describe(self, name, kind, help_text, buckets=DEFAULT_BUCKETS):
+        if kind not in ('counter', 'gauge', 'histogram'):
+            raise ValueError(f"Unknown metric type: {kind}")
+        with self.lock:
+            self.meta[name] = (kind, help_text)
+            self.values.setdefault(name, {})
+            if kind == 'histogram':
+                self.buckets[name] = tuple(buckets)
+
+    def _series(self, name, kind, labels):
+        if self.meta.get(name, (None,))[0] != kind:
+            raise KeyError(f"{name} is not a declared {kind}")
+        return self.values[name], tuple(sorted(labels.items()))
+
+    def inc(self, name, amount=1, **labels):
+        with self.lock:
+            series, key = self._series(name, 'counter', labels)
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            series, key = self._series(name, 'gauge', labels)
+            series[key] = value
+
+    def observe(self, name, value, **labels):
+        with self.lock:
+            series, key = self._series(name, 'histogram', labels)
+            bounds = self.buckets[name]
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [[0] * len(bounds), 0.0, 0]
+            for i, bound in enumerate(bounds):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, name, **labels):
+        """Observe how long the `with` block took."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def get(self, name, **labels):
+        """Current value of a counter or gauge, or (sum, count) of a histogram; None if unset."""
+        with self.lock:
+            state = self.values.get(name, {}).get(tuple(sorted(labels.items())))
+        if state is not None and self.meta[name][0] == 'histogram':
+            return state[1], state[2]
+        return state
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        """The registry in Prometheus text exposition format."""
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"Warning: metrics collector failed: {e}")
+
+        lines = []
+        with self.lock:
+            for name, (kind, help_text) in self.meta.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(self.values[name].items()):
+                    if kind != 'histogram':
+                        lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                        continue
+                    counts, total, count = value
+                    for bound, bucket_count in zip(self.buckets[name], counts):
+                        lines.append(f"{name}_bucket{_labels(labels, [('le', _number(bound))])} {bucket_count}")
+                    lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {count}")
+                    lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+                    lines.append(f"{name}_count{_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def write_file(self, path):
+        """Write the metrics to `path` atomically (for node_exporter's textfile collector)."""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def serve(self, port, host='0.0.0.0'):
+        """Serve /metrics over HTTP on a background thread; returns the server."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # keep scrapes out of the converter log
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+# Registry used by the monitor
+METRICS = Metrics()
+METRICS.describe('velotron_stage_seconds', 'histogram',
+                 'Time spent in each processing stage (parse, tcx, fit, move, upload, status_poll, '
+                 'strava_processing, total)')
+METRICS.describe('velotron_files_total', 'counter', 'PWX files handled, by outcome')
+METRICS.describe('velotron_samples_total', 'counter', 'Samples converted')
+METRICS.describe('velotron_uploads_total', 'counter', 'Strava uploads finished, by outcome')
+METRICS.describe('velotron_backlog_files', 'gauge', 'PWX files in original/ waiting to be processed')
+METRICS.describe('velotron_upload_queue_depth', 'gauge', 'Uploads queued or waiting on Strava processing')
+METRICS.describe('velotron_strava_requests_remaining', 'gauge',
+                 'Strava API requests left in the current 15 minute and daily windows')
+METRICS.describe('velotron_last_processed_timestamp_seconds', 'gauge', 'Unix time the last file finished')
@@ -2,21 +2,22 @@ import os
 import time
 import shutil
 import sys
-import datetime
 import argparse
-from convert_pwx_to_tcx import convert_pwx_to_tcx
+import tempfile
+from conversion_pool import ConversionPool, ConversionResult, convert_ride
+from dir_watcher import DirectoryWatcher, is_network_path
+from metrics import METRICS
+from job_journal import JobJournal, JOURNAL_FILENAME, FAILED, REJECTED, DUPLICATE, stage_reached
+from ride_index import RideIndex, INDEX_FILENAME
+from recording import RECORDING_MODES
+from upload_queue import UploadQueue
+from input_staging import stage_input
+from output_files import set_permissions  # PUID/PGID, also applied to outputs before they appear
 
-# Optional FIT support
-try:
-    from convert_pwx_to_fit import convert_pwx_to_fit
-    FIT_SUPPORT_ENABLED = True
-except ImportError:
-    FIT_SUPPORT_ENABLED = False
-    print("Warning: 'fit_tool' library not found. FIT conversion will be disabled.")
-    print("To enable FIT support, run: pip install fit_tool")
+# FIT support (encoded directly, fit_tool is no longer required)
+FIT_SUPPORT_ENABLED = True
 
 # Strava Support
-from strava_uploader import StravaUploader
 STRAVA_CLIENT_ID = os.getenv('STRAVA_CLIENT_ID')
 STRAVA_CLIENT_SECRET = os.getenv('STRAVA_CLIENT_SECRET')
 STRAVA_REFRESH_TOKEN = os.getenv('STRAVA_REFRESH_TOKEN')
@@ -28,52 +29,65 @@ if not STRAVA_REFRESH_TOKEN: missing_vars.append('STRAVA_REFRESH_TOKEN')
 
 STRAVA_ENABLED = len(missing_vars) == 0
 
-if STRAVA_ENABLED:
-    strava_uploader = StravaUploader(STRAVA_CLIENT_ID, STRAVA_CLIENT_SECRET, STRAVA_REFRESH_TOKEN)
-
-# Parse command-line arguments
-parser = argparse.ArgumentParser(description='Monitor and convert PWX files to TCX/FIT formats')
-parser.add_argument('directory', nargs='?', default=None, 
-                    help='Base directory containing original/ folder (default: script location)')
-args = parser.parse_args()
-
-# Configuration
-USING_CLI_ARG = False
-ENV_MONITOR_PATH = os.getenv('MONITOR_PATH')
-
-if args.directory:
-    MONITOR_PATH = args.directory
-    USING_CLI_ARG = True
-elif ENV_MONITOR_PATH:
-    MONITOR_PATH = ENV_MONITOR_PATH
-    print(f"Using MONITOR_PATH environment variable: {MONITOR_PATH}")
-else:
+# Created by configure() when Strava is enabled; importing requests is a large part of startup
+strava_uploader = None
+
+# Created by monitor_directory(); process_file works without them (e.g. in tests)
+upload_queue = None
+journal = None
+ride_index = None
+stage_inputs = False  # Whether inputs are copied to local storage before parsing
+
+# Set by configure() from the command line and environment
+BASE_DIRECTORY = None
+WORKERS = 1
+JOURNAL_PATH = None
+RIDE_INDEX_PATH = None
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Monitor and convert PWX files to TCX/FIT formats')
+    parser.add_argument('directory', nargs='?', default=None,
+                        help='Base directory containing original/ folder (default: script location)')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WORKERS', '1')),
+                        help='Number of files to convert in parallel (default: WORKERS env or 1)')
+    return parser
+
+def resolve_monitor_path(directory=None):
+    """Pick the directory to monitor: CLI argument, then MONITOR_PATH, then known mount points, then cwd."""
+    if directory:
+        return directory
+    env_monitor_path = os.getenv('MONITOR_PATH')
+    if env_monitor_path:
+        print(f"Using MONITOR_PATH environment variable: {env_monitor_path}")
+        return env_monitor_path
+
     # Default search paths if no environment variable or CLI arg is set
     if os.path.exists('/veloMonitor'):
-        MONITOR_PATH = '/veloMonitor'
-    elif os.path.exists('/velotronMonitor'):
-        MONITOR_PATH = '/velotronMonitor'
-    elif os.path.exists('/Volumes/veloMonitor'):
-        MONITOR_PATH = '/Volumes/veloMonitor'
-        print(f"Network drive found - using: {MONITOR_PATH}")
-    else:
-        MONITOR_PATH = os.getcwd()
-        print(f"Running locally - using directory: {MONITOR_PATH}")
+        return '/veloMonitor'
+    if os.path.exists('/velotronMonitor'):
+        return '/velotronMonitor'
+    if os.path.exists('/Volumes/veloMonitor'):
+        print("Network drive found - using: /Volumes/veloMonitor")
+        return '/Volumes/veloMonitor'
+    monitor_path = os.getcwd()
+    print(f"Running locally - using directory: {monitor_path}")
+    return monitor_path
 
-BASE_DIRECTORY = os.path.abspath(MONITOR_PATH)
-
-# VALIDATION: Prevent "Creating Directory" loop on Unraid
-# If the path doesn't exist, AND we didn't explicitly ask for it via CLI/ENV,
-# AND a default mount point DOES exist... then it's a config error.
-if not os.path.exists(BASE_DIRECTORY) and not USING_CLI_ARG and not ENV_MONITOR_PATH:
+def check_base_directory(base_directory, explicit):
+    """Exit (after a pause) if the container looks at the wrong path while a known mount point exists."""
+    # VALIDATION: Prevent "Creating Directory" loop on Unraid
+    # If the path doesn't exist, AND we didn't explicitly ask for it via CLI/ENV,
+    # AND a default mount point DOES exist... then it's a config error.
+    if os.path.exists(base_directory) or explicit:
+        return
     known_paths = ['/veloMonitor', '/velotronMonitor']
     found_path = next((p for p in known_paths if os.path.exists(p)), None)
-    
+
     if found_path:
         print(f"\nSaved you from a crash! :)")
         print(f"CRITICAL MISCONFIGURATION DETECTED:")
         print(f"-------------------------------------------------------------")
-        print(f"The Container is trying to look at: '{BASE_DIRECTORY}'")
+        print(f"The Container is trying to look at: '{base_directory}'")
         print(f"BUT that directory does not exist inside this container.")
         print(f"However, the directory '{found_path}' DOES exist.")
         print(f"-------------------------------------------------------------")
@@ -85,21 +99,20 @@ if not os.path.exists(BASE_DIRECTORY) and not USING_CLI_ARG and not ENV_MONITOR_
         time.sleep(60)
         sys.exit(1)
 
-# Permissions Configuration (Unraid/LinuxServer style)
-# Only active if PUID/PGID are explicitly set in environment
-PUID = os.getenv('PUID')
-PGID = os.getenv('PGID')
-if PUID: PUID = int(PUID)
-if PGID: PGID = int(PGID)
+def configure(argv=None):
+    """Read the command line and environment into the module settings."""
+    global BASE_DIRECTORY, WORKERS, JOURNAL_PATH, RIDE_INDEX_PATH, strava_uploader
+    args = build_parser().parse_args(argv)
 
-def set_permissions(path):
-    """Apply PUID/PGID permissions only if configured."""
-    if not PUID or not PGID:
-        return
-    try:
-        os.chown(path, PUID, PGID)
-    except Exception as e:
-        pass # Silently fail on local systems where this isn't supported
+    BASE_DIRECTORY = os.path.abspath(resolve_monitor_path(args.directory))
+    check_base_directory(BASE_DIRECTORY, explicit=bool(args.directory or os.getenv('MONITOR_PATH')))
+    WORKERS = max(1, args.workers)
+    JOURNAL_PATH = os.getenv('JOURNAL_PATH') or os.path.join(BASE_DIRECTORY, JOURNAL_FILENAME)
+    RIDE_INDEX_PATH = os.getenv('RIDE_INDEX_PATH') or os.path.join(BASE_DIRECTORY, INDEX_FILENAME)
+
+    if STRAVA_ENABLED and strava_uploader is None:
+        from strava_uploader import StravaUploader
+        strava_uploader = StravaUploader(STRAVA_CLIENT_ID, STRAVA_CLIENT_SECRET, STRAVA_REFRESH_TOKEN)
 
 def safe_move(src, dst):
     """Robust move that handles network drives and metadata errors."""
@@ -118,7 +131,24 @@ ORIGINAL_DIR_NAME = "original"
 CONVERTED_DIR_NAME = "converted"
 PROCESSED_DIR_NAME = "processed"
 FAILED_DIR_NAME = "failed"
-POLL_INTERVAL = 2  # Seconds
+ARCHIVE_DIR_NAME = "archive"
+POLL_INTERVAL = 2  # Seconds, shortest rescan interval when polling
+MAX_POLL_INTERVAL = float(os.getenv('MAX_POLL_INTERVAL', '10'))  # Seconds, idle back-off limit
+SETTLE_SECONDS = float(os.getenv('SETTLE_SECONDS', '2'))  # Size/mtime must be stable this long
+WATCH_MODE = os.getenv('WATCH_MODE', 'auto')  # auto, inotify or poll
+STAGE_INPUTS = os.getenv('STAGE_INPUTS', 'auto').lower()  # auto (network shares only), true or false
+STAGING_DIR = os.getenv('STAGING_DIR') or None  # Local copies of staged inputs (default: system temp dir)
+RIDE_ARCHIVE = os.getenv('RIDE_ARCHIVE', 'false').lower() in ('1', 'true', 'yes')  # Keep decoded samples
+ARCHIVE_PATH = os.getenv('ARCHIVE_PATH')  # Ride archive location (default: <base>/archive)
+RIDE_INDEX = os.getenv('RIDE_INDEX', 'false').lower() in ('1', 'true', 'yes')  # Keep ride summaries for reports
+RIDER_NAME = os.getenv('RIDER_NAME') or None  # Rider for rides whose PWX has no athlete name
+RECORDING_MODE = os.getenv('RECORDING_MODE', 'every').lower()  # every, rate or smart (points written to TCX/FIT)
+RECORDING_INTERVAL = float(os.getenv('RECORDING_INTERVAL', '1'))  # Seconds between points in rate mode
+COMPRESS_OUTPUT = os.getenv('COMPRESS_OUTPUT', 'false').lower() in ('1', 'true', 'yes')  # Write .tcx.gz/.fit.gz
+COMPACT_FIT = os.getenv('COMPACT_FIT', 'false').lower() in ('1', 'true', 'yes')  # Compressed timestamp FIT records
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))  # Serve Prometheus metrics on this port (0 = off)
+METRICS_HOST = os.getenv('METRICS_HOST', '0.0.0.0')
+METRICS_FILE = os.getenv('METRICS_FILE')  # Also write them to this file (e.g. for node_exporter)
 
 def setup_directories():
     """Ensure necessary directories exist."""
@@ -135,140 +165,401 @@ def setup_directories():
             set_permissions(path)
             # print(f"Directory already exists, using existing directory: {path}")
 
-def process_file(filename):
-    """Process a single PWX file found in the original directory."""
-    # Input is now inside 'original'
-    input_path = os.path.join(BASE_DIRECTORY, ORIGINAL_DIR_NAME, filename)
-    
-    # Extract ride timestamp from PWX file for filename
+def output_formats():
+    """Formats to produce for each ride; TCX always, FIT when enabled."""
+    return ('tcx', 'fit') if FIT_SUPPORT_ENABLED else ('tcx',)
+
+def ride_archive_dir():
+    """Where converted rides' samples are archived, or None if the archive is off."""
+    if not RIDE_ARCHIVE:
+        return None
+    return ARCHIVE_PATH or os.path.join(BASE_DIRECTORY, ARCHIVE_DIR_NAME)
+
+def recording_mode():
+    """RECORDING_MODE, or 'every' if it (or the rate mode's interval) is not usable."""
+    if RECORDING_MODE not in RECORDING_MODES:
+        return 'every'
+    if RECORDING_MODE == 'rate' and RECORDING_INTERVAL <= 0:
+        return 'every'
+    return RECORDING_MODE
+
+def conversion_options():
+    """Keyword arguments for convert_ride and ConversionPool.run."""
+    return dict(formats=output_formats(), strava_optimized=STRAVA_ENABLED, compress=COMPRESS_OUTPUT,
+                archive_dir=ride_archive_dir(), recording=recording_mode(), recording_interval=RECORDING_INTERVAL,
+                compact_fit=COMPACT_FIT)
+
+def archive_ride(filename, result):
+    """Add a ride whose samples were archived during conversion to the archive manifest."""
+    if result.archive is None:
+        return
+    from ride_archive import RideArchive
     try:
-        import xml.etree.ElementTree as ET
-        tree = ET.parse(input_path)
-        root = tree.getroot()
-        
-        # Handle namespaced PWX
-        if '}' in root.tag:
-            ns_url = root.tag.split('}')[0].strip('{')
-            ns = {'pwx': ns_url}
-            workout = root.find('pwx:workout', ns)
-            time_node = workout.find('pwx:time', ns) if workout is not None else None
-        else:
-            workout = root.find('workout')
-            time_node = workout.find('time') if workout is not None else None
-        
-        if time_node is not None and time_node.text:
-            # Parse timestamp: 2025-11-18T14:29:43 -> 2025-11-18_14-29-43
-            ride_time_str = time_node.text.split('.')[0]  # Remove fractional seconds if present
-            ride_time = datetime.datetime.fromisoformat(ride_time_str)
-            base_name = ride_time.strftime("%Y-%m-%d_%H-%M-%S")
-        else:
-            # Fallback to original filename if parsing fails
-            base_name = os.path.splitext(filename)[0]
+        archive = RideArchive(ride_archive_dir())
+        archive.add(result.archive)
+        print(f"  -> Archived samples: {ARCHIVE_DIR_NAME}/{result.archive['file']}")
     except Exception as e:
-        # Fallback to original filename on any error
-        print(f"  -> Warning: Could not parse ride time, using original filename: {e}")
-        base_name = os.path.splitext(filename)[0]
-    
-    tcx_filename = f"{base_name}.tcx"
-    tcx_path = os.path.join(BASE_DIRECTORY, CONVERTED_DIR_NAME, tcx_filename)
+        print(f"  -> Warning: could not add {filename} to the ride archive: {e}")
+        return
+    update_curves(filename, archive, result)
+
+def update_curves(filename, archive, result):
+    """Merge the ride's power/HR curve, computed by the conversion worker, into the all-time curve."""
+    if result.curve is None:
+        return
+    from power_curve import CurveStore
+    try:
+        CurveStore(archive).add(result.archive, result.curve)
+    except Exception as e:
+        print(f"  -> Warning: could not update the power curve with {filename}: {e}")
+
+def index_ride(filename, result):
+    """Add a converted ride's summary to the ride index, if there is one."""
+    if ride_index is None or result.summary is None:
+        return
+    try:
+        ride_index.add(result.summary, filename=filename, rider=RIDER_NAME)
+    except Exception as e:
+        print(f"  -> Warning: could not add {filename} to the ride index: {e}")
+
+def journal_record(filename, stage=None, **fields):
+    """Update the job journal, if there is one."""
+    if journal is not None and filename is not None:
+        try:
+            journal.record(filename, stage, **fields)
+        except Exception as e:
+            print(f"  -> Warning: could not update job journal for {filename}: {e}")
+
+def journal_start(filename):
+    """Return the unfinished journal entry for a file in original/, if any."""
+    if journal is None:
+        return None
+    return journal.start(filename)
+
+def resume_result(input_path, job):
+    """Rebuild a ConversionResult from the journal if the outputs of an earlier run still exist."""
+    if not job or not stage_reached(job['stage'], 'tcx'):
+        return None
+    if not job['tcx_path'] or not os.path.exists(job['tcx_path']):
+        return None
+    result = ConversionResult(input_path)
+    result.base_name = job['base_name']
+    result.sample_count = job['sample_count'] or 0
+    result.outputs['tcx'] = job['tcx_path']
+    if job['fit_path'] and os.path.exists(job['fit_path']):
+        result.outputs['fit'] = job['fit_path']
+    return result
+
+def export_metrics():
+    """Refresh the metrics file, if one is configured."""
+    if not METRICS_FILE:
+        return
+    try:
+        METRICS.write_file(METRICS_FILE)
+    except Exception as e:
+        print(f"Warning: could not write metrics file {METRICS_FILE}: {e}")
+
+def record_file_metrics(outcome, timings, samples=0):
+    """Count a finished file and log its stage timings on one line."""
+    for stage, seconds in timings.items():
+        METRICS.observe('velotron_stage_seconds', seconds, stage=stage)
+    METRICS.inc('velotron_files_total', outcome=outcome)
+    if samples:
+        METRICS.inc('velotron_samples_total', samples)
+    METRICS.set('velotron_last_processed_timestamp_seconds', time.time())
+    if timings:
+        print("  -> Timings: " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items()))
+    export_metrics()
+
+def collect_upload_metrics():
+    METRICS.set('velotron_upload_queue_depth', upload_queue.depth())
+    short, daily = strava_uploader.rate_limit.remaining()
+    METRICS.set('velotron_strava_requests_remaining', short, window='15min')
+    METRICS.set('velotron_strava_requests_remaining', daily, window='daily')
+
+def stage_file(input_path):
+    """Get an input ready to parse: copied off the share when staging, hashed for the duplicate index."""
+    return stage_input(input_path, network=stage_inputs, staging_dir=STAGING_DIR, with_hash=journal is not None)
+
+def staging_enabled(base_directory):
+    """Resolve STAGE_INPUTS for the monitored directory."""
+    if STAGE_INPUTS in ('1', 'true', 'yes'):
+        return True
+    if STAGE_INPUTS in ('0', 'false', 'no'):
+        return False
+    return is_network_path(base_directory)
+
+def known_ride(content_hash=None, fingerprint=None):
+    """An earlier conversion of the same ride whose outputs are still in converted/, or None."""
+    if journal is None:
+        return None
+    ride = journal.find_ride(content_hash=content_hash, fingerprint=fingerprint)
+    if not ride or not ride['tcx_path'] or not os.path.exists(ride['tcx_path']):
+        return None
+    if ride['fit_path'] and not os.path.exists(ride['fit_path']):
+        return None
+    return ride
+
+def known_fingerprints():
+    """Fingerprints of rides already converted, for convert_ride's skip_fingerprints."""
+    return journal.known_fingerprints() if journal is not None else ()
+
+def upload_started(job):
+    journal_record(job.key, 'uploaded', upload_id=job.upload_id)
+
+def upload_finished(job, outcome, detail):
+    UploadQueue.print_result(job, outcome, detail)
+    if job.upload_seconds:
+        METRICS.observe('velotron_stage_seconds', job.upload_seconds, stage='upload')
+    if job.attempts:
+        METRICS.observe('velotron_stage_seconds', job.poll_seconds, stage='status_poll')
+    if job.accepted_at is not None and outcome in ('success', 'duplicate'):
+        METRICS.observe('velotron_stage_seconds', time.monotonic() - job.accepted_at, stage='strava_processing')
+    metric_outcome = REJECTED if outcome == 'failed' and job.upload_id else outcome
+    METRICS.inc('velotron_uploads_total', outcome=metric_outcome)
+    export_metrics()
+    if outcome == 'success':
+        journal_record(job.key, 'confirmed', activity_id=detail, error=None)
+    elif outcome == 'duplicate':
+        journal_record(job.key, 'confirmed', error=None)
+    elif outcome == 'failed' and job.upload_id:
+        # Strava took the file but could not process it; retrying won't help
+        journal_record(job.key, REJECTED, error=detail)
+    elif outcome == 'failed':
+        # Never reached Strava; stays queued and is retried on the next start
+        journal_record(job.key, error=detail)
+    # 'timeout' stays 'uploaded' and 'deferred' stays 'upload_queued'; both resume on the next start
+
+def queue_upload(filename, upload_path, job=None):
+    """Hand a converted ride to the upload stage, picking up where an earlier run stopped."""
+    stage = job['stage'] if job else None
+    if stage in ('confirmed', REJECTED):
+        print(f"  -> Strava upload already finished ({stage}), skipping")
+        return
+    if upload_queue is None:
+        # process_file called outside monitor_directory (tests, one-off runs). A journal
+        # that exists keeps the upload pending, so the next monitor start sends it.
+        if stage != 'uploaded':
+            journal_record(filename, 'upload_queued', upload_path=upload_path)
+        print(f"  -> Strava upload queue not running, not uploading {os.path.basename(upload_path)}")
+        return
+    if stage == 'uploaded' and job['upload_id']:
+        upload_queue.resume(upload_path, job['upload_id'], key=filename)
+        print(f"  -> Resuming Strava status checks for upload {job['upload_id']}")
+        return
+
+    journal_record(filename, 'upload_queued', upload_path=upload_path)
+    # Upload and status polling happen on the background stage so the
+    # next ride can be converted while Strava processes this one.
+    upload_queue.submit(upload_path, activity_type="virtualride", key=filename)
+    print(f"  -> Queued for Strava upload: {os.path.basename(upload_path)}")
+
+def resume_pending_uploads():
+    """Requeue uploads that were interrupted by a restart after their original was archived."""
+    for job in journal.pending_uploads():
+        if os.path.exists(os.path.join(BASE_DIRECTORY, ORIGINAL_DIR_NAME, job['filename'])):
+            continue  # Still in original/, process_file will pick it up
+        if not job['upload_path'] or not os.path.exists(job['upload_path']):
+            print(f"Cannot resume Strava upload for {job['filename']}: converted file is missing")
+            journal_record(job['filename'], FAILED, error="Converted file missing on resume")
+            continue
+        print(f"Resuming Strava upload for {job['filename']} ({job['stage']})")
+        queue_upload(job['filename'], job['upload_path'], job)
+
+def process_file(filename, result=None, job=None, digest=None, staged=None):
+    """Process a single PWX file found in the original directory.
+
+    `result` is the ConversionResult when the conversion already ran in the worker
+    pool; otherwise the file is converted here. Stages that the job journal shows as
+    already done by an earlier run are not repeated, and copies of a ride that was
+    already converted are archived without converting or uploading them again.
+    `digest` is the file's content hash if the caller already computed it, and
+    `staged` the StagedInput if the caller already staged it.
+    """
+    # Input is now inside 'original'
+    input_path = os.path.join(BASE_DIRECTORY, ORIGINAL_DIR_NAME, filename)
     
     print(f"\nFound file: {filename}")
     print(f"Starting processing: {filename}...")
     sys.stdout.flush()
+    started = time.perf_counter()
+    timings = {}
     
     try:
-        # 1. Convert to TCX
-        convert_pwx_to_tcx(input_path, tcx_path, strava_optimized=STRAVA_ENABLED)
-        set_permissions(tcx_path)
-        print(f"  -> Generated TCX: converted/{tcx_filename}")
-
-        # 2. Convert to FIT (if enabled)
-        if FIT_SUPPORT_ENABLED:
-            fit_filename = f"{base_name}.fit"
-            fit_path = os.path.join(BASE_DIRECTORY, CONVERTED_DIR_NAME, fit_filename)
-            try:
-                convert_pwx_to_fit(input_path, fit_path, strava_optimized=STRAVA_ENABLED)
-                set_permissions(fit_path)
-                if os.path.exists(fit_path):
-                    print(f"  -> Generated FIT: {fit_path}")
-                else:
-                    print(f"  -> WARNING: FIT file not found at expected path: {fit_path}")
-            except Exception as e:
-                print(f"  -> FIT Conversion Failed: {e}")
+        if job is None:
+            job = journal_start(filename)
+        if staged is None:
+            staged = stage_file(input_path)
+        if digest is None:
+            digest = staged.content_hash
+        # Parse once; the ride timestamp names the outputs and both converters share the samples
+        resumed = False
+        if result is None:
+            result = resume_result(input_path, job)
+            resumed = result is not None
+            if resumed:
+                print(f"  -> Resuming from journal (stage: {job['stage']})")
+        if not resumed:
+            # Checked for pool results too, to catch a second copy converted in the same batch
+            known = known_ride(content_hash=digest, fingerprint=result.fingerprint if result else None)
+            if known:
+                archive_duplicate(filename, input_path, known, digest, timings, started)
+                return
+        if result is None:
+            result = convert_ride(staged.path, os.path.join(BASE_DIRECTORY, CONVERTED_DIR_NAME),
+                                  skip_fingerprints=known_fingerprints(), **conversion_options())
+        if result.log:
+            sys.stdout.write(result.log)
+        if result.error:
+            raise Exception(result.error)
+        if result.skipped:
+            known = known_ride(fingerprint=result.fingerprint)
+            if known:
+                timings.update(result.timings)
+                archive_duplicate(filename, input_path, known, digest, timings, started)
+                return
+            # The earlier outputs have gone missing; convert it again after all
+            result = convert_ride(staged.path, os.path.join(BASE_DIRECTORY, CONVERTED_DIR_NAME),
+                                  **conversion_options())
+            if result.log:
+                sys.stdout.write(result.log)
+            if result.error:
+                raise Exception(result.error)
+        timings.update(result.timings)
+        journal_record(filename, 'parsed', base_name=result.base_name, sample_count=result.sample_count)
+
+        # 1. TCX is required
+        if 'tcx' in result.errors:
+            raise Exception(result.errors['tcx'])
+        tcx_path = result.outputs['tcx']
+        journal_record(filename, 'tcx', tcx_path=tcx_path)
+        print(f"  -> Generated TCX: converted/{os.path.basename(tcx_path)}")
+
+        # 2. FIT (if enabled) is best effort
+        fit_path = result.outputs.get('fit')
+        if 'fit' in result.errors:
+            print(f"  -> FIT Conversion Failed: {result.errors['fit']}")
+        elif fit_path:
+            if os.path.exists(fit_path):
+                journal_record(filename, 'fit', fit_path=fit_path)
+                print(f"  -> Generated FIT: {fit_path}")
+            else:
+                print(f"  -> WARNING: FIT file not found at expected path: {fit_path}")
         else:
-            print("  -> FIT conversion skipped (library missing)")
+            print("  -> FIT conversion skipped")
+
+        archive_ride(filename, result)
+        index_ride(filename, result)
+
+        if journal is not None and digest:
+            journal.remember_ride(digest, result.fingerprint, filename, result.base_name, tcx_path,
+                                  result.outputs.get('fit'))
         
         # 3. Import to Strava (if enabled)
         if STRAVA_ENABLED:
             # Prefer FIT for Strava if it exists, otherwise use TCX
             upload_path = None
-            if FIT_SUPPORT_ENABLED:
-                fit_filename = f"{base_name}.fit"
-                fit_path = os.path.join(BASE_DIRECTORY, CONVERTED_DIR_NAME, fit_filename)
-                if os.path.exists(fit_path):
-                    upload_path = fit_path
+            if fit_path and os.path.exists(fit_path):
+                upload_path = fit_path
             
             if not upload_path:
                 upload_path = tcx_path
             
-            print(f"  -> Uploading to Strava: {os.path.basename(upload_path)}...")
-            try:
-                # Use virtualride type to ensure Strava trusts the elevation data 
-                # and doesn't apply map-based correction to static GPS.
-                result = strava_uploader.upload_file(upload_path, activity_type="virtualride")
-                if result == "duplicate":
-                    pass # Message already printed by uploader
-                elif result:
-                    print(f"  -> Strava upload initiated (ID: {result})")
-                    print("  Waiting for Strava to process...", end="", flush=True)
-                    # Poll for activity ID (max 15 seconds)
-                    activity_id = None
-                    for _ in range(5):
-                        time.sleep(3)
-                        print(".", end="", flush=True)
-                        status = strava_uploader.check_upload_status(result)
-                        if status and status.get('activity_id'):
-                            activity_id = status.get('activity_id')
-                            break
-                        if status and status.get('error'):
-                            err_msg = status.get('error', '')
-                            if 'duplicate' in err_msg.lower() or 'already exists' in err_msg.lower():
-                                print(f"\n  -> Note: This activity is already on Strava (Duplicate).")
-                                result = "duplicate" # Mark as duplicate so we don't print "processing" fail
-                            else:
-                                print(f"\n  -> Strava Processing Error: {err_msg}")
-                            break
-                    
-                    if activity_id:
-                        print(f"\n  -> SUCCESS! Strava Activity: https://www.strava.com/activities/{activity_id}")
-                    elif result == "duplicate":
-                        pass
-                    else:
-                        print("\n  -> Upload still processing - check your Strava account shortly.")
-                else:
-                    print("  -> Strava upload failed (check logs for details)")
-            except Exception as e:
-                print(f"  -> Strava upload error: {e}")
+            queue_upload(filename, upload_path, job)
         
         # Move original file to 'processed'
         processed_dest = os.path.join(BASE_DIRECTORY, PROCESSED_DIR_NAME, filename)
+        move_start = time.perf_counter()
         safe_move(input_path, processed_dest)
         set_permissions(processed_dest)
+        timings['move'] = time.perf_counter() - move_start
+        journal_record(filename, archived=1)
         
         print(f"Completed processing: {filename}")
         print(f"  -> Original moved to processed/")
+        timings['total'] = time.perf_counter() - started
+        record_file_metrics('processed', timings, result.sample_count)
         sys.stdout.flush()
         
     except Exception as e:
         print(f"  -> FAILED: {e}")
+        journal_record(filename, FAILED, error=str(e))
         # Move failed file to 'failed'
         try:
             failed_dest = os.path.join(BASE_DIRECTORY, FAILED_DIR_NAME, filename)
             safe_move(input_path, failed_dest)
             set_permissions(failed_dest)
+            journal_record(filename, archived=1)
             print(f"  -> Moved original to failed/")
         except Exception as move_err:
             print(f"  -> CRITICAL: Could not move failed file: {move_err}")
+        timings['total'] = time.perf_counter() - started
+        record_file_metrics('failed', timings)
+    finally:
+        if staged is not None:
+            staged.close()
+
+def archive_duplicate(filename, input_path, known, digest, timings, started):
+    """Move a copy of an already converted ride to processed/ without converting or uploading it."""
+    if digest and known['content_hash'] == digest:
+        reason = "identical file"
+    else:
+        reason = "same start time, duration and distance"
+    print(f"  -> Duplicate of {known['filename']} ({reason}); reusing converted/{os.path.basename(known['tcx_path'])}")
+    journal_record(filename, DUPLICATE, base_name=known['base_name'], tcx_path=known['tcx_path'],
+                   fit_path=known['fit_path'])
+    processed_dest = os.path.join(BASE_DIRECTORY, PROCESSED_DIR_NAME, filename)
+    move_start = time.perf_counter()
+    safe_move(input_path, processed_dest)
+    set_permissions(processed_dest)
+    timings['move'] = time.perf_counter() - move_start
+    journal_record(filename, archived=1)
+    print(f"Completed processing: {filename}")
+    print(f"  -> Original moved to processed/ (no conversion or upload needed)")
+    timings['total'] = time.perf_counter() - started
+    record_file_metrics(DUPLICATE, timings)
+    sys.stdout.flush()
+
+def process_files(filenames, pool):
+    """Convert a batch of files (in parallel if the pool has workers), then finish each in order.
+
+    Files the journal shows as already converted by an earlier run, and exact copies of
+    rides already in converted/, skip the pool. Rides matching a known fingerprint are
+    only parsed.
+    """
+    jobs = {}
+    staged = {}
+    handled_inline = {}
+    for filename in filenames:
+        input_path = os.path.join(BASE_DIRECTORY, ORIGINAL_DIR_NAME, filename)
+        jobs[filename] = journal_start(filename)
+        try:
+            staged[filename] = stage_file(input_path)
+        except Exception:
+            # process_file tries again and moves the file to failed/ if it is still unreadable
+            staged[filename] = None
+            handled_inline[filename] = True
+            continue
+        handled_inline[filename] = (resume_result(input_path, jobs[filename]) is not None
+                                    or known_ride(content_hash=staged[filename].content_hash) is not None)
+
+    to_convert = [staged[filename].path for filename in filenames if not handled_inline[filename]]
+    results = pool.run(to_convert, os.path.join(BASE_DIRECTORY, CONVERTED_DIR_NAME),
+                       skip_fingerprints=known_fingerprints(), **conversion_options())
+    try:
+        for remaining, filename in enumerate(filenames):
+            METRICS.set('velotron_backlog_files', len(filenames) - remaining)
+            # Resumed and duplicate files are picked up again inside process_file
+            result = None if handled_inline[filename] else next(results)[1]
+            staged_input = staged[filename]
+            process_file(filename, result=result, job=jobs[filename],
+                         digest=staged_input.content_hash if staged_input else None, staged=staged_input)
+    finally:
+        # Local copies left over if the batch was interrupted
+        for staged_input in staged.values():
+            if staged_input is not None:
+                staged_input.close()
+    METRICS.set('velotron_backlog_files', 0)
 
 def monitor_directory():
     """Main monitoring loop."""
@@ -279,7 +570,20 @@ def monitor_directory():
     if FIT_SUPPORT_ENABLED:
         print("FIT Conversion: ENABLED")
     else:
-        print("FIT Conversion: DISABLED (fit_tool library missing)")
+        print("FIT Conversion: DISABLED")
+    if COMPRESS_OUTPUT:
+        print("Compressed Output: ENABLED (.tcx.gz/.fit.gz)")
+    if FIT_SUPPORT_ENABLED and COMPACT_FIT:
+        print("Compact FIT: ENABLED (compressed timestamp records)")
+    if RIDE_ARCHIVE:
+        print(f"Ride Archive: {ride_archive_dir()}")
+    if recording_mode() != RECORDING_MODE:
+        print(f"Warning: RECORDING_MODE={RECORDING_MODE} with RECORDING_INTERVAL={RECORDING_INTERVAL:g} is not valid "
+              f"(modes: {', '.join(RECORDING_MODES)}, interval > 0); writing every sample.")
+    elif RECORDING_MODE == 'rate':
+        print(f"Recording: one point every {RECORDING_INTERVAL:g}s")
+    elif RECORDING_MODE == 'smart':
+        print("Recording: smart (points only where the ride changes)")
 
     if STRAVA_ENABLED:
         print("Strava Integration: ENABLED\n")
@@ -292,22 +596,76 @@ def monitor_directory():
     sys.stdout.flush()
     
     setup_directories()
+
+    global journal, ride_index, upload_queue, stage_inputs
+    try:
+        journal = JobJournal(JOURNAL_PATH)
+        print(f"Job Journal: {JOURNAL_PATH}")
+    except Exception as e:
+        print(f"Warning: could not open job journal at {JOURNAL_PATH} ({e}); restarts will not resume work.")
+    if RIDE_INDEX:
+        try:
+            ride_index = RideIndex(RIDE_INDEX_PATH)
+            print(f"Ride Index: {RIDE_INDEX_PATH}")
+        except Exception as e:
+            print(f"Warning: could not open ride index at {RIDE_INDEX_PATH} ({e}); ride summaries will not be kept.")
+
+    stage_inputs = staging_enabled(BASE_DIRECTORY)
+    if stage_inputs:
+        print(f"Input Staging: ENABLED (copying to {STAGING_DIR or tempfile.gettempdir()} before parsing)")
+
+    watcher = DirectoryWatcher(watch_dir, suffix=".pwx", settle_time=SETTLE_SECONDS,
+                               min_interval=POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL,
+                               mode=WATCH_MODE)
+    print(f"Watch Mode: {watcher.mode}")
+    pool = ConversionPool(WORKERS)
+    print(f"Conversion Workers: {pool.workers}")
+    sys.stdout.flush()
+    if STRAVA_ENABLED:
+        upload_queue = UploadQueue(strava_uploader, on_result=upload_finished, on_uploaded=upload_started,
+                                   rate_limit=strava_uploader.rate_limit)
+        upload_queue.start()
+        METRICS.add_collector(collect_upload_metrics)
+        if journal is not None:
+            resume_pending_uploads()
+
+    METRICS.set('velotron_backlog_files', 0)
+    if METRICS_PORT:
+        try:
+            METRICS.serve(METRICS_PORT, METRICS_HOST)
+            print(f"Metrics: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+        except OSError as e:
+            print(f"Warning: could not start metrics endpoint on port {METRICS_PORT}: {e}")
+    if METRICS_FILE:
+        print(f"Metrics File: {METRICS_FILE}")
+        export_metrics()
+    sys.stdout.flush()
     
+    print("Press Ctrl+C to stop.")
+    sys.stdout.flush()
+
     try:
         while True:
-            # List files in the watch directory
-            for filename in os.listdir(watch_dir):
-                if filename.lower().endswith(".pwx"):
-                    # Check if it's a file (not a dir)
-                    if os.path.isfile(os.path.join(watch_dir, filename)):
-                        process_file(filename)
-            
-            time.sleep(POLL_INTERVAL)
+            # Blocks until one or more PWX files have finished copying
+            process_files(watcher.poll(), pool)
             
     except KeyboardInterrupt:
         print("\nStopping monitor.")
+    finally:
+        watcher.close()
+        pool.close()
+        if upload_queue is not None:
+            if upload_queue.depth():
+                print(f"Waiting for {upload_queue.depth()} Strava upload(s) to finish...")
+            upload_queue.stop(timeout=30)
+        if journal is not None:
+            journal.close()
+        if ride_index is not None:
+            ride_index.close()
 
-if __name__ == "__main__":
+def main(argv=None):
+    configure(argv)
     monitor_directory()
 
-print(f"Press Ctrl+C to stop.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import io
+import os
+import gzip
+import shutil
+import tempfile
+import functools
+import contextlib
+
+from dir_watcher import is_network_path
+
+GZIP_SUFFIX = ".gz"
+
+# Level 6 gets nearly all of level 9's saving on TCX at a fraction of the CPU time
+GZIP_LEVEL = 6
+
+# Writers produce many small chunks; batch them before they reach the file (or gzip)
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# Permissions Configuration (Unraid/LinuxServer style)
+# Only active if PUID/PGID are explicitly set in environment
+PUID = os.getenv('PUID')
+PGID = os.getenv('PGID')
+if PUID: PUID = int(PUID)
+if PGID: PGID = int(PGID)
+
+def set_permissions(path):
+    """Apply PUID/PGID permissions only if configured."""
+    if not PUID or not PGID:
+        return
+    try:
+        os.chown(path, PUID, PGID)
+    except Exception as e:
+        pass # Silently fail on local systems where this isn't supported
+
+def is_compressed(path):
+    return path.lower().endswith(GZIP_SUFFIX)
+
+def output_name(base_name, fmt, compress=False):
+    """File name for a converted ride, e.g. 2025-12-03_05-48-22.tcx or .tcx.gz."""
+    return f"{base_name}.{fmt}{GZIP_SUFFIX if compress else ''}"
+
+@functools.lru_cache(maxsize=None)
+def _network_directory(directory):
+    return is_network_path(directory)
+
+def _open_stream(path, write_path, encoding, errors, buffering):
+    """Open `write_path` for writing `path`'s contents; returns (stream, raw file to close after it)."""
+    if not is_compressed(path):
+        if encoding is None:
+            return open(write_path, 'wb', buffering=buffering), None
+        return open(write_path, 'w', encoding=encoding, errors=errors, buffering=buffering), None
+
+    raw = open(write_path, 'wb')
+    # Named after the final file, and without a timestamp, so the same ride always gives the same bytes
+    compressor = gzip.GzipFile(filename=path, mode='wb', fileobj=raw, compresslevel=GZIP_LEVEL, mtime=0)
+    stream = io.BufferedWriter(compressor, buffering)
+    if encoding is not None:
+        stream = io.TextIOWrapper(stream, encoding=encoding, errors=errors)
+    return stream, raw
+
+@contextlib.contextmanager
+def open_output(path, encoding=None, errors=None, buffering=WRITE_BUFFER_SIZE):
+    """Write an output file atomically; gzip-compressed if `path` ends in .gz.
+
+    Yields a text stream when `encoding` is given, otherwise a binary one. The data
+    goes to a hidden temp file that gets PUID/PGID permissions and is then renamed
+    over `path`, so nothing watching the folder ever sees a partial file. On a network
+    share the file is written to local temp storage first and copied across in one go.
+    If the block raises, nothing is left behind.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    hidden_path = os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+    local_path = None
+    if _network_directory(directory):
+        fd, local_path = tempfile.mkstemp(prefix='velotron-', suffix=f"-{name}")
+        os.close(fd)
+
+    try:
+        stream, raw = _open_stream(path, local_path or hidden_path, encoding, errors, buffering)
+        try:
+            yield stream
+        finally:
+            stream.close()
+            if raw is not None:
+                raw.close()
+        if local_path:
+            shutil.copyfile(local_path, hidden_path)
+        set_permissions(hidden_path)
+        os.replace(hidden_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(hidden_path)
+        raise
+    finally:
+        if local_path:
+            with contextlib.suppress(OSError):
+                os.remove(local_path)
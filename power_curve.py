@@ -0,0 +1,276 @@
+"""Mean-maximal power and heart rate curves from the ride archive.
+
+A ride's curve holds its best average power and heart rate for each duration: every
+second up to DENSE_SECONDS, then steps of STEP_RATIO up to the ride's full length.
+Samples are first put on a 1 second grid; each duration's best window then comes
+from differences of the cumulative sum, so a duration costs one pass over the ride.
+From COARSE_FROM on, windows start on block boundaries (blocks of duration /
+COARSE_BLOCKS seconds), which keeps long rides fast and the result within about 1%.
+
+Curves are cached per ride in the archive's curves/ directory, and merged into an
+all-time curve that only has to look at rides added since the last update. The
+monitor computes each ride's curve in its conversion worker and only merges it here.
+
+    python power_curve.py /veloMonitor/archive --since 2025-01-01
+"""
+import os
+import sys
+import json
+import argparse
+import datetime
+from array import array
+from itertools import accumulate
+from operator import sub
+
+from output_files import open_output
+
+CURVE_CHANNELS = ('pwr', 'hr')
+
+# Bump when the way curves are computed changes, so cached curves are recomputed
+CURVE_VERSION = 1
+
+CURVES_DIR_NAME = "curves"
+ALL_TIME_FILENAME = "all_time.json"
+
+DENSE_SECONDS = 120   # every duration up to 2 minutes
+STEP_RATIO = 1.02     # then 2% apart
+COARSE_FROM = 1200    # from 20 minutes on, windows are aligned to blocks...
+COARSE_BLOCKS = 600   # ...of duration / 600 seconds (2 s for 20 minutes, 12 s for 2 hours)
+
+# Dropouts up to this long keep the last value; longer gaps count as zero (stopped)
+MAX_HOLD_SECONDS = 3
+
+# Durations shown by the command line report
+REPORT_DURATIONS = (1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200, 10800, 18000)
+
+def curve_durations(length):
+    """The durations (in seconds) a curve is computed for, for a ride `length` seconds long."""
+    durations = list(range(1, min(DENSE_SECONDS, length) + 1))
+    duration = DENSE_SECONDS
+    while duration < length:
+        duration = max(duration + 1, int(duration * STEP_RATIO))
+        if duration >= COARSE_FROM:
+            # A whole number of blocks
+            duration -= duration % (duration // COARSE_BLOCKS)
+        duration = min(duration, length)
+        if duration > durations[-1]:
+            durations.append(duration)
+    return durations
+
+def resample(timeoffset, values, present, max_hold=MAX_HOLD_SECONDS):
+    """Average a channel into 1 second bins (array('d')); None if it was never recorded."""
+    if not len(timeoffset) or not any(present):
+        return None
+    first = timeoffset[0]
+    length = int(timeoffset[-1] - first) + 1
+    sums = array('d', bytes(8 * length))
+    counts = array('I', bytes(4 * length))
+    for time_offset, value, is_present in zip(timeoffset, values, present):
+        if is_present:
+            index = int(time_offset - first)
+            sums[index] += value
+            counts[index] += 1
+
+    series = array('d', bytes(8 * length))
+    last = None
+    last_index = 0
+    for index in range(length):
+        if counts[index]:
+            last = sums[index] / counts[index]
+            last_index = index
+            series[index] = last
+        elif last is not None and index - last_index <= max_hold:
+            series[index] = last
+    return series
+
+def mean_max(series, durations):
+    """Best average of `series` over each of `durations` (durations longer than it are skipped)."""
+    total = array('d', accumulate(series, initial=0.0))
+    count = len(series)
+    best = {}
+    for duration in durations:
+        if duration > count:
+            break
+        block = duration // COARSE_BLOCKS if duration >= COARSE_FROM else 1
+        if block > 1 and count // block < count + 1 - duration:
+            # Cumulative sums at block boundaries; windows of duration / block blocks
+            blocks = total[::block]
+            width = duration // block
+            best[duration] = max(map(sub, blocks[width:], blocks[:-width])) / (width * block)
+        else:
+            # total[i + d] - total[i] for every window start, in C
+            best[duration] = max(map(sub, total[duration:], total[:count + 1 - duration])) / duration
+    return best
+
+def ride_curve(archived):
+    """Curves for an ArchivedRide, as {channel: {duration: best average}}."""
+    return channel_curves(archived.columns['timeoffset'], archived.column)
+
+def samples_curve(samples):
+    """Curves for a ride's SampleColumns, the same as ride_curve() of its archived copy."""
+    def column(channel):
+        return samples.values[channel], samples.present[channel]
+    return channel_curves(samples.timeoffset, column)
+
+def channel_curves(timeoffset, column):
+    """Curves from the sample times and column(channel) -> (values, present) or None."""
+    curves = {}
+    for channel in CURVE_CHANNELS:
+        column_values = column(channel)
+        series = resample(timeoffset, *column_values) if column_values else None
+        if series is None:
+            continue
+        curves[channel] = {duration: round(value, 1)
+                           for duration, value in mean_max(series, curve_durations(len(series))).items()}
+    return curves
+
+def merge_curves(best, curve, label):
+    """Merge a ride's curve into `best` ({channel: {duration: [value, label]}}) in place."""
+    for channel, values in curve.items():
+        channel_best = best.setdefault(channel, {})
+        for duration, value in values.items():
+            if duration not in channel_best or value > channel_best[duration][0]:
+                channel_best[duration] = [value, label]
+    return best
+
+def _decode(curves):
+    """JSON object keys are strings; turn durations back into ints."""
+    return {channel: {int(duration): value for duration, value in values.items()}
+            for channel, values in curves.items()}
+
+def _write_json(path, data):
+    with open_output(path, encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+
+class CurveStore:
+    """Per-ride curve cache and all-time curve, kept in the ride archive."""
+
+    def __init__(self, archive):
+        self.archive = archive
+        self.path = os.path.join(archive.path, CURVES_DIR_NAME)
+        self.all_time_path = os.path.join(self.path, ALL_TIME_FILENAME)
+
+    def _ride_path(self, base_name):
+        return os.path.join(self.path, f"{base_name}.json")
+
+    def _write_ride(self, entry, curves):
+        os.makedirs(self.path, exist_ok=True)
+        _write_json(self._ride_path(entry['base_name']),
+                    {'version': CURVE_VERSION, 'fingerprint': entry['fingerprint'], 'curves': curves})
+
+    def _load_all_time(self):
+        try:
+            with open(self.all_time_path, encoding='utf-8') as f:
+                saved = json.load(f)
+            if saved.get('version') == CURVE_VERSION:
+                return saved
+        except (OSError, ValueError):
+            pass
+        return {'version': CURVE_VERSION, 'rides': {}, 'curves': {}}
+
+    def _save_all_time(self, state, best):
+        state['curves'] = best
+        os.makedirs(self.path, exist_ok=True)
+        _write_json(self.all_time_path, state)
+
+    def add(self, entry, curves):
+        """Cache a newly archived ride's curve (computed at conversion) and merge it into the all-time curve.
+
+        Only this ride's curve and the all-time file are touched, so this stays cheap
+        however many rides the archive holds. Returns the all-time curve.
+        """
+        self._write_ride(entry, curves)
+        state = self._load_all_time()
+        known = state['rides'].get(entry['base_name'])
+        if known is not None and known != entry['fingerprint']:
+            # A re-archived ride may have held best values that no longer stand
+            return self.all_time()
+        best = _decode(state['curves'])
+        if known is None:
+            merge_curves(best, curves, entry['base_name'])
+            state['rides'][entry['base_name']] = entry['fingerprint']
+            self._save_all_time(state, best)
+        return best
+
+    def ride(self, entry):
+        """The curve for a manifest entry, from the cache or computed from the archived columns."""
+        path = self._ride_path(entry['base_name'])
+        try:
+            with open(path, encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('version') == CURVE_VERSION and cached.get('fingerprint') == entry['fingerprint']:
+                return _decode(cached['curves'])
+        except (OSError, ValueError, KeyError):
+            pass
+
+        with self.archive.open(entry) as archived:
+            curves = ride_curve(archived)
+        self._write_ride(entry, curves)
+        return curves
+
+    def best(self, since=None, until=None):
+        """Best curve over the archived rides that started in [since, until)."""
+        best = {}
+        for entry in self.archive.rides(since=since, until=until):
+            merge_curves(best, self.ride(entry), entry['base_name'])
+        return best
+
+    def all_time(self):
+        """The all-time curve, updated with any rides archived since it was last saved."""
+        state = self._load_all_time()
+        best = _decode(state['curves'])
+
+        # A ride re-archived with a different fingerprint means the totals changed; start over
+        entries = self.archive.rides()
+        if any(state['rides'].get(entry['base_name'], entry['fingerprint']) != entry['fingerprint']
+               for entry in entries):
+            state['rides'], best = {}, {}
+
+        added = [entry for entry in entries if entry['base_name'] not in state['rides']]
+        for entry in added:
+            merge_curves(best, self.ride(entry), entry['base_name'])
+            state['rides'][entry['base_name']] = entry['fingerprint']
+        if added or not os.path.exists(self.all_time_path):
+            self._save_all_time(state, best)
+        return best
+
+def format_duration(seconds):
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m{seconds % 60:02d}s" if seconds % 60 else f"{seconds // 60}m"
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m" if seconds % 3600 else f"{seconds // 3600}h"
+
+def main(argv=None):
+    from ride_archive import RideArchive
+
+    parser = argparse.ArgumentParser(description='Show mean-maximal power and heart rate from the ride archive.')
+    parser.add_argument('archive', help='Ride archive directory (e.g. /veloMonitor/archive)')
+    parser.add_argument('--since', type=datetime.date.fromisoformat, help='Only rides from this date (YYYY-MM-DD)')
+    parser.add_argument('--until', type=datetime.date.fromisoformat, help='Only rides before this date')
+    args = parser.parse_args(argv)
+
+    store = CurveStore(RideArchive(args.archive))
+    if args.since or args.until:
+        def bound(day):
+            return datetime.datetime.combine(day, datetime.time()).astimezone() if day else None
+        best = store.best(since=bound(args.since), until=bound(args.until))
+    else:
+        best = store.all_time()
+    if not best:
+        print("No rides with power or heart rate in the archive.")
+        return 1
+
+    power, heart_rate = best.get('pwr', {}), best.get('hr', {})
+    print(f"{'duration':>9} {'power':>7} {'ride':<20} {'hr':>5} {'ride':<20}")
+    for duration in REPORT_DURATIONS:
+        if duration not in power and duration not in heart_rate:
+            continue
+        watts, watts_ride = power.get(duration, (None, ''))
+        bpm, bpm_ride = heart_rate.get(duration, (None, ''))
+        print(f"{format_duration(duration):>9} {'' if watts is None else f'{watts:.0f} W':>7} {watts_ride:<20} "
+              f"{'' if bpm is None else f'{bpm:.0f}':>5} {bpm_ride:<20}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+import xml.etree.ElementTree as ET
+import datetime
+import time as time_module
+import math
+from array import array
+from itertools import compress
+from operator import sub
+
+# Per-sample channels we carry through to TCX/FIT, in PWX element names
+SAMPLE_CHANNELS = ('alt', 'dist', 'hr', 'cad', 'pwr', 'spd')
+
+# Channels the TCX writer copies verbatim; we remember their decimal places so the
+# decoded float can be printed back exactly as it appeared in the PWX.
+VERBATIM_CHANNELS = ('alt', 'spd')
+_UNKNOWN_DECIMALS = 255
+
+def local_timezone():
+    """Return the local UTC offset as a fixed timezone."""
+    if time_module.daylight:
+        utc_offset = -time_module.altzone
+    else:
+        utc_offset = -time_module.timezone
+    return datetime.timezone(datetime.timedelta(seconds=utc_offset))
+
+def _six_digit_fraction(time_str):
+    """Pad or cut fractional seconds to 6 digits; Python 3.9's fromisoformat only takes 3 or 6."""
+    head, dot, tail = time_str.partition('.')
+    if not dot:
+        return time_str
+    digits = len(tail) - len(tail.lstrip('0123456789'))
+    return f"{head}.{tail[:digits][:6].ljust(6, '0')}{tail[digits:]}"
+
+def parse_start_time(time_str):
+    """Parse a PWX <time> value, assuming local time if no timezone is given."""
+    start_time = datetime.datetime.fromisoformat(_six_digit_fraction(time_str.strip()))
+    if start_time.tzinfo is None:
+        start_time = start_time.replace(tzinfo=local_timezone())
+    return start_time
+
+def _decimal_places(text, value):
+    """Decimal places that reproduce `text` from `value`, or _UNKNOWN_DECIMALS."""
+    whole, dot, frac = text.partition('.')
+    places = len(frac)
+    if places < _UNKNOWN_DECIMALS and f"{value:.{places}f}" == text:
+        return places
+    return _UNKNOWN_DECIMALS
+
+_US_PER_SECOND = 1000000
+_US_PER_DAY = 86400 * _US_PER_SECOND
+
+# "HH:MM:" for every minute of the day and "SS" for every second, so formatting is two lookups
+_MINUTE_FACES = tuple(f"{h:02d}:{m:02d}:" for h in range(24) for m in range(60))
+_SECOND_FACES = tuple(f"{sec:02d}" for sec in range(60))
+
+def offset_microseconds(time_offset):
+    """Whole microseconds in a float offset, rounded the same way as datetime.timedelta."""
+    if time_offset.is_integer():
+        return int(time_offset) * _US_PER_SECOND
+    frac, whole = math.modf(time_offset)
+    return int(whole) * _US_PER_SECOND + round(frac * _US_PER_SECOND)
+
+class RideClock:
+    """Turn sample time offsets into timestamps without creating datetime objects.
+
+    Everything is done in integer microseconds from the ride start; the results are
+    identical to `start_time + timedelta(seconds=offset)` followed by isoformat() or
+    round(timestamp() * 1000).
+    """
+
+    def __init__(self, start_time):
+        epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+        start_delta = start_time - epoch
+        self.start_epoch_us = ((start_delta.days * 86400 + start_delta.seconds) * _US_PER_SECOND
+                               + start_delta.microseconds)
+        # Local wall clock, counted from 0001-01-01 (ordinal 1)
+        wall = start_time.replace(tzinfo=None)
+        self.start_wall_us = (((wall.toordinal() - 1) * 86400 + wall.hour * 3600 + wall.minute * 60
+                               + wall.second) * _US_PER_SECOND + wall.microsecond)
+        # "+HH:MM" (or "" for naive times), as isoformat() would append it
+        self.tz_suffix = start_time.replace(microsecond=0).isoformat()[19:]
+        self._day_prefixes = {}
+
+    def epoch_ms(self, time_offset):
+        """Unix epoch milliseconds of a sample."""
+        epoch_us = self.start_epoch_us + offset_microseconds(time_offset)
+        if epoch_us % 1000 == 0:
+            return epoch_us // 1000
+        return round(epoch_us / _US_PER_SECOND * 1000)
+
+    def epoch_ms_column(self, time_offsets):
+        """Unix epoch milliseconds for a whole column of offsets."""
+        return list(map(self.epoch_ms, time_offsets))
+
+    def isoformat(self, time_offset):
+        """ISO 8601 local timestamp of a sample, e.g. 2025-12-03T05:48:22-07:00."""
+        days, day_us = divmod(self.start_wall_us + offset_microseconds(time_offset), _US_PER_DAY)
+        prefix = self._day_prefixes.get(days)
+        if prefix is None:
+            prefix = datetime.date.fromordinal(days + 1).isoformat() + "T"
+            self._day_prefixes[days] = prefix
+        seconds, micro = divmod(day_us, _US_PER_SECOND)
+        minutes, second = divmod(seconds, 60)
+        if micro:
+            return f"{prefix}{_MINUTE_FACES[minutes]}{_SECOND_FACES[second]}.{micro:06d}{self.tz_suffix}"
+        return f"{prefix}{_MINUTE_FACES[minutes]}{_SECOND_FACES[second]}{self.tz_suffix}"
+
+class SampleColumns:
+    """Ride samples decoded into typed columns.
+
+    Each channel is an array('d') with a parallel bytearray mask (1 = present). Missing
+    values are stored as 0.0 so all columns stay the same length as `timeoffset`.
+    """
+
+    def __init__(self):
+        self.timeoffset = array('d')
+        self.values = {channel: array('d') for channel in SAMPLE_CHANNELS}
+        self.present = {channel: bytearray() for channel in SAMPLE_CHANNELS}
+        self.decimals = {channel: bytearray() for channel in VERBATIM_CHANNELS}
+
+    def __len__(self):
+        return len(self.timeoffset)
+
+    def append(self, time_offset, values):
+        """Append one sample given as a timeoffset and a {channel: text} dict."""
+        self.timeoffset.append(time_offset)
+        for channel in SAMPLE_CHANNELS:
+            text = values.get(channel)
+            if text is None:
+                value = 0.0
+                self.present[channel].append(0)
+            else:
+                value = float(text)
+                self.present[channel].append(1)
+            self.values[channel].append(value)
+            if channel in self.decimals:
+                self.decimals[channel].append(_UNKNOWN_DECIMALS if text is None else _decimal_places(text, value))
+
+    def select(self, indices):
+        """A new SampleColumns with only the samples at `indices` (ascending)."""
+        selected = SampleColumns()
+        selected.timeoffset = array('d', map(self.timeoffset.__getitem__, indices))
+        for channel in SAMPLE_CHANNELS:
+            selected.values[channel] = array('d', map(self.values[channel].__getitem__, indices))
+            selected.present[channel] = bytearray(map(self.present[channel].__getitem__, indices))
+        for channel in VERBATIM_CHANNELS:
+            selected.decimals[channel] = bytearray(map(self.decimals[channel].__getitem__, indices))
+        return selected
+
+    def format_value(self, channel, index):
+        """Format a verbatim channel value the way it was written in the PWX where possible."""
+        value = self.values[channel][index]
+        places = self.decimals[channel][index]
+        if places == _UNKNOWN_DECIMALS:
+            return repr(value)
+        return f"{value:.{places}f}"
+
+    def present_values(self, channel):
+        """Iterate over the values of a channel, skipping missing samples."""
+        return compress(self.values[channel], self.present[channel])
+
+    def max_value(self, channel):
+        """Largest value of a channel, never below 0.0."""
+        return max(max(self.present_values(channel), default=0.0), 0.0)
+
+    def elevation_gain(self):
+        """Sum of positive altitude changes between consecutive altitude samples."""
+        alts = array('d', self.present_values('alt'))
+        return sum(delta for delta in map(sub, alts[1:], alts[:-1]) if delta > 0)
+
+class PwxRide:
+    """A single parsed PWX workout shared by the TCX writer, FIT writer and filename logic."""
+
+    def __init__(self, start_time, start_time_str, samples, has_summary=False, duration=None, athlete=None):
+        self.start_time = start_time          # timezone-aware datetime
+        self.start_time_str = start_time_str  # raw <time> text, used verbatim in TCX
+        self.has_summary = has_summary        # whether <summarydata> was present
+        self.duration = duration              # summarydata/duration in seconds, or None
+        self.athlete = athlete                # athlete/name, or None
+        self.samples = samples                # SampleColumns
+
+    @property
+    def base_name(self):
+        """Output filename stem derived from the ride start, e.g. 2025-11-18_14-29-43."""
+        return self.start_time.strftime("%Y-%m-%d_%H-%M-%S")
+
+    @property
+    def clock(self):
+        """RideClock for turning sample offsets into timestamps."""
+        return RideClock(self.start_time)
+
+    @property
+    def elapsed_time(self):
+        """Time offset of the last sample in seconds (0.0 for an empty ride)."""
+        return self.samples.timeoffset[-1] if len(self.samples) else 0.0
+
+    @property
+    def fingerprint(self):
+        """Start time, duration and distance; the same ride re-exported gets the same fingerprint."""
+        return "{}|{}|{}".format(self.start_time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                 round(self.elapsed_time), round(self.samples.max_value('dist')))
+
+def _local_name(tag):
+    """Strip any XML namespace from an element tag."""
+    return tag.rpartition('}')[2]
+
+class PwxStreamReader:
+    """Incrementally parse a PWX file, yielding samples and discarding them as it goes.
+
+    Iterating yields (timeoffset, {channel: text}) tuples. Header fields seen along the
+    way (start time, summary duration, athlete name) are stored on the reader, so peak memory does not
+    grow with the length of the ride.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.found_workout = False
+        self.start_time_str = None
+        self.has_summary = False
+        self.duration = None
+        self.athlete = None
+
+    def __iter__(self):
+        path = []
+        workout = None
+        time_offset = None
+        values = {}
+
+        for event, elem in ET.iterparse(self.source, events=('start', 'end')):
+            tag = _local_name(elem.tag)
+            if event == 'start':
+                path.append(tag)
+                if tag == 'workout' and len(path) == 2 and workout is None:
+                    workout = elem
+                    self.found_workout = True
+                continue
+
+            path.pop()
+            if workout is None:
+                continue
+            depth = len(path)
+
+            if depth == 3 and path[2] == 'sample':
+                # Channel inside a sample
+                if tag == 'timeoffset':
+                    time_offset = float(elem.text)
+                elif tag in SAMPLE_CHANNELS:
+                    values[tag] = elem.text
+            elif depth == 3 and path[2] == 'summarydata' and tag == 'duration':
+                self.duration = float(elem.text)
+            elif depth == 3 and path[2] == 'athlete' and tag == 'name' and elem.text and elem.text.strip():
+                self.athlete = elem.text.strip()
+            elif depth == 2 and elem is not workout and path[1] == 'workout':
+                # Direct child of the workout
+                if tag == 'sample':
+                    if time_offset is None:
+                        raise ValueError("Sample without timeoffset in PWX file")
+                    yield time_offset, values
+                    time_offset = None
+                    values = {}
+                elif tag == 'time' and self.start_time_str is None:
+                    self.start_time_str = elem.text
+                elif tag == 'summarydata':
+                    self.has_summary = True
+                # Everything we need from this element has been copied out
+                workout.remove(elem)
+            elif elem is workout:
+                # Only the first workout is converted
+                break
+
+def read_pwx(pwx_file_path):
+    """Parse a PWX file (path or binary file object) into a PwxRide."""
+    reader = PwxStreamReader(pwx_file_path)
+    samples = SampleColumns()
+    for time_offset, values in reader:
+        samples.append(time_offset, values)
+
+    if not reader.found_workout:
+        raise ValueError("No 'workout' element found in PWX file")
+
+    start_time_str = reader.start_time_str
+    if not start_time_str:
+        raise ValueError("No start time found in PWX file")
+    try:
+        start_time = parse_start_time(start_time_str)
+    except ValueError:
+        raise ValueError(f"Could not parse start time '{start_time_str}'")
+
+    return PwxRide(start_time, start_time_str, samples,
+                   has_summary=reader.has_summary, duration=reader.duration, athlete=reader.athlete)
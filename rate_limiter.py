@@ -0,0 +1,137 @@
+import time
+import threading
+
+SHORT_WINDOW = 15 * 60   # Strava's short limit resets on the quarter hour
+DAY = 24 * 60 * 60       # and the daily limit at midnight UTC
+
+# Strava's defaults for a new app registration, used until a response tells us otherwise
+DEFAULT_LIMITS = (200, 2000)
+DEFAULT_READ_LIMITS = (100, 1000)
+
+# Status polls may only use this share of each budget; the rest is kept for uploads
+POLL_SHARE = 0.8
+
+# Returned instead of an upload id or status when Strava answers 429
+RATE_LIMITED = "rate_limited"
+
+def _parse_pair(value):
+    """Parse a "15-minute,daily" header value into two ints, or None."""
+    try:
+        short, daily = (int(part.strip()) for part in str(value).split(','))
+        return short, daily
+    except (TypeError, ValueError):
+        return None
+
+class Budget:
+    """Request counts against a 15-minute and a daily limit."""
+
+    def __init__(self, limits):
+        self.short_limit, self.daily_limit = limits
+        self.short_used = 0
+        self.daily_used = 0
+
+    def delay(self, now, share=1.0):
+        """Seconds until a request fits within `share` of both limits (0 if it fits now)."""
+        if self.daily_used >= self.daily_limit * share:
+            return DAY - now % DAY
+        if self.short_used >= self.short_limit * share:
+            return SHORT_WINDOW - now % SHORT_WINDOW
+        return 0.0
+
+class RateLimiter:
+    """Tracks Strava's rate limits from response headers and spaces out requests.
+
+    Strava reports limits and usage for the whole app registration in
+    X-RateLimit-Limit/Usage (all requests) and X-ReadRateLimit-Limit/Usage (reads),
+    as "15-minute,daily". Requests are counted locally between responses. Uploads may
+    use the whole budget; status polls (reads) stop at POLL_SHARE so there is always
+    room left to upload. After a 429 everything waits for the window to reset.
+    """
+
+    def __init__(self, limits=DEFAULT_LIMITS, read_limits=DEFAULT_READ_LIMITS, poll_share=POLL_SHARE,
+                 clock=time.time):
+        self.lock = threading.Lock()
+        self.clock = clock
+        self.poll_share = poll_share
+        self.overall = Budget(limits)
+        self.read = Budget(read_limits)
+        self.blocked_until = 0.0
+        now = clock()
+        self.window = int(now // SHORT_WINDOW)
+        self.day = int(now // DAY)
+
+    def _roll(self, now):
+        window, day = int(now // SHORT_WINDOW), int(now // DAY)
+        if window != self.window:
+            self.window = window
+            self.overall.short_used = self.read.short_used = 0
+        if day != self.day:
+            self.day = day
+            self.overall.daily_used = self.read.daily_used = 0
+
+    def _delay(self, kind, now):
+        self._roll(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if kind == 'upload':
+            return self.overall.delay(now)
+        share = self.poll_share
+        return max(self.overall.delay(now, share), self.read.delay(now, share))
+
+    def delay(self, kind='upload'):
+        """Seconds to wait before sending a request of `kind` ('upload' or 'poll')."""
+        with self.lock:
+            return self._delay(kind, self.clock())
+
+    def acquire(self, kind='upload', sleep=time.sleep):
+        """Wait until a request of `kind` fits in the budget, then count it."""
+        while True:
+            with self.lock:
+                now = self.clock()
+                wait = self._delay(kind, now)
+                if wait <= 0:
+                    self.overall.short_used += 1
+                    self.overall.daily_used += 1
+                    if kind != 'upload':
+                        self.read.short_used += 1
+                        self.read.daily_used += 1
+                    return
+            print(f"  -> Strava rate limit: waiting {wait:.0f}s before the next {kind}")
+            sleep(wait)
+
+    def update(self, headers):
+        """Take limits and usage from a Strava response's headers."""
+        if headers is None:
+            return
+        with self.lock:
+            self._roll(self.clock())
+            for budget, prefix in ((self.overall, 'X-RateLimit'), (self.read, 'X-ReadRateLimit')):
+                limits = _parse_pair(headers.get(f'{prefix}-Limit'))
+                usage = _parse_pair(headers.get(f'{prefix}-Usage'))
+                if limits:
+                    budget.short_limit, budget.daily_limit = limits
+                if usage:
+                    # The headers count requests from every client of the app, so they win
+                    budget.short_used, budget.daily_used = usage
+
+    def throttled(self, retry_after=None):
+        """Record a 429: hold all requests until the window resets (or Retry-After passes)."""
+        with self.lock:
+            now = self.clock()
+            wait = SHORT_WINDOW - now % SHORT_WINDOW
+            if self.overall.daily_used >= self.overall.daily_limit:
+                wait = DAY - now % DAY
+            try:
+                if retry_after is not None:
+                    wait = max(float(retry_after), 1.0)
+            except (TypeError, ValueError):
+                pass
+            self.blocked_until = max(self.blocked_until, now + wait)
+            return wait
+
+    def remaining(self):
+        """Requests left as (15-minute, daily) for the overall budget."""
+        with self.lock:
+            self._roll(self.clock())
+            return (max(0, self.overall.short_limit - self.overall.short_used),
+                    max(0, self.overall.daily_limit - self.overall.daily_used))
@@ -0,0 +1,101 @@
+"""Choose which samples become TCX trackpoints and FIT records.
+
+By default every PWX sample is written. Two modes write fewer points:
+
+- 'rate': at most one point per `interval` seconds (the first sample in each
+  interval), e.g. a 4 Hz Velotron log written at 1 Hz.
+- 'smart': like a head unit's smart recording, a point is kept only when power,
+  heart rate, cadence, speed or altitude has moved by at least SMART_THRESHOLDS
+  from its value at the last kept point, or SMART_MAX_GAP seconds have passed.
+  The sample before each change is kept too, so steady stretches and steps
+  survive interpolation unchanged. A channel missing from a sample is not a change.
+
+The first and last samples are always kept. Only the written points are thinned;
+ride totals (distance, duration, climbing) are still computed from every sample.
+"""
+from math import floor
+
+RECORDING_MODES = ('every', 'rate', 'smart')
+
+# Smallest change in a channel that 'smart' recording keeps a point for
+SMART_THRESHOLDS = {
+    'pwr': 5,     # watts
+    'hr': 2,      # bpm
+    'cad': 3,     # rpm
+    'spd': 0.5,   # m/s
+    'alt': 1.0,   # meters
+}
+
+# Longest stretch 'smart' recording leaves without a point, in seconds
+SMART_MAX_GAP = 10.0
+
+def rate_indices(timeoffset, interval):
+    """Indices of the first sample in each `interval` second bucket, plus the last sample."""
+    count = len(timeoffset)
+    if not count:
+        return []
+    first = timeoffset[0]
+    kept = []
+    last_bucket = None
+    for index, time_offset in enumerate(timeoffset):
+        bucket = floor((time_offset - first) / interval)
+        if bucket != last_bucket:
+            kept.append(index)
+            last_bucket = bucket
+    if kept[-1] != count - 1:
+        kept.append(count - 1)
+    return kept
+
+def smart_indices(samples, thresholds=None, max_gap=SMART_MAX_GAP):
+    """Indices of the samples 'smart' recording keeps (see module docstring)."""
+    thresholds = SMART_THRESHOLDS if thresholds is None else thresholds
+    timeoffset = samples.timeoffset
+    count = len(timeoffset)
+    if not count:
+        return []
+    # Only channels the ride recorded take part
+    channels = [(samples.values[channel], samples.present[channel], threshold)
+                for channel, threshold in thresholds.items() if any(samples.present[channel])]
+    # Each channel's value as of the last kept point (None until it first appears)
+    reference = [None] * len(channels)
+
+    def keep(index):
+        kept.append(index)
+        for number, (values, present, _) in enumerate(channels):
+            if present[index]:
+                reference[number] = values[index]
+
+    kept = []
+    keep(0)
+    last = 0
+    for index in range(1, count):
+        changed = False
+        for number, (values, present, threshold) in enumerate(channels):
+            if present[index] and (reference[number] is None
+                                   or abs(values[index] - reference[number]) >= threshold):
+                changed = True
+                break
+        if changed:
+            if index - 1 != last:
+                # End of the steady stretch, so the step lands where it happened
+                keep(index - 1)
+            keep(index)
+            last = index
+        elif timeoffset[index] - timeoffset[last] >= max_gap:
+            keep(index)
+            last = index
+    if kept[-1] != count - 1:
+        kept.append(count - 1)
+    return kept
+
+def recorded_samples(samples, mode='every', interval=1.0):
+    """The SampleColumns to write as points for a recording `mode` (the same object for 'every')."""
+    if mode == 'every':
+        return samples
+    if mode == 'rate':
+        if interval <= 0:
+            raise ValueError(f"Recording interval must be positive, got {interval}")
+        return samples.select(rate_indices(samples.timeoffset, interval))
+    if mode == 'smart':
+        return samples.select(smart_indices(samples))
+    raise ValueError(f"Unknown recording mode '{mode}' (expected one of {', '.join(RECORDING_MODES)})")
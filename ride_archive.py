@@ -0,0 +1,221 @@
+"""Compact columnar archive of converted rides.
+
+Each ride's decoded sample columns are stored in `rides/<base name>.cols`: a small
+JSON header followed by the raw typed arrays, each aligned to 8 bytes, so they can
+be memory-mapped and used without parsing anything. `manifest.jsonl` lists one
+line of ride totals per archived ride, so a season of rides can be filtered without
+opening their column files.
+"""
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import datetime
+from array import array
+
+from pwx_reader import SAMPLE_CHANNELS, VERBATIM_CHANNELS, SampleColumns, PwxRide
+from output_files import open_output
+
+MANIFEST_FILENAME = "manifest.jsonl"
+RIDES_DIR_NAME = "rides"
+RIDE_SUFFIX = ".cols"
+
+MAGIC = b"VRC1"
+_HEADER_PREFIX = struct.Struct("<4sI")  # magic, header length
+_ALIGN = 8
+
+def _padding(offset):
+    return -offset % _ALIGN
+
+def ride_columns(samples):
+    """The columns worth storing for a ride, as {name: array}; channels never recorded are left out."""
+    columns = {'timeoffset': samples.timeoffset}
+    for channel in SAMPLE_CHANNELS:
+        if not any(samples.present[channel]):
+            continue
+        columns[channel] = samples.values[channel]
+        columns[f"{channel}.present"] = samples.present[channel]
+        if channel in samples.decimals:
+            columns[f"{channel}.decimals"] = samples.decimals[channel]
+    return columns
+
+def ride_summary(ride):
+    """The manifest entry for a ride: identity plus the totals used to filter rides."""
+    samples = ride.samples
+    return {
+        'base_name': ride.base_name,
+        'start': ride.start_time.isoformat(),
+        'fingerprint': ride.fingerprint,
+        'samples': len(samples),
+        'elapsed_s': ride.elapsed_time,
+        'distance_m': samples.max_value('dist'),
+        'elevation_gain_m': round(samples.elevation_gain(), 1),
+        'channels': [channel for channel in SAMPLE_CHANNELS if any(samples.present[channel])],
+    }
+
+def write_ride(ride, archive_dir):
+    """Write a ride's columns into the archive; returns its manifest entry (not yet in the manifest)."""
+    rides_dir = os.path.join(archive_dir, RIDES_DIR_NAME)
+    os.makedirs(rides_dir, exist_ok=True)
+    file_name = f"{ride.base_name}{RIDE_SUFFIX}"
+
+    columns = ride_columns(ride.samples)
+    header = {
+        'byteorder': sys.byteorder,
+        'samples': len(ride.samples),
+        'start_time_str': ride.start_time_str,
+        'start': ride.start_time.isoformat(),
+        'has_summary': ride.has_summary,
+        'duration': ride.duration,
+        'athlete': ride.athlete,
+        'columns': {},
+    }
+    # Offsets are relative to the end of the header; fill them in before encoding it
+    offset = 0
+    for name, column in columns.items():
+        typecode = column.typecode if isinstance(column, array) else 'B'
+        header['columns'][name] = [offset, typecode]
+        size = len(column) * (column.itemsize if isinstance(column, array) else 1)
+        offset += size + _padding(size)
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    header_bytes += b' ' * _padding(_HEADER_PREFIX.size + len(header_bytes))
+
+    with open_output(os.path.join(rides_dir, file_name)) as f:
+        f.write(_HEADER_PREFIX.pack(MAGIC, len(header_bytes)))
+        f.write(header_bytes)
+        for column in columns.values():
+            data = memoryview(column).cast('B')
+            f.write(data)
+            f.write(b'\0' * _padding(len(data)))
+
+    entry = ride_summary(ride)
+    entry['file'] = f"{RIDES_DIR_NAME}/{file_name}"
+    return entry
+
+class ArchivedRide:
+    """A ride's columns, memory-mapped from its archive file.
+
+    `columns` maps names ('timeoffset', 'pwr', 'pwr.present', ...) to zero-copy
+    memoryviews; `column(channel)` is the usual entry point. Call `close()` (or use as
+    a context manager) when done; the views are invalid afterwards.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, header_length = _HEADER_PREFIX.unpack_from(self.mapping, 0)
+            if magic != MAGIC:
+                raise ValueError(f"Not a ride archive file: {path}")
+            data_start = _HEADER_PREFIX.size + header_length
+            self.header = json.loads(bytes(self.mapping[_HEADER_PREFIX.size:data_start]))
+            if self.header['byteorder'] != sys.byteorder:
+                raise ValueError(f"{path} was written on a {self.header['byteorder']}-endian machine")
+        except Exception:
+            self.mapping.close()
+            raise
+
+        count = self.header['samples']
+        self.view = memoryview(self.mapping)
+        self.columns = {}
+        for name, (offset, typecode) in self.header['columns'].items():
+            start = data_start + offset
+            size = count * array(typecode).itemsize
+            self.columns[name] = self.view[start:start + size].cast(typecode)
+
+    def __len__(self):
+        return self.header['samples']
+
+    @property
+    def channels(self):
+        return [channel for channel in SAMPLE_CHANNELS if channel in self.columns]
+
+    def column(self, channel):
+        """(values, present) for a channel; None if the ride never recorded it."""
+        if channel not in self.columns:
+            return None
+        return self.columns[channel], self.columns[f"{channel}.present"]
+
+    def to_ride(self):
+        """Rebuild the PwxRide, as read_pwx would have returned it (copies the columns)."""
+        count = len(self)
+        samples = SampleColumns()
+        samples.timeoffset = array('d', self.columns['timeoffset'])
+        for channel in SAMPLE_CHANNELS:
+            if channel in self.columns:
+                samples.values[channel] = array('d', self.columns[channel])
+                samples.present[channel] = bytearray(self.columns[f"{channel}.present"])
+            else:
+                samples.values[channel] = array('d', bytes(8 * count))
+                samples.present[channel] = bytearray(count)
+        for channel in VERBATIM_CHANNELS:
+            name = f"{channel}.decimals"
+            samples.decimals[channel] = bytearray(self.columns[name]) if name in self.columns else bytearray(count)
+        start_time = datetime.datetime.fromisoformat(self.header['start'])
+        return PwxRide(start_time, self.header['start_time_str'], samples,
+                       has_summary=self.header['has_summary'], duration=self.header['duration'],
+                       athlete=self.header.get('athlete'))
+
+    def close(self):
+        if self.mapping is None:
+            return
+        for column in self.columns.values():
+            column.release()
+        self.columns = {}
+        self.view.release()
+        self.mapping.close()
+        self.mapping = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class RideArchive:
+    """An archive directory: column files under rides/ and the manifest that indexes them."""
+
+    def __init__(self, path):
+        self.path = path
+        self.manifest_path = os.path.join(path, MANIFEST_FILENAME)
+
+    def add(self, entry):
+        """Append a ride written by write_ride() to the manifest."""
+        os.makedirs(self.path, exist_ok=True)
+        entry = dict(entry, archived_at=round(time.time()))
+        # One short line per ride; a torn last line (crash mid-append) is skipped when reading
+        with open(self.manifest_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+
+    def rides(self, since=None, until=None):
+        """Manifest entries in start order, the latest entry per ride; optionally [since, until) by start."""
+        entries = {}
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    entries[entry['base_name']] = entry
+        except FileNotFoundError:
+            return []
+
+        selected = []
+        for entry in entries.values():
+            start = datetime.datetime.fromisoformat(entry['start'])
+            if since is not None and start < since:
+                continue
+            if until is not None and start >= until:
+                continue
+            selected.append(entry)
+        selected.sort(key=lambda entry: datetime.datetime.fromisoformat(entry['start']))
+        return selected
+
+    def open(self, entry):
+        """Memory-map an archived ride, given its manifest entry or base name."""
+        file_name = entry['file'] if isinstance(entry, dict) else f"{RIDES_DIR_NAME}/{entry}{RIDE_SUFFIX}"
+        return ArchivedRide(os.path.join(self.path, file_name))
@@ -0,0 +1,235 @@
+"""SQLite index of ride summaries, filled in as rides are converted.
+
+Each converted ride gets one row: start, rider, duration, distance, climbing and
+power/heart rate/cadence averages. Weekly, monthly and per-rider totals are then a
+single indexed query instead of a rescan of the PWX or converted files.
+
+    python ride_index.py /veloMonitor/velotron_rides.sqlite3 --by month
+    python ride_index.py /veloMonitor/velotron_rides.sqlite3 --by week --rider "Jane" --since 2025-01-01
+"""
+import sys
+import time
+import sqlite3
+import argparse
+import datetime
+import threading
+from array import array
+from operator import mul, sub
+
+INDEX_FILENAME = "velotron_rides.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rides (
+    base_name TEXT PRIMARY KEY,
+    start TEXT NOT NULL,
+    day TEXT NOT NULL,
+    rider TEXT,
+    fingerprint TEXT,
+    filename TEXT,
+    samples INTEGER,
+    duration_s REAL,
+    distance_m REAL,
+    elevation_gain_m REAL,
+    work_kj REAL,
+    avg_power REAL,
+    max_power REAL,
+    avg_hr REAL,
+    max_hr REAL,
+    avg_cadence REAL,
+    max_cadence REAL,
+    indexed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rides_day ON rides (day);
+CREATE INDEX IF NOT EXISTS rides_rider_day ON rides (rider, day);
+"""
+
+FIELDS = ('base_name', 'start', 'day', 'rider', 'fingerprint', 'filename', 'samples', 'duration_s',
+          'distance_m', 'elevation_gain_m', 'work_kj', 'avg_power', 'max_power', 'avg_hr', 'max_hr',
+          'avg_cadence', 'max_cadence')
+
+# Channel -> name used in the summary fields (avg_<name>, max_<name>)
+AVERAGED_CHANNELS = (('pwr', 'power'), ('hr', 'hr'), ('cad', 'cadence'))
+
+# SQL for the period a ride's local start day falls in; weeks start on Monday
+PERIODS = {
+    'week': "date(day, 'weekday 0', '-6 days')",
+    'month': "strftime('%Y-%m', day)",
+    'year': "strftime('%Y', day)",
+}
+
+UNKNOWN_RIDER = "(unknown)"
+
+def ride_stats(ride):
+    """The index row for a PwxRide, with the same totals the conversion summaries print."""
+    samples = ride.samples
+    stats = {
+        'base_name': ride.base_name,
+        'start': ride.start_time.isoformat(),
+        'day': ride.start_time.date().isoformat(),  # local date of the start, for weekly/monthly totals
+        'rider': ride.athlete,
+        'fingerprint': ride.fingerprint,
+        'samples': len(samples),
+        # As in the TCX summary: the PWX summary duration if there is one, else the last sample
+        'duration_s': ride.duration if ride.duration else ride.elapsed_time,
+        'distance_m': samples.max_value('dist'),
+        'elevation_gain_m': round(samples.elevation_gain(), 1),
+        'work_kj': None,
+    }
+    for channel, name in AVERAGED_CHANNELS:
+        values = array('d', samples.present_values(channel))
+        stats[f'avg_{name}'] = round(sum(values) / len(values), 1) if values else None
+        stats[f'max_{name}'] = max(values) if values else None
+    if stats['avg_power'] is not None:
+        # Each power sample held until the next one; missing samples count as 0 W
+        timeoffset, power = samples.timeoffset, samples.values['pwr']
+        joules = sum(map(mul, power[:-1], map(sub, timeoffset[1:], timeoffset[:-1])))
+        stats['work_kj'] = round(joules / 1000, 1)
+    return stats
+
+class RideIndex:
+    """Ride summaries keyed by ride (output base name); re-indexing a ride replaces its row.
+
+    Safe to use from several threads, like the job journal.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+    def add(self, stats, filename=None, rider=None):
+        """Index a ride from ride_stats(). `rider` is used when the PWX did not name the athlete."""
+        row = dict(stats, filename=filename or stats.get('filename'), rider=stats.get('rider') or rider)
+        columns = list(FIELDS) + ['indexed_at']
+        values = [row.get(field) for field in FIELDS] + [time.time()]
+        with self.lock:
+            self.db.execute(f"INSERT OR REPLACE INTO rides ({', '.join(columns)}) "
+                            f"VALUES ({', '.join('?' * len(columns))})", values)
+
+    def get(self, base_name):
+        with self.lock:
+            row = self.db.execute("SELECT * FROM rides WHERE base_name = ?", (base_name,)).fetchone()
+        return dict(row) if row else None
+
+    def _where(self, rider, since, until):
+        clauses, params = [], []
+        if rider is not None:
+            clauses.append("rider = ?")
+            params.append(rider)
+        if since is not None:
+            clauses.append("day >= ?")
+            params.append(since.isoformat())
+        if until is not None:
+            clauses.append("day < ?")
+            params.append(until.isoformat())
+        return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+    def rides(self, rider=None, since=None, until=None):
+        """Indexed rides in start order; optionally one rider's, and local start days in [since, until)."""
+        where, params = self._where(rider, since, until)
+        with self.lock:
+            rows = self.db.execute(f"SELECT * FROM rides {where} ORDER BY day, start", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def totals(self, by='week', per_rider=False, rider=None, since=None, until=None):
+        """Totals per period ('week', 'month', 'year' or None for all time), optionally per rider.
+
+        Average power and heart rate are weighted by ride duration, over the rides that
+        recorded them.
+        """
+        groups = []
+        if by is not None:
+            groups.append(f"{PERIODS[by]} AS period")
+        if per_rider:
+            groups.append("rider")
+        where, params = self._where(rider, since, until)
+        select = ', '.join(groups + [
+            "COUNT(*) AS rides",
+            "SUM(duration_s) AS duration_s",
+            "SUM(distance_m) AS distance_m",
+            "SUM(elevation_gain_m) AS elevation_gain_m",
+            "SUM(work_kj) AS work_kj",
+            "SUM(avg_power * duration_s) / SUM(CASE WHEN avg_power IS NOT NULL THEN duration_s END) AS avg_power",
+            "SUM(avg_hr * duration_s) / SUM(CASE WHEN avg_hr IS NOT NULL THEN duration_s END) AS avg_hr",
+        ])
+        keys = [group.split(' AS ')[-1] for group in groups]
+        group_by = f"GROUP BY {', '.join(keys)} ORDER BY {', '.join(keys)}" if keys else ""
+        with self.lock:
+            rows = self.db.execute(f"SELECT {select} FROM rides {where} {group_by}", params).fetchall()
+        return [dict(row) for row in rows if row['rides']]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+def index_archive(index, archive_path, rider=None):
+    """Index every ride in a ride archive (rides converted before the index existed); returns the count."""
+    from ride_archive import RideArchive
+
+    archive = RideArchive(archive_path)
+    count = 0
+    for entry in archive.rides():
+        with archive.open(entry) as archived:
+            ride = archived.to_ride()
+        index.add(ride_stats(ride), rider=rider)
+        count += 1
+    return count
+
+def format_hours(seconds):
+    minutes = round(seconds or 0) // 60
+    return f"{minutes // 60}:{minutes % 60:02d}"
+
+def _number(value, scale=1):
+    return '' if value is None else f"{value * scale:.0f}"
+
+def print_totals(rows, by, per_rider):
+    """Print totals as a table, in the units of the conversion summaries (miles, feet)."""
+    header = []
+    if by is not None:
+        header.append(f"{by:<10}")
+    if per_rider:
+        header.append(f"{'rider':<20}")
+    header.append(f"{'rides':>5} {'time':>8} {'miles':>8} {'feet':>7} {'kJ':>7} {'watts':>6} {'bpm':>4}")
+    print(' '.join(header))
+    for row in rows:
+        line = []
+        if by is not None:
+            line.append(f"{row['period']:<10}")
+        if per_rider:
+            line.append(f"{row['rider'] or UNKNOWN_RIDER:<20}")
+        line.append(f"{row['rides']:>5} {format_hours(row['duration_s']):>8} "
+                    f"{(row['distance_m'] or 0) * 0.000621371:>8.1f} {_number(row['elevation_gain_m'], 3.28084):>7} "
+                    f"{_number(row['work_kj']):>7} {_number(row['avg_power']):>6} {_number(row['avg_hr']):>4}")
+        print(' '.join(line))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Report ride totals from the ride index.')
+    parser.add_argument('index', help=f'Ride index file (e.g. /veloMonitor/{INDEX_FILENAME})')
+    parser.add_argument('--by', choices=sorted(PERIODS) + ['all'], default='week',
+                        help='Period to total by (default: week)')
+    parser.add_argument('--riders', action='store_true', help='Separate totals for each rider')
+    parser.add_argument('--rider', help='Only this rider\'s rides')
+    parser.add_argument('--since', type=datetime.date.fromisoformat, help='Only rides from this date (YYYY-MM-DD)')
+    parser.add_argument('--until', type=datetime.date.fromisoformat, help='Only rides before this date')
+    parser.add_argument('--from-archive', metavar='DIR',
+                        help='First index every ride in the ride archive in DIR (to fill a new index)')
+    args = parser.parse_args(argv)
+
+    index = RideIndex(args.index)
+    try:
+        if args.from_archive:
+            print(f"Indexed {index_archive(index, args.from_archive)} ride(s) from {args.from_archive}\n")
+        by = None if args.by == 'all' else args.by
+        rows = index.totals(by=by, per_rider=args.riders, rider=args.rider, since=args.since, until=args.until)
+    finally:
+        index.close()
+    if not rows:
+        print("No rides found.")
+        return 1
+    print_totals(rows, by, args.riders)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
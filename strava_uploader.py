@@ -2,17 +2,68 @@ import os
 import requests
 import time
 import sys
+import threading
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from rate_limiter import RateLimiter, RATE_LIMITED
+
+# (connect, read) timeouts in seconds; uploads get longer to send the file
+API_TIMEOUT = (10, 30)
+UPLOAD_TIMEOUT = (10, 120)
+
+# Formats we upload; Strava reads the gzipped ones as-is, which saves most of the upload
+UPLOAD_DATA_TYPES = ('fit', 'tcx', 'fit.gz', 'tcx.gz')
+
+def upload_data_type(file_path):
+    """Strava's data_type for a file: its extension, including .gz (e.g. 'tcx.gz')."""
+    name = os.path.basename(file_path).lower()
+    root, extension = os.path.splitext(name)
+    inner = os.path.splitext(root)[1]
+    if extension == '.gz' and inner:
+        return f"{inner.strip('.')}.gz"
+    return extension.strip('.')
+
+def make_session():
+    """A keep-alive session that retries transient failures.
+
+    Connection errors are retried for every request (nothing reached Strava yet).
+    Read errors and 5xx responses are only retried for GETs so an upload is never
+    sent twice.
+    """
+    retry = Retry(
+        total=3,
+        connect=3,
+        read=2,
+        status=2,
+        backoff_factor=1,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=2, pool_maxsize=4)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
 
 class StravaUploader:
-    def __init__(self, client_id, client_secret, refresh_token):
+    def __init__(self, client_id, client_secret, refresh_token, session=None, rate_limit=None):
         self.client_id = client_id
         self.client_secret = client_secret
         self.refresh_token = refresh_token
         self.access_token = None
         self.expires_at = 0
+        self.session = session or make_session()
+        self.rate_limit = rate_limit or RateLimiter()
+        # Upload and status threads share the token; only one of them refreshes it
+        self.token_lock = threading.RLock()
 
     def refresh_access_token(self):
         """Refreshes the access token using the refresh token."""
+        with self.token_lock:
+            return self._refresh_access_token()
+
+    def _refresh_access_token(self):
         url = "https://www.strava.com/oauth/token"
         payload = {
             'client_id': self.client_id,
@@ -22,7 +73,7 @@ class StravaUploader:
         }
         
         try:
-            response = requests.post(url, data=payload)
+            response = self.session.post(url, data=payload, timeout=API_TIMEOUT)
             
             if response.status_code == 400:
                 error_data = response.json()
@@ -50,21 +101,25 @@ class StravaUploader:
 
     def ensure_token(self):
         """Ensures we have a valid access token."""
-        # If token is missing or expires in less than 5 minutes, refresh it
-        if not self.access_token or time.time() > (self.expires_at - 300):
-            return self.refresh_access_token()
-        return True
+        # If token is missing or expires in less than 5 minutes, refresh it.
+        # Checked again under the lock so threads waiting on a refresh reuse its result.
+        if self.access_token and time.time() <= (self.expires_at - 300):
+            return True
+        with self.token_lock:
+            if not self.access_token or time.time() > (self.expires_at - 300):
+                return self.refresh_access_token()
+            return True
 
     def upload_file(self, file_path, activity_type=None, description="Uploaded by Velotron Converter"):
-        """Uploads a FIT or TCX file to Strava."""
+        """Uploads a FIT or TCX file (optionally gzipped, e.g. ride.fit.gz) to Strava."""
         if not self.ensure_token():
             print("Cannot upload to Strava: Token refresh failed.")
             return False
 
         print(f"Uploading {os.path.basename(file_path)} to Strava...")
         
-        file_extension = os.path.splitext(file_path)[1].lower().strip('.')
-        if file_extension not in ['fit', 'tcx']:
+        file_extension = upload_data_type(file_path)
+        if file_extension not in UPLOAD_DATA_TYPES:
             print(f"Unsupported file format for Strava: {file_extension}")
             return False
 
@@ -84,9 +139,14 @@ class StravaUploader:
             payload['activity_type'] = activity_type
         
         try:
+            self.rate_limit.acquire('upload')
             with open(file_path, 'rb') as f:
                 files = {'file': (os.path.basename(file_path), f)}
-                response = requests.post(url, headers=headers, data=payload, files=files)
+                response = self.session.post(url, headers=headers, data=payload, files=files,
+                                             timeout=UPLOAD_TIMEOUT)
+                self.rate_limit.update(response.headers)
+                if response.status_code == 429:
+                    return self._rate_limited(response)
                 response.raise_for_status()
                 
                 data = response.json()
@@ -128,13 +188,22 @@ class StravaUploader:
         }
         
         try:
-            response = requests.get(url, headers=headers)
+            self.rate_limit.acquire('poll')
+            response = self.session.get(url, headers=headers, timeout=API_TIMEOUT)
+            self.rate_limit.update(response.headers)
+            if response.status_code == 429:
+                return self._rate_limited(response)
             response.raise_for_status()
             return response.json()
         except Exception as e:
             print(f"Error checking Strava upload status: {e}")
             return None
 
+    def _rate_limited(self, response):
+        wait = self.rate_limit.throttled(response.headers.get('Retry-After'))
+        print(f"  -> Strava rate limit exceeded; holding requests for {wait:.0f}s")
+        return RATE_LIMITED
+
 def main():
     # Simple CLI test if run directly
     client_id = os.getenv('STRAVA_CLIENT_ID')
@@ -158,6 +227,8 @@ def main():
         for _ in range(10):
             time.sleep(2)
             status = uploader.check_upload_status(upload_id)
+            if status == RATE_LIMITED:
+                continue
             if status:
                 print(f"Status: {status.get('status')} - {status.get('error') or ''}")
                 if status.get('activity_id'):
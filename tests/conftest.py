@@ -47,6 +47,26 @@ def tmp_pwx_file(tmp_path, sample_pwx_content):
     p.write_text(sample_pwx_content)
     return str(p)
 
+@pytest.fixture
+def make_pwx(tmp_path):
+    """Factory for small PWX files; returns the path written.
+
+    `samples` are tuples of (timeoffset, *values) for `channels`; the default is a
+    two-sample ride with power and distance. The file goes to `path`, or to
+    tmp_path named after the start time.
+    """
+    def make(start, samples=((0, 200, 0), (1, 210, 8)), channels=('pwr', 'dist'), athlete=None, path=None):
+        rows = ''.join(
+            "<sample><timeoffset>{}</timeoffset>{}</sample>".format(
+                sample[0], ''.join(f"<{channel}>{value}</{channel}>" for channel, value in zip(channels, sample[1:])))
+            for sample in samples)
+        name = f"<athlete><name>{athlete}</name></athlete>" if athlete else ""
+        path = path or tmp_path / f"{start.replace(':', '-')}.pwx"
+        path.write_text(f"""<pwx xmlns="http://www.peaksware.com/PWX/1/0"><workout>{name}
+    <time>{start}</time>{rows}</workout></pwx>""")
+        return str(path)
+    return make
+
 @pytest.fixture
 def setup_test_dirs(tmp_path):
     orig = tmp_path / "original"
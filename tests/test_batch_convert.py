@@ -0,0 +1,87 @@
+import os
+import sys
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import batch_convert
+
+@pytest.fixture
+def archive(tmp_path, make_pwx):
+    root = tmp_path / "archive"
+    (root / "2023").mkdir(parents=True)
+    make_pwx("2024-01-01T08:00:00", path=root / "a.pwx")
+    make_pwx("2023-06-01T08:00:00", path=root / "2023" / "b.PWX")
+    (root / "notes.txt").write_text("not a ride")
+    return root
+
+def test_find_inputs(archive):
+    assert batch_convert.find_inputs([str(archive)]) == [str(archive / "a.pwx")]
+    assert batch_convert.find_inputs([str(archive)], recursive=True) == [
+        str(archive / "2023" / "b.PWX"), str(archive / "a.pwx")]
+    # Globs and repeats are merged
+    assert batch_convert.find_inputs([str(archive / "*.pwx"), str(archive / "a.pwx")]) == [str(archive / "a.pwx")]
+
+def test_batch_converts_and_summarises(archive, tmp_path, capsys):
+    out_dir = tmp_path / "out"
+    code = batch_convert.main([str(archive), "-r", "-o", str(out_dir), "-j", "2", "-f", "fit"])
+
+    assert code == batch_convert.EXIT_OK
+    assert sorted(os.listdir(out_dir)) == ["2023-06-01_08-00-00.fit", "2024-01-01_08-00-00.fit"]
+    output = capsys.readouterr().out
+    assert "Converted: 2" in output
+    assert "samples/s" in output
+
+def test_batch_gzip_output(archive, tmp_path):
+    out_dir = tmp_path / "out"
+    code = batch_convert.main([str(archive), "-o", str(out_dir), "-j", "1", "--gzip"])
+
+    assert code == batch_convert.EXIT_OK
+    assert sorted(os.listdir(out_dir)) == ["2024-01-01_08-00-00.fit.gz", "2024-01-01_08-00-00.tcx.gz"]
+
+def test_batch_fills_ride_archive(archive, tmp_path):
+    from ride_archive import RideArchive
+    code = batch_convert.main([str(archive), "-r", "-o", str(tmp_path / "out"), "-j", "2",
+                               "--archive", str(tmp_path / "rides")])
+
+    assert code == batch_convert.EXIT_OK
+    rides = RideArchive(str(tmp_path / "rides")).rides()
+    assert [ride['base_name'] for ride in rides] == ["2023-06-01_08-00-00", "2024-01-01_08-00-00"]
+
+def test_batch_fills_ride_index(archive, tmp_path):
+    from ride_index import RideIndex
+    code = batch_convert.main([str(archive), "-r", "-o", str(tmp_path / "out"), "-j", "2", "-f", "tcx",
+                               "--index", str(tmp_path / "rides.sqlite3"), "--rider", "Sam"])
+
+    assert code == batch_convert.EXIT_OK
+    index = RideIndex(str(tmp_path / "rides.sqlite3"))
+    rides = index.rides()
+    assert [(ride['base_name'], ride['rider'], ride['filename']) for ride in rides] == [
+        ("2023-06-01_08-00-00", "Sam", "b.PWX"), ("2024-01-01_08-00-00", "Sam", "a.pwx")]
+    assert rides[0]['avg_power'] == 205
+    index.close()
+
+def test_batch_reports_failures(archive, tmp_path):
+    (archive / "bad.pwx").write_text("not xml")
+    code = batch_convert.main([str(archive), "-o", str(tmp_path / "out"), "-j", "1"])
+    assert code == batch_convert.EXIT_FAILURES
+    assert os.path.exists(tmp_path / "out" / "2024-01-01_08-00-00.tcx")
+
+def test_batch_skip_existing(archive, tmp_path, capsys):
+    out_dir = tmp_path / "out"
+    assert batch_convert.main([str(archive), "-o", str(out_dir), "-j", "1"]) == batch_convert.EXIT_OK
+    capsys.readouterr()
+
+    assert batch_convert.main([str(archive), "-o", str(out_dir), "-j", "1", "--skip-existing"]) == batch_convert.EXIT_OK
+    output = capsys.readouterr().out
+    assert "Skipped:   1" in output
+    assert "Converted: 0" in output
+
+def test_batch_no_inputs(tmp_path):
+    assert batch_convert.main([str(tmp_path / "missing")]) == batch_convert.EXIT_NO_INPUT
+
+def test_batch_rejects_unknown_format(archive):
+    with pytest.raises(SystemExit) as exc:
+        batch_convert.main([str(archive), "-f", "gpx"])
+    assert exc.value.code == 2
@@ -53,3 +53,23 @@ def test_convert_pwx_to_tcx_elevation_gain(tmp_pwx_file, tmp_path):
     lap = root.find('.//{http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2}Lap')
     dist = lap.find('{http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2}DistanceMeters')
     assert float(dist.text) == 200.0
+
+def test_convert_pwx_to_tcx_without_summary_or_extensions(tmp_path):
+    pwx = tmp_path / "minimal.pwx"
+    pwx.write_text("""<pwx xmlns="http://www.peaksware.com/PWX/1/0"><workout>
+    <time>2025-12-03T05:48:22</time>
+    <sample><timeoffset>0</timeoffset><hr>120</hr></sample>
+    <sample><timeoffset>1</timeoffset><hr>121</hr></sample>
+    </workout></pwx>""")
+    output_tcx = str(tmp_path / "minimal.tcx")
+    convert_pwx_to_tcx(str(pwx), output_tcx)
+
+    content = open(output_tcx, encoding="utf-8").read()
+    # The extension namespace is only declared when power or speed is present
+    assert 'xmlns:ax=' not in content
+
+    root = ET.parse(output_tcx).getroot()
+    ns = '{http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2}'
+    lap = root.find(f'.//{ns}Lap')
+    assert lap.find(f'{ns}DistanceMeters') is None
+    assert len(root.findall(f'.//{ns}Trackpoint')) == 2
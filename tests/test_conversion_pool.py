@@ -0,0 +1,166 @@
+import os
+import sys
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from conversion_pool import ConversionPool, convert_ride
+
+def test_convert_ride_writes_all_formats(tmp_pwx_file, tmp_path):
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+
+    result = convert_ride(tmp_pwx_file, str(out_dir), capture_output=True)
+
+    assert result.ok
+    assert result.base_name == "2025-12-03_05-48-22"
+    assert result.sample_count == 3
+    assert sorted(result.outputs) == ['fit', 'tcx']
+    for path in result.outputs.values():
+        assert os.path.exists(path)
+    assert "Conversion Summary" in result.log
+
+def test_convert_ride_compressed_outputs_match_plain(tmp_pwx_file, tmp_path):
+    import gzip
+    plain_dir, gz_dir = tmp_path / "plain", tmp_path / "gz"
+    plain_dir.mkdir()
+    gz_dir.mkdir()
+
+    plain = convert_ride(tmp_pwx_file, str(plain_dir), capture_output=True)
+    compressed = convert_ride(tmp_pwx_file, str(gz_dir), capture_output=True, compress=True)
+
+    assert compressed.ok
+    assert os.path.basename(compressed.outputs['tcx']) == "2025-12-03_05-48-22.tcx.gz"
+    assert os.path.basename(compressed.outputs['fit']) == "2025-12-03_05-48-22.fit.gz"
+    for fmt in ('tcx', 'fit'):
+        with open(plain.outputs[fmt], 'rb') as f, gzip.open(compressed.outputs[fmt]) as gz:
+            assert gz.read() == f.read()
+
+def test_convert_ride_reports_parse_errors(tmp_path):
+    bad = tmp_path / "bad.pwx"
+    bad.write_text("not xml")
+
+    result = convert_ride(str(bad), str(tmp_path), capture_output=True)
+
+    assert not result.ok
+    assert result.error.startswith("Error parsing PWX file")
+    assert result.outputs == {}
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_pool_yields_results_in_input_order(tmp_path, make_pwx, workers):
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    inputs = [
+        make_pwx("2025-03-01T10:00:00"),
+        make_pwx("2025-01-01T10:00:00"),
+        str(tmp_path / "missing.pwx"),
+        make_pwx("2025-02-01T10:00:00"),
+    ]
+
+    pool = ConversionPool(workers)
+    try:
+        results = list(pool.run(inputs, str(out_dir), formats=('tcx',)))
+    finally:
+        pool.close()
+
+    assert [path for path, _ in results] == inputs
+    assert [result.base_name for _, result in results] == [
+        "2025-03-01_10-00-00", "2025-01-01_10-00-00", None, "2025-02-01_10-00-00"]
+    assert [result.ok for _, result in results] == [True, True, False, True]
+    assert sorted(os.listdir(out_dir)) == [
+        "2025-01-01_10-00-00.tcx", "2025-02-01_10-00-00.tcx", "2025-03-01_10-00-00.tcx"]
+
+def test_convert_ride_skips_known_fingerprint(tmp_pwx_file, tmp_path):
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+
+    first = convert_ride(tmp_pwx_file, str(out_dir), capture_output=True)
+    assert first.fingerprint == "2025-12-03T05:48:22|60|200"
+    assert not first.skipped
+
+    for name in os.listdir(out_dir):
+        os.remove(out_dir / name)
+    second = convert_ride(tmp_pwx_file, str(out_dir), capture_output=True,
+                          skip_fingerprints={first.fingerprint})
+    assert second.skipped
+    assert second.outputs == {}
+    assert os.listdir(out_dir) == []
+
+def test_convert_ride_records_stage_timings(tmp_pwx_file, tmp_path):
+    result = convert_ride(tmp_pwx_file, str(tmp_path), capture_output=True)
+    assert sorted(result.timings) == ['fit', 'parse', 'tcx']
+    assert all(seconds >= 0 for seconds in result.timings.values())
+
+def test_convert_ride_smart_recording_keeps_totals(tmp_path):
+    import xml.etree.ElementTree as ET
+    ns = {'tcx': 'http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2'}
+    path = tmp_path / "erg.pwx"
+    rows = ''.join(f"<sample><timeoffset>{t}</timeoffset><pwr>{200 if t < 30 else 250}</pwr>"
+                   f"<dist>{t * 8}</dist><alt>{100 + (t == 20)}</alt></sample>" for t in range(60))
+    path.write_text(f"""<pwx xmlns="http://www.peaksware.com/PWX/1/0"><workout>
+    <time>2025-01-06T07:00:00</time><summarydata><duration>59</duration></summarydata>{rows}</workout></pwx>""")
+
+    every = convert_ride(str(path), str(tmp_path), formats=('tcx',))
+    os.rename(every.outputs['tcx'], str(tmp_path / "every.tcx"))
+    smart = convert_ride(str(path), str(tmp_path), formats=('tcx', 'fit'), recording='smart')
+
+    assert smart.ok
+    lap_distance = './/tcx:Lap/tcx:DistanceMeters'
+    full_tcx, smart_tcx = ET.parse(str(tmp_path / "every.tcx")), ET.parse(smart.outputs['tcx'])
+    assert len(full_tcx.findall('.//tcx:Trackpoint', ns)) == 60
+    assert len(smart_tcx.findall('.//tcx:Trackpoint', ns)) < 20
+    assert smart_tcx.find(lap_distance, ns).text == full_tcx.find(lap_distance, ns).text == "472.00"
+    assert os.path.getsize(smart.outputs['fit']) < 1000
+    # The index summary and the climbing in it come from every sample
+    assert smart.summary == every.summary
+    assert smart.summary['elevation_gain_m'] == 1
+
+def test_convert_ride_compact_fit(tmp_path):
+    path = tmp_path / "steady.pwx"
+    rows = ''.join(f"<sample><timeoffset>{t}</timeoffset><pwr>{200 + t % 7}</pwr><cad>90</cad></sample>"
+                   for t in range(60))
+    path.write_text(f"""<pwx xmlns="http://www.peaksware.com/PWX/1/0"><workout>
+    <time>2025-01-06T07:00:00</time>{rows}</workout></pwx>""")
+
+    full = convert_ride(str(path), str(tmp_path), formats=('fit',))
+    full_size = os.path.getsize(full.outputs['fit'])
+    # Only the FIT converter takes the compact option
+    compact = convert_ride(str(path), str(tmp_path), formats=('tcx', 'fit'), compact_fit=True)
+    assert compact.ok
+    assert os.path.getsize(compact.outputs['fit']) < full_size
+
+def test_pool_recovers_after_a_worker_dies(tmp_path, make_pwx):
+    import signal
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    first = [make_pwx("2025-01-01T10:00:00")]
+    second = [make_pwx("2025-02-01T10:00:00"),
+              make_pwx("2025-03-01T10:00:00")]
+
+    pool = ConversionPool(2)
+    try:
+        assert [result.ok for _, result in pool.run(first, str(out_dir), formats=('tcx',))] == [True]
+        # Kill a worker the way the OOM killer would; the executor is now broken
+        os.kill(next(iter(pool.executor._processes)), signal.SIGKILL)
+        results = list(pool.run(second, str(out_dir), formats=('tcx',)))
+    finally:
+        pool.close()
+
+    assert [path for path, _ in results] == second
+    assert [result.ok for _, result in results] == [True, True]
+
+def test_pool_close_can_cancel_queued_rides(tmp_path, make_pwx):
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    inputs = [make_pwx(f"2025-01-01T{10 + minute // 60}:{minute % 60:02d}:00")
+              for minute in range(200)]
+
+    pool = ConversionPool(2)
+    results = pool.run(inputs, str(out_dir), formats=('tcx',))
+    next(results)
+    pool.close(cancel=True)
+    results.close()
+
+    # Rides still waiting for a worker were dropped rather than converted
+    assert 1 <= len(os.listdir(out_dir)) < len(inputs)
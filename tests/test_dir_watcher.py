@@ -0,0 +1,62 @@
+import os
+import sys
+import threading
+import time
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from dir_watcher import DirectoryWatcher
+
+def test_file_ready_only_after_settling(tmp_path):
+    watcher = DirectoryWatcher(str(tmp_path), settle_time=5, mode='poll')
+    (tmp_path / "ride.pwx").write_text("<pwx/>")
+    (tmp_path / "notes.txt").write_text("ignored")
+
+    assert watcher.scan(now=100) == []   # first sighting
+    assert watcher.scan(now=103) == []   # unchanged but not settled yet
+    assert watcher.scan(now=105) == ["ride.pwx"]
+    # Handed out once only
+    assert watcher.scan(now=106) == []
+
+def test_growing_file_resets_settle_timer(tmp_path):
+    watcher = DirectoryWatcher(str(tmp_path), settle_time=5, mode='poll')
+    path = tmp_path / "ride.pwx"
+    path.write_text("<pwx>")
+
+    assert watcher.scan(now=100) == []
+    path.write_text("<pwx><workout/></pwx>")  # still being copied
+    assert watcher.scan(now=106) == []
+    assert watcher.scan(now=110) == []
+    assert watcher.scan(now=111) == ["ride.pwx"]
+
+def test_vanished_file_is_forgotten(tmp_path):
+    watcher = DirectoryWatcher(str(tmp_path), settle_time=0, mode='poll')
+    path = tmp_path / "ride.pwx"
+    path.write_text("<pwx/>")
+
+    watcher.scan(now=0)
+    path.unlink()
+    assert watcher.scan(now=1) == []
+    assert watcher.pending == {}
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="inotify is Linux only")
+def test_inotify_poll_picks_up_new_file(tmp_path):
+    watcher = DirectoryWatcher(str(tmp_path), settle_time=0.2, min_interval=0.1,
+                               max_interval=5, mode='inotify')
+    if watcher.mode != 'inotify':
+        pytest.skip("inotify not available here")
+
+    def drop_file():
+        time.sleep(0.2)
+        (tmp_path / "ride.pwx").write_text("<pwx/>")
+
+    threading.Thread(target=drop_file).start()
+    started = time.monotonic()
+    try:
+        assert watcher.poll() == ["ride.pwx"]
+    finally:
+        watcher.close()
+    # Well under the 5 second idle rescan, so the inotify event woke us up
+    assert time.monotonic() - started < 3
@@ -0,0 +1,120 @@
+import os
+import sys
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pwx_reader import read_pwx
+from fit_encoder import encode_activity, encode_value, crc16, UINT8, UINT16
+from convert_pwx_to_fit import build_fit_with_fit_tool, ride_totals, sample_timestamps_ms
+
+# Fields fit_tool synthesizes on decode (speed -> enhanced_speed) rather than reads from the file
+DERIVED_FIELDS = {'enhanced_speed'}
+
+def decoded_messages(data, tmp_path):
+    """Decode a FIT file with fit_tool into (message name, {field: raw value}) tuples."""
+    fit_file_module = pytest.importorskip("fit_tool.fit_file")
+    path = tmp_path / "decode.fit"
+    path.write_bytes(data)
+    messages = []
+    for record in fit_file_module.FitFile.from_file(str(path)).records:
+        message = record.message
+        if type(message).__name__ == 'DefinitionMessage':
+            continue
+        fields = {}
+        for field in message.fields:
+            if not field.is_valid() or not field.encoded_values or field.name in DERIVED_FIELDS:
+                continue
+            raw = field.encoded_values[0]
+            if raw is not None and raw != field.base_type.invalid_raw_value():
+                fields[field.name] = raw
+        messages.append((type(message).__name__, fields))
+    return messages
+
+@pytest.fixture
+def gappy_pwx_file(tmp_path):
+    # Channels drop in and out so the reference encoder has to redefine records
+    p = tmp_path / "gappy.pwx"
+    p.write_text("""<pwx xmlns="http://www.peaksware.com/PWX/1/0"><workout>
+    <time>2025-12-03T05:48:22</time>
+    <summarydata><duration>3</duration></summarydata>
+    <sample><timeoffset>0</timeoffset><alt>1600.2</alt><dist>0</dist><hr>120</hr><pwr>200</pwr><spd>8.5</spd></sample>
+    <sample><timeoffset>0.25</timeoffset><dist>2.5</dist><cad>80.6</cad></sample>
+    <sample><timeoffset>1.5</timeoffset><alt>1601</alt><hr>121.9</hr><pwr>210</pwr></sample>
+    <sample><timeoffset>3</timeoffset><alt>1600.4</alt><dist>9.75</dist><spd>9.125</spd></sample>
+    </workout></pwx>""")
+    return str(p)
+
+@pytest.mark.parametrize("strava_optimized", [False, True])
+def test_direct_encoder_matches_fit_tool(gappy_pwx_file, tmp_path, strava_optimized):
+    ride = read_pwx(gappy_pwx_file)
+    timestamps_ms = sample_timestamps_ms(ride)
+    totals = ride_totals(ride)
+
+    reference = build_fit_with_fit_tool(ride, timestamps_ms, totals, strava_optimized)
+    direct = encode_activity(ride, timestamps_ms, totals, strava_optimized)
+
+    assert decoded_messages(direct, tmp_path) == decoded_messages(reference, tmp_path)
+
+def test_direct_encoder_file_integrity(tmp_pwx_file):
+    ride = read_pwx(tmp_pwx_file)
+    data = encode_activity(ride, sample_timestamps_ms(ride), ride_totals(ride))
+
+    assert data[8:12] == b'.FIT'
+    assert data[0] == 14
+    # Header CRC covers the first 12 bytes; the file CRC makes the whole file check to 0
+    assert crc16(data[:12]) == int.from_bytes(data[12:14], 'little')
+    assert crc16(data) == 0
+
+def test_encode_value_out_of_range_is_invalid():
+    assert encode_value(300, UINT8) == UINT8.invalid
+    assert encode_value(-600, UINT16, 5, 500) == UINT16.invalid
+    assert encode_value(100.04, UINT16, 5, 500) == 3000
+
+def test_encoder_writes_only_the_given_records(gappy_pwx_file, tmp_path):
+    ride = read_pwx(gappy_pwx_file)
+    totals = ride_totals(ride)
+    records = ride.samples.select([0, 3])
+
+    full = decoded_messages(encode_activity(ride, sample_timestamps_ms(ride), totals), tmp_path)
+    thinned = decoded_messages(encode_activity(ride, sample_timestamps_ms(ride, records), totals, records=records),
+                               tmp_path)
+
+    assert [name for name, _ in thinned].count('RecordMessage') == 2
+    # Lap and session totals still come from every sample
+    assert [message for message in thinned if message[0] != 'RecordMessage'] == \
+        [message for message in full if message[0] != 'RecordMessage']
+
+@pytest.mark.parametrize("strava_optimized", [False, True])
+def test_compact_records_decode_to_the_same_values(tmp_path, strava_optimized):
+    # Steady heart rate and cadence, and a 40 s pause too long for a compressed timestamp
+    p = tmp_path / "paused.pwx"
+    rows = ''.join(f"<sample><timeoffset>{t}</timeoffset><hr>140</hr><cad>90</cad><pwr>{200 + t}</pwr></sample>"
+                   for t in list(range(30)) + [70, 71, 103])
+    p.write_text(f"""<pwx xmlns="http://www.peaksware.com/PWX/1/0"><workout>
+    <time>2025-12-03T05:48:22</time>{rows}</workout></pwx>""")
+    ride = read_pwx(str(p))
+    timestamps_ms = sample_timestamps_ms(ride)
+    totals = ride_totals(ride)
+
+    full = encode_activity(ride, timestamps_ms, totals, strava_optimized)
+    compact = encode_activity(ride, timestamps_ms, totals, strava_optimized, compact=True)
+    assert len(compact) < len(full)
+    assert crc16(compact) == 0
+    # Every record decodes with its timestamp and all of its channels, constant ones included
+    assert decoded_messages(compact, tmp_path) == decoded_messages(full, tmp_path)
+
+def test_compact_ride_without_channels(tmp_path):
+    p = tmp_path / "empty.pwx"
+    p.write_text("""<pwx xmlns="http://www.peaksware.com/PWX/1/0"><workout>
+    <time>2025-12-03T05:48:22</time>
+    <sample><timeoffset>0</timeoffset></sample><sample><timeoffset>1</timeoffset></sample>
+    </workout></pwx>""")
+    ride = read_pwx(str(p))
+    timestamps_ms = sample_timestamps_ms(ride)
+    totals = ride_totals(ride)
+
+    compact = encode_activity(ride, timestamps_ms, totals, compact=True)
+    assert decoded_messages(compact, tmp_path) == \
+        decoded_messages(encode_activity(ride, timestamps_ms, totals), tmp_path)
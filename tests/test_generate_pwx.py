@@ -0,0 +1,33 @@
+import os
+import sys
+
+# Add project root and benchmarks to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+from generate_pwx import generate_pwx
+from pwx_reader import read_pwx
+
+def test_generated_ride_parses(tmp_path):
+    path = str(tmp_path / "ride.pwx")
+    count = generate_pwx(path, hours=0.1, hz=4, seed=1)
+
+    ride = read_pwx(path)
+    assert count == 1440
+    assert len(ride.samples) == count
+    assert ride.samples.timeoffset[1] == 0.25
+    assert abs(ride.duration - ride.elapsed_time) < 0.1
+    # Channels drop out now and then, but most samples have them
+    present = ride.samples.present['pwr']
+    assert len(present) * 0.9 < sum(present) < len(present)
+
+def test_generator_is_deterministic_and_honours_channels(tmp_path):
+    first, second = str(tmp_path / "a.pwx"), str(tmp_path / "b.pwx")
+    generate_pwx(first, hours=0.05, seed=3, channels=('alt', 'dist'))
+    generate_pwx(second, hours=0.05, seed=3, channels=('alt', 'dist'))
+
+    with open(first) as a, open(second) as b:
+        assert a.read() == b.read()
+    ride = read_pwx(first)
+    assert not any(ride.samples.present['hr'])
+    assert any(ride.samples.present['alt'])
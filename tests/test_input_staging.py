@@ -0,0 +1,51 @@
+import os
+import sys
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from input_staging import stage_input, mapped_input
+from job_journal import file_hash
+from pwx_reader import read_pwx
+
+def test_stage_network_input_copies_and_hashes(tmp_pwx_file, tmp_path, monkeypatch):
+    import input_staging
+    monkeypatch.setattr(input_staging, 'STAGE_CHUNK_SIZE', 64)  # several chunks
+    staging_dir = tmp_path / "staging"
+    staging_dir.mkdir()
+
+    with stage_input(tmp_pwx_file, network=True, staging_dir=str(staging_dir)) as staged:
+        assert staged.source == tmp_pwx_file
+        assert os.path.dirname(staged.path) == str(staging_dir)
+        assert staged.path.endswith("-test.pwx")
+        assert staged.content_hash == file_hash(tmp_pwx_file)
+        with open(staged.path, 'rb') as copy, open(tmp_pwx_file, 'rb') as original:
+            assert copy.read() == original.read()
+
+    assert os.listdir(staging_dir) == []
+
+def test_local_input_is_used_in_place(tmp_pwx_file):
+    staged = stage_input(tmp_pwx_file, network=False, with_hash=False)
+    assert staged.path == tmp_pwx_file
+    assert staged.content_hash is None
+    staged.close()
+    assert os.path.exists(tmp_pwx_file)
+
+def test_failed_staging_leaves_nothing_behind(tmp_path):
+    staging_dir = tmp_path / "staging"
+    staging_dir.mkdir()
+    with pytest.raises(OSError):
+        stage_input(str(tmp_path / "missing.pwx"), network=True, staging_dir=str(staging_dir))
+    assert os.listdir(staging_dir) == []
+
+def test_parse_from_memory_map(tmp_pwx_file, tmp_path):
+    with mapped_input(tmp_pwx_file) as source:
+        ride = read_pwx(source)
+    assert len(ride.samples) == 3
+    assert ride.base_name == read_pwx(tmp_pwx_file).base_name
+
+    empty = tmp_path / "empty.pwx"
+    empty.write_bytes(b"")
+    with mapped_input(str(empty)) as source:
+        assert source.read() == b""
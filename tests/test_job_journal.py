@@ -0,0 +1,88 @@
+import os
+import sys
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from job_journal import JobJournal, file_hash, stage_reached
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = JobJournal(str(tmp_path / "journal.sqlite3"))
+    yield journal
+    journal.close()
+
+def test_record_and_get(journal):
+    assert journal.get("ride.pwx") is None
+
+    journal.record("ride.pwx", 'parsed', base_name="2025-12-03_05-48-22", sample_count=3)
+    journal.record("ride.pwx", 'tcx', tcx_path="/out/ride.tcx")
+
+    job = journal.get("ride.pwx")
+    assert job['stage'] == 'tcx'
+    assert job['base_name'] == "2025-12-03_05-48-22"
+    assert job['tcx_path'] == "/out/ride.tcx"
+    assert job['archived'] == 0
+
+def test_stage_never_moves_backwards(journal):
+    journal.record("ride.pwx", 'uploaded', upload_id=5)
+    journal.record("ride.pwx", 'tcx', tcx_path="/out/ride.tcx")
+
+    job = journal.get("ride.pwx")
+    assert job['stage'] == 'uploaded'
+    assert job['tcx_path'] == "/out/ride.tcx"
+
+    # Terminal stages can always be set
+    journal.record("ride.pwx", 'rejected', error="bad file")
+    assert journal.get("ride.pwx")['stage'] == 'rejected'
+
+def test_unknown_field_rejected(journal):
+    with pytest.raises(ValueError):
+        journal.record("ride.pwx", 'parsed', colour="red")
+
+def test_start_resets_archived_jobs(journal):
+    journal.record("ride.pwx", 'fit', fit_path="/out/ride.fit")
+    assert journal.start("ride.pwx")['stage'] == 'fit'
+
+    # Once archived, a new file with the same name is a new job
+    journal.record("ride.pwx", archived=1)
+    assert journal.start("ride.pwx") is None
+    assert journal.get("ride.pwx") is None
+
+def test_pending_uploads(journal):
+    journal.record("a.pwx", 'upload_queued', upload_path="/out/a.fit")
+    journal.record("b.pwx", 'uploaded', upload_id=9)
+    journal.record("c.pwx", 'confirmed')
+    journal.record("d.pwx", 'fit')
+
+    assert [job['filename'] for job in journal.pending_uploads()] == ["a.pwx", "b.pwx"]
+
+def test_journal_persists_across_connections(tmp_path):
+    path = str(tmp_path / "journal.sqlite3")
+    first = JobJournal(path)
+    first.record("ride.pwx", 'uploaded', upload_id=42)
+    first.close()
+
+    second = JobJournal(path)
+    assert second.get("ride.pwx")['upload_id'] == 42
+    second.close()
+
+def test_stage_reached():
+    assert stage_reached('fit', 'tcx')
+    assert not stage_reached('parsed', 'tcx')
+    assert not stage_reached('failed', 'parsed')
+
+def test_ride_index_lookup(journal):
+    journal.remember_ride("abc", "2025-12-03T05:48:22|60|200", "ride.pwx", "2025-12-03_05-48-22",
+                          "/out/ride.tcx", "/out/ride.fit")
+
+    assert journal.find_ride(content_hash="abc")['filename'] == "ride.pwx"
+    assert journal.find_ride(content_hash="other", fingerprint="2025-12-03T05:48:22|60|200")['content_hash'] == "abc"
+    assert journal.find_ride(content_hash="other", fingerprint="nope") is None
+    assert journal.known_fingerprints() == {"2025-12-03T05:48:22|60|200"}
+
+def test_file_hash(tmp_path):
+    path = tmp_path / "ride.pwx"
+    path.write_bytes(b"hello")
+    assert file_hash(str(path)) == "2cf24dba5fb0a30e26e83b2ac5b9e29e1b161e5c1fa7425e73043362938b9824"
@@ -0,0 +1,74 @@
+import os
+import sys
+import urllib.request
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from metrics import Metrics
+
+@pytest.fixture
+def registry():
+    registry = Metrics()
+    registry.describe('jobs_total', 'counter', 'Jobs by outcome')
+    registry.describe('depth', 'gauge', 'Queue depth')
+    registry.describe('stage_seconds', 'histogram', 'Stage time', buckets=(0.1, 1))
+    return registry
+
+def test_render_prometheus_text(registry):
+    registry.inc('jobs_total', outcome='ok')
+    registry.inc('jobs_total', 2, outcome='ok')
+    registry.inc('jobs_total', outcome='failed')
+    registry.set('depth', 4)
+    registry.observe('stage_seconds', 0.05, stage='parse')
+    registry.observe('stage_seconds', 0.5, stage='parse')
+
+    text = registry.render()
+    assert "# TYPE jobs_total counter" in text
+    assert 'jobs_total{outcome="ok"} 3' in text
+    assert 'jobs_total{outcome="failed"} 1' in text
+    assert "depth 4" in text
+    assert 'stage_seconds_bucket{stage="parse",le="0.1"} 1' in text
+    assert 'stage_seconds_bucket{stage="parse",le="1"} 2' in text
+    assert 'stage_seconds_bucket{stage="parse",le="+Inf"} 2' in text
+    assert 'stage_seconds_sum{stage="parse"} 0.55' in text
+    assert 'stage_seconds_count{stage="parse"} 2' in text
+    assert registry.get('stage_seconds', stage='parse') == (0.55, 2)
+
+def test_label_escaping_and_undeclared_metric(registry):
+    registry.inc('jobs_total', outcome='say "hi"\n')
+    assert 'jobs_total{outcome="say \\"hi\\"\\n"} 1' in registry.render()
+    with pytest.raises(KeyError):
+        registry.inc('depth')
+    with pytest.raises(KeyError):
+        registry.inc('unknown_total')
+
+def test_collectors_run_before_render(registry):
+    registry.add_collector(lambda: registry.set('depth', 9))
+    assert "depth 9" in registry.render()
+
+def test_time_context_manager(registry):
+    with registry.time('stage_seconds', stage='fit'):
+        pass
+    total, count = registry.get('stage_seconds', stage='fit')
+    assert count == 1 and total >= 0
+
+def test_write_file(registry, tmp_path):
+    registry.set('depth', 1)
+    path = tmp_path / "velotron.prom"
+    registry.write_file(str(path))
+    assert "depth 1" in path.read_text()
+    assert os.listdir(tmp_path) == ["velotron.prom"]
+
+def test_http_endpoint(registry):
+    registry.set('depth', 2)
+    server = registry.serve(0, host='127.0.0.1')
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            assert response.headers['Content-Type'].startswith('text/plain')
+            assert "depth 2" in response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
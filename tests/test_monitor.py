@@ -52,3 +52,283 @@ def test_process_file_failure(setup_test_dirs):
             # Check if original moved to failed/
             assert os.path.exists(os.path.join(setup_test_dirs['failed'], filename))
             assert not os.path.exists(target_path)
+
+def test_process_files_with_worker_pool(setup_test_dirs, tmp_pwx_file):
+    import shutil
+    from conversion_pool import ConversionPool
+
+    shutil.copy(tmp_pwx_file, os.path.join(setup_test_dirs['original'], "good.pwx"))
+    with open(os.path.join(setup_test_dirs['original'], "bad.pwx"), 'w') as f:
+        f.write("not xml")
+
+    pool = ConversionPool(2)
+    try:
+        with patch('monitor_and_convert.BASE_DIRECTORY', setup_test_dirs['base']):
+            with patch('monitor_and_convert.STRAVA_ENABLED', False):
+                monitor_and_convert.process_files(["bad.pwx", "good.pwx"], pool)
+    finally:
+        pool.close()
+
+    assert os.path.exists(os.path.join(setup_test_dirs['failed'], "bad.pwx"))
+    assert os.path.exists(os.path.join(setup_test_dirs['processed'], "good.pwx"))
+    assert os.path.exists(os.path.join(setup_test_dirs['converted'], "2025-12-03_05-48-22.tcx"))
+    assert os.path.exists(os.path.join(setup_test_dirs['converted'], "2025-12-03_05-48-22.fit"))
+    assert os.listdir(setup_test_dirs['original']) == []
+
+@pytest.fixture
+def journal(setup_test_dirs):
+    from job_journal import JobJournal
+    journal = JobJournal(os.path.join(setup_test_dirs['base'], "journal.sqlite3"))
+    with patch('monitor_and_convert.journal', journal):
+        yield journal
+    journal.close()
+
+def test_process_file_records_journal_and_queues_upload(setup_test_dirs, tmp_pwx_file, journal):
+    import shutil
+    shutil.copy(tmp_pwx_file, os.path.join(setup_test_dirs['original'], "ride.pwx"))
+    queue = MagicMock()
+
+    with patch('monitor_and_convert.BASE_DIRECTORY', setup_test_dirs['base']):
+        with patch('monitor_and_convert.STRAVA_ENABLED', True):
+            with patch('monitor_and_convert.upload_queue', queue):
+                monitor_and_convert.process_file("ride.pwx")
+
+    fit_path = os.path.join(setup_test_dirs['converted'], "2025-12-03_05-48-22.fit")
+    queue.submit.assert_called_once_with(fit_path, activity_type="virtualride", key="ride.pwx")
+    job = journal.get("ride.pwx")
+    assert job['stage'] == 'upload_queued'
+    assert job['upload_path'] == fit_path
+    assert job['archived'] == 1
+
+    # The upload stage reports back through the journal
+    from upload_queue import UploadJob
+    upload = UploadJob(fit_path, key="ride.pwx", upload_id=77)
+    monitor_and_convert.upload_started(upload)
+    assert journal.get("ride.pwx")['stage'] == 'uploaded'
+    monitor_and_convert.upload_finished(upload, 'success', 555)
+    job = journal.get("ride.pwx")
+    assert (job['stage'], job['activity_id']) == ('confirmed', 555)
+
+def test_process_file_without_upload_queue(setup_test_dirs, tmp_pwx_file, journal, capsys):
+    import shutil
+    shutil.copy(tmp_pwx_file, os.path.join(setup_test_dirs['original'], "ride.pwx"))
+
+    with patch('monitor_and_convert.BASE_DIRECTORY', setup_test_dirs['base']), \
+            patch('monitor_and_convert.STRAVA_ENABLED', True), \
+            patch('monitor_and_convert.upload_queue', None):
+        monitor_and_convert.process_file("ride.pwx")
+
+    # Converted and archived as usual; the upload is left for the next monitor start
+    assert os.path.exists(os.path.join(setup_test_dirs['processed'], "ride.pwx"))
+    assert os.listdir(setup_test_dirs['failed']) == []
+    assert journal.get("ride.pwx")['stage'] == 'upload_queued'
+    assert "upload queue not running" in capsys.readouterr().out
+
+def test_process_file_resumes_from_journal(setup_test_dirs, tmp_pwx_file, journal):
+    import shutil
+    shutil.copy(tmp_pwx_file, os.path.join(setup_test_dirs['original'], "ride.pwx"))
+    tcx_path = os.path.join(setup_test_dirs['converted'], "ride.tcx")
+    fit_path = os.path.join(setup_test_dirs['converted'], "ride.fit")
+    for path in (tcx_path, fit_path):
+        open(path, 'w').close()
+    # Restarted after Strava accepted the upload but before the ride was archived
+    journal.record("ride.pwx", 'uploaded', base_name="ride", sample_count=3, tcx_path=tcx_path,
+                   fit_path=fit_path, upload_path=fit_path, upload_id=77)
+    queue = MagicMock()
+
+    with patch('monitor_and_convert.BASE_DIRECTORY', setup_test_dirs['base']):
+        with patch('monitor_and_convert.STRAVA_ENABLED', True):
+            with patch('monitor_and_convert.upload_queue', queue):
+                with patch('monitor_and_convert.convert_ride', side_effect=AssertionError("reconverted")):
+                    monitor_and_convert.process_file("ride.pwx")
+
+    queue.resume.assert_called_once_with(fit_path, 77, key="ride.pwx")
+    queue.submit.assert_not_called()
+    assert os.path.exists(os.path.join(setup_test_dirs['processed'], "ride.pwx"))
+    assert journal.get("ride.pwx")['archived'] == 1
+
+def test_resume_pending_uploads_after_restart(setup_test_dirs, journal):
+    fit_path = os.path.join(setup_test_dirs['converted'], "ride.fit")
+    open(fit_path, 'w').close()
+    journal.record("queued.pwx", 'upload_queued', upload_path=fit_path, archived=1)
+    journal.record("sent.pwx", 'uploaded', upload_path=fit_path, upload_id=12, archived=1)
+    queue = MagicMock()
+
+    with patch('monitor_and_convert.BASE_DIRECTORY', setup_test_dirs['base']):
+        with patch('monitor_and_convert.upload_queue', queue):
+            monitor_and_convert.resume_pending_uploads()
+
+    queue.submit.assert_called_once_with(fit_path, activity_type="virtualride", key="queued.pwx")
+    queue.resume.assert_called_once_with(fit_path, 12, key="sent.pwx")
+
+def test_duplicate_rides_skip_conversion_and_upload(setup_test_dirs, tmp_pwx_file, sample_pwx_content, journal):
+    import shutil
+    from conversion_pool import ConversionPool
+
+    shutil.copy(tmp_pwx_file, os.path.join(setup_test_dirs['original'], "first.pwx"))
+    queue = MagicMock()
+    pool = ConversionPool(1)
+
+    with patch('monitor_and_convert.BASE_DIRECTORY', setup_test_dirs['base']):
+        with patch('monitor_and_convert.STRAVA_ENABLED', True):
+            with patch('monitor_and_convert.upload_queue', queue):
+                monitor_and_convert.process_files(["first.pwx"], pool)
+                assert queue.submit.call_count == 1
+
+                # Byte-identical copy: recognised by hash before any parsing
+                shutil.copy(tmp_pwx_file, os.path.join(setup_test_dirs['original'], "copy.pwx"))
+                # Re-export with different formatting: recognised by fingerprint
+                with open(os.path.join(setup_test_dirs['original'], "reexport.pwx"), 'w') as f:
+                    f.write(sample_pwx_content.replace("  ", "\t"))
+
+                with patch('monitor_and_convert.convert_ride', side_effect=AssertionError("reconverted")):
+                    monitor_and_convert.process_files(["copy.pwx", "reexport.pwx"], pool)
+
+    assert queue.submit.call_count == 1
+    for name in ("first.pwx", "copy.pwx", "reexport.pwx"):
+        assert os.path.exists(os.path.join(setup_test_dirs['processed'], name))
+    assert journal.get("copy.pwx")['stage'] == 'duplicate'
+    assert journal.get("reexport.pwx")['stage'] == 'duplicate'
+    assert sorted(os.listdir(setup_test_dirs['converted'])) == ["2025-12-03_05-48-22.fit", "2025-12-03_05-48-22.tcx"]
+
+def test_duplicate_with_missing_outputs_is_reconverted(setup_test_dirs, tmp_pwx_file, journal):
+    import shutil
+
+    shutil.copy(tmp_pwx_file, os.path.join(setup_test_dirs['original'], "first.pwx"))
+    with patch('monitor_and_convert.BASE_DIRECTORY', setup_test_dirs['base']):
+        with patch('monitor_and_convert.STRAVA_ENABLED', False):
+            monitor_and_convert.process_file("first.pwx")
+            for name in os.listdir(setup_test_dirs['converted']):
+                os.remove(os.path.join(setup_test_dirs['converted'], name))
+
+            shutil.copy(tmp_pwx_file, os.path.join(setup_test_dirs['original'], "again.pwx"))
+            monitor_and_convert.process_file("again.pwx")
+
+    assert journal.get("again.pwx")['stage'] == 'fit'
+    assert os.path.exists(os.path.join(setup_test_dirs['converted'], "2025-12-03_05-48-22.tcx"))
+
+def test_duplicates_in_same_batch_upload_once(setup_test_dirs, tmp_pwx_file, journal):
+    import shutil
+    from conversion_pool import ConversionPool
+
+    for name in ("a.pwx", "b.pwx"):
+        shutil.copy(tmp_pwx_file, os.path.join(setup_test_dirs['original'], name))
+    queue = MagicMock()
+    pool = ConversionPool(2)
+    try:
+        with patch('monitor_and_convert.BASE_DIRECTORY', setup_test_dirs['base']):
+            with patch('monitor_and_convert.STRAVA_ENABLED', True):
+                with patch('monitor_and_convert.upload_queue', queue):
+                    monitor_and_convert.process_files(["a.pwx", "b.pwx"], pool)
+    finally:
+        pool.close()
+
+    assert queue.submit.call_count == 1
+    assert journal.get("b.pwx")['stage'] == 'duplicate'
+
+def test_staged_inputs_are_parsed_locally_and_cleaned_up(setup_test_dirs, tmp_pwx_file, journal, tmp_path):
+    import shutil
+    from conversion_pool import ConversionPool
+
+    staging_dir = tmp_path / "staging"
+    staging_dir.mkdir()
+    for name in ("a.pwx", "b.pwx"):
+        shutil.copy(tmp_pwx_file, os.path.join(setup_test_dirs['original'], name))
+    pool = ConversionPool(2)
+    try:
+        with patch('monitor_and_convert.BASE_DIRECTORY', setup_test_dirs['base']), \
+                patch('monitor_and_convert.STRAVA_ENABLED', False), \
+                patch('monitor_and_convert.stage_inputs', True), \
+                patch('monitor_and_convert.STAGING_DIR', str(staging_dir)):
+            monitor_and_convert.process_files(["a.pwx", "b.pwx"], pool)
+    finally:
+        pool.close()
+
+    assert os.listdir(staging_dir) == []
+    assert sorted(os.listdir(setup_test_dirs['processed'])) == ["a.pwx", "b.pwx"]
+    assert journal.get("a.pwx")['stage'] == 'fit'
+    assert journal.get("b.pwx")['stage'] == 'duplicate'
+
+def test_converted_rides_are_archived(setup_test_dirs, tmp_pwx_file):
+    import shutil
+    from ride_archive import RideArchive
+
+    shutil.copy(tmp_pwx_file, os.path.join(setup_test_dirs['original'], "ride.pwx"))
+    with patch('monitor_and_convert.BASE_DIRECTORY', setup_test_dirs['base']), \
+            patch('monitor_and_convert.STRAVA_ENABLED', False), \
+            patch('monitor_and_convert.RIDE_ARCHIVE', True):
+        monitor_and_convert.process_file("ride.pwx")
+
+    archive = RideArchive(os.path.join(setup_test_dirs['base'], "archive"))
+    rides = archive.rides()
+    assert [ride['base_name'] for ride in rides] == ["2025-12-03_05-48-22"]
+    with archive.open(rides[0]) as archived:
+        assert list(archived.column('hr')[0]) == [120.0, 130.0, 140.0]
+    # The all-time curve is updated with each archived ride, from the curve the worker computed
+    from power_curve import CurveStore
+    assert os.path.exists(os.path.join(setup_test_dirs['base'], "archive", "curves", "all_time.json"))
+    assert CurveStore(archive).all_time()['hr'][1] == [140, "2025-12-03_05-48-22"]
+
+    shutil.copy(tmp_pwx_file, os.path.join(setup_test_dirs['original'], "again.pwx"))
+    with patch('monitor_and_convert.BASE_DIRECTORY', setup_test_dirs['base']), \
+            patch('monitor_and_convert.STRAVA_ENABLED', False), \
+            patch('monitor_and_convert.RIDE_ARCHIVE', False):
+        assert monitor_and_convert.ride_archive_dir() is None
+        monitor_and_convert.process_file("again.pwx")
+    assert len(archive.rides()) == 1
+
+def test_converted_rides_are_indexed(setup_test_dirs, tmp_pwx_file, monkeypatch):
+    import shutil
+    from ride_index import RideIndex
+
+    index = RideIndex(os.path.join(setup_test_dirs['base'], "rides.sqlite3"))
+    monkeypatch.setattr(monitor_and_convert, 'ride_index', index)
+    monkeypatch.setattr(monitor_and_convert, 'RIDER_NAME', "Sam")
+    shutil.copy(tmp_pwx_file, os.path.join(setup_test_dirs['original'], "ride.pwx"))
+    with patch('monitor_and_convert.BASE_DIRECTORY', setup_test_dirs['base']), \
+            patch('monitor_and_convert.STRAVA_ENABLED', False):
+        monitor_and_convert.process_file("ride.pwx")
+
+    row = index.get("2025-12-03_05-48-22")
+    assert row['filename'] == "ride.pwx"
+    assert row['rider'] == "Sam"
+    assert row['distance_m'] == 200
+    assert row['avg_hr'] == 130
+    index.close()
+
+def test_recording_setting(monkeypatch):
+    monkeypatch.setattr(monitor_and_convert, 'RECORDING_MODE', 'smart')
+    assert monitor_and_convert.recording_mode() == 'smart'
+    monkeypatch.setattr(monitor_and_convert, 'RECORDING_MODE', 'rate')
+    monkeypatch.setattr(monitor_and_convert, 'RECORDING_INTERVAL', 0)
+    assert monitor_and_convert.recording_mode() == 'every'
+    monkeypatch.setattr(monitor_and_convert, 'RECORDING_MODE', 'often')
+    assert monitor_and_convert.recording_mode() == 'every'
+
+def test_staging_setting(monkeypatch):
+    monkeypatch.setattr(monitor_and_convert, 'STAGE_INPUTS', 'auto')
+    with patch('monitor_and_convert.is_network_path', return_value=True):
+        assert monitor_and_convert.staging_enabled('/Volumes/veloMonitor')
+    monkeypatch.setattr(monitor_and_convert, 'STAGE_INPUTS', 'false')
+    with patch('monitor_and_convert.is_network_path', return_value=True):
+        assert not monitor_and_convert.staging_enabled('/Volumes/veloMonitor')
+    monkeypatch.setattr(monitor_and_convert, 'STAGE_INPUTS', 'true')
+    assert monitor_and_convert.staging_enabled('/data')
+
+def test_process_file_records_stage_metrics(setup_test_dirs, tmp_pwx_file, tmp_path):
+    import shutil
+    from metrics import METRICS
+
+    shutil.copy(tmp_pwx_file, os.path.join(setup_test_dirs['original'], "ride.pwx"))
+    before = METRICS.get('velotron_files_total', outcome='processed') or 0
+    metrics_file = tmp_path / "velotron.prom"
+
+    with patch('monitor_and_convert.BASE_DIRECTORY', setup_test_dirs['base']):
+        with patch('monitor_and_convert.STRAVA_ENABLED', False):
+            with patch('monitor_and_convert.METRICS_FILE', str(metrics_file)):
+                monitor_and_convert.process_file("ride.pwx")
+
+    assert METRICS.get('velotron_files_total', outcome='processed') == before + 1
+    for stage in ('parse', 'tcx', 'fit', 'move', 'total'):
+        assert METRICS.get('velotron_stage_seconds', stage=stage)[1] >= 1
+    assert 'velotron_files_total{outcome="processed"}' in metrics_file.read_text()
@@ -0,0 +1,93 @@
+import os
+import sys
+import gzip
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from output_files import open_output, output_name, is_compressed
+
+def test_output_name():
+    assert output_name("2025-12-03_05-48-22", "tcx") == "2025-12-03_05-48-22.tcx"
+    assert output_name("2025-12-03_05-48-22", "fit", compress=True) == "2025-12-03_05-48-22.fit.gz"
+    assert is_compressed("ride.TCX.GZ")
+    assert not is_compressed("ride.tcx")
+
+def test_plain_output(tmp_path):
+    path = str(tmp_path / "ride.tcx")
+    with open_output(path, encoding="utf-8") as stream:
+        stream.write("<tcx>é</tcx>")
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == "<tcx>é</tcx>"
+
+def test_gzip_text_and_binary(tmp_path):
+    text_path = str(tmp_path / "ride.tcx.gz")
+    with open_output(text_path, encoding="utf-8", errors="xmlcharrefreplace") as stream:
+        for _ in range(1000):
+            stream.write("<Trackpoint><Time>2025-12-03T05:48:22Z</Time></Trackpoint>")
+    with gzip.open(text_path, "rt", encoding="utf-8") as f:
+        assert f.read() == "<Trackpoint><Time>2025-12-03T05:48:22Z</Time></Trackpoint>" * 1000
+    assert os.path.getsize(text_path) < 1000
+
+    binary_path = str(tmp_path / "ride.fit.gz")
+    with open_output(binary_path) as stream:
+        stream.write(b"\x0e\x10FIT" * 10)
+    with gzip.open(binary_path) as f:
+        assert f.read() == b"\x0e\x10FIT" * 10
+
+def test_gzip_output_is_reproducible(tmp_path):
+    first, second = str(tmp_path / "a.fit.gz"), str(tmp_path / "b" / "a.fit.gz")
+    os.mkdir(tmp_path / "b")
+    for path in (first, second):
+        with open_output(path) as stream:
+            stream.write(b"same ride")
+    with open(first, 'rb') as a, open(second, 'rb') as b:
+        assert a.read() == b.read()
+
+def test_output_appears_only_when_complete(tmp_path):
+    path = str(tmp_path / "ride.tcx")
+    with open_output(path, encoding="utf-8") as stream:
+        stream.write("<tcx>")
+        assert not os.path.exists(path)
+        assert [name for name in os.listdir(tmp_path)] == [f".ride.tcx.{os.getpid()}.tmp"]
+    assert os.listdir(tmp_path) == ["ride.tcx"]
+
+def test_failed_write_keeps_previous_output(tmp_path):
+    import pytest
+    path = tmp_path / "ride.fit"
+    path.write_bytes(b"previous")
+    with pytest.raises(RuntimeError):
+        with open_output(str(path)) as stream:
+            stream.write(b"half a ri")
+            raise RuntimeError("encoder failed")
+    assert path.read_bytes() == b"previous"
+    assert os.listdir(tmp_path) == ["ride.fit"]
+
+def test_permissions_applied_before_rename(tmp_path, monkeypatch):
+    import output_files
+    path = str(tmp_path / "ride.fit")
+    seen = []
+    monkeypatch.setattr(output_files, 'set_permissions', lambda p: seen.append((p, os.path.exists(path))))
+    with open_output(path) as stream:
+        stream.write(b"fit")
+    assert seen == [(str(tmp_path / f".ride.fit.{os.getpid()}.tmp"), False)]
+
+def test_network_output_is_written_locally_then_copied(tmp_path, monkeypatch):
+    import tempfile
+    import output_files
+    share, local = tmp_path / "share", tmp_path / "local"
+    share.mkdir()
+    local.mkdir()
+    monkeypatch.setattr(output_files, '_network_directory', lambda directory: True)
+    monkeypatch.setattr(tempfile, 'tempdir', str(local))
+
+    path = str(share / "ride.tcx.gz")
+    with open_output(path, encoding="utf-8") as stream:
+        stream.write("<tcx/>")
+        assert len(os.listdir(local)) == 1
+        assert os.listdir(share) == []
+
+    assert os.listdir(local) == []
+    assert os.listdir(share) == ["ride.tcx.gz"]
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        assert f.read() == "<tcx/>"
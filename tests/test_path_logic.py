@@ -6,31 +6,7 @@ import sys
 # Add project root to path so we can import modules
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-# We need to wrap the logic from monitor_and_convert in a function or mock it carefully
-# For now, let's extract the core logic into a testable function or just test it via a helper
-
-def get_monitor_path_logic(args_directory=None):
-    # This is a copy of the logic in monitor_and_convert.py
-    USING_CLI_ARG = False
-    ENV_MONITOR_PATH = os.getenv('MONITOR_PATH')
-
-    if args_directory:
-        MONITOR_PATH = args_directory
-        USING_CLI_ARG = True
-    elif ENV_MONITOR_PATH:
-        MONITOR_PATH = ENV_MONITOR_PATH
-    else:
-        # Default search paths if no environment variable or CLI arg is set
-        if os.path.exists('/veloMonitor'):
-            MONITOR_PATH = '/veloMonitor'
-        elif os.path.exists('/velotronMonitor'):
-            MONITOR_PATH = '/velotronMonitor'
-        elif os.path.exists('/Volumes/veloMonitor'):
-            MONITOR_PATH = '/Volumes/veloMonitor'
-        else:
-            MONITOR_PATH = os.getcwd()
-    
-    return MONITOR_PATH
+from monitor_and_convert import resolve_monitor_path as get_monitor_path_logic
 
 def test_cli_path_precedence():
     assert get_monitor_path_logic("/some/cli/path") == "/some/cli/path"
@@ -61,3 +37,14 @@ def test_fallback_to_getcwd():
         with patch("os.path.exists", return_value=False):
             with patch("os.getcwd", return_value="/current/dir"):
                 assert get_monitor_path_logic() == "/current/dir"
+
+def test_check_base_directory_catches_wrong_mount():
+    from monitor_and_convert import check_base_directory
+    with patch("os.path.exists", side_effect=lambda p: p == '/veloMonitor'):
+        with patch("time.sleep") as mock_sleep:
+            with pytest.raises(SystemExit):
+                check_base_directory('/app/missing', explicit=False)
+            mock_sleep.assert_called_once_with(60)
+
+        # An explicit path is trusted and created later
+        check_base_directory('/app/missing', explicit=True)
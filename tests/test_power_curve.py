@@ -0,0 +1,149 @@
+import os
+import sys
+import json
+import random
+import datetime
+from array import array
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import power_curve
+from power_curve import CurveStore, curve_durations, resample, mean_max, format_duration
+from pwx_reader import read_pwx
+from ride_archive import RideArchive, write_ride
+
+def archive_ride(make_pwx, archive, start, samples):
+    """Archive a ride from (timeoffset, watts, bpm) samples."""
+    archive.add(write_ride(read_pwx(make_pwx(start, samples, channels=('pwr', 'hr'))), archive.path))
+
+def test_curve_durations():
+    assert curve_durations(5) == [1, 2, 3, 4, 5]
+    durations = curve_durations(4 * 3600 + 17)
+    assert durations[:power_curve.DENSE_SECONDS] == list(range(1, power_curve.DENSE_SECONDS + 1))
+    assert durations[-1] == 4 * 3600 + 17
+    assert durations == sorted(set(durations))
+    # Spaced by at most STEP_RATIO, and whole blocks once windows are block-aligned
+    for shorter, longer in zip(durations, durations[1:-1]):
+        assert longer <= max(shorter + 1, shorter * power_curve.STEP_RATIO)
+        if longer >= power_curve.COARSE_FROM:
+            assert longer % (longer // power_curve.COARSE_BLOCKS) == 0
+
+def test_resample_holds_short_dropouts():
+    timeoffset = array('d', [0, 0.5, 1, 2, 8, 9])
+    values = array('d', [100, 200, 300, 0, 400, 500])
+    present = bytearray([1, 1, 1, 0, 1, 1])
+    series = resample(timeoffset, values, present)
+    # 0 and 0.5 share a bin; seconds 2-4 hold 300, 5-7 count as stopped
+    assert list(series) == [150, 300, 300, 300, 300, 0, 0, 0, 400, 500]
+    assert resample(timeoffset, values, bytearray(6)) is None
+
+def test_mean_max_matches_brute_force():
+    rng = random.Random(4)
+    series = array('d', (rng.randint(0, 900) for _ in range(400)))
+    durations = [1, 2, 7, 60, 399, 400, 401]
+    best = mean_max(series, durations)
+    assert sorted(best) == [1, 2, 7, 60, 399, 400]
+    for duration, value in best.items():
+        expected = max(sum(series[i:i + duration]) for i in range(len(series) - duration + 1)) / duration
+        assert value == pytest.approx(expected)
+
+def test_mean_max_long_durations_are_close():
+    rng = random.Random(7)
+    series = array('d', (rng.gauss(250, 60) for _ in range(2 * 3600)))
+    total = [0.0]
+    for value in series:
+        total.append(total[-1] + value)
+    durations = [d for d in curve_durations(len(series)) if d >= power_curve.COARSE_FROM]
+    best = mean_max(series, durations)
+    for duration in durations:
+        exact = max(total[i + duration] - total[i] for i in range(len(series) - duration + 1)) / duration
+        assert exact * 0.99 <= best[duration] <= exact + 1e-9
+    assert best[len(series)] == pytest.approx(sum(series) / len(series))
+
+def test_ride_curves_are_cached(tmp_path, make_pwx):
+    archive = RideArchive(str(tmp_path / "archive"))
+    archive_ride(make_pwx, archive, "2025-01-05T08:00:00",
+                 [(t, 200 + 100 * (10 <= t < 20), 120) for t in range(60)])
+    store = CurveStore(archive)
+    entry = archive.rides()[0]
+
+    curve = store.ride(entry)
+    assert curve['pwr'][1] == 300
+    assert curve['pwr'][10] == 300
+    assert curve['pwr'][60] == pytest.approx(200 + 1000 / 60, abs=0.1)
+    assert curve['hr'][30] == 120
+
+    cache = tmp_path / "archive" / "curves" / "2025-01-05_08-00-00.json"
+    data = json.loads(cache.read_text())
+    data['curves']['pwr']['1'] = 999
+    cache.write_text(json.dumps(data))
+    assert store.ride(entry)['pwr'][1] == 999  # served from the cache
+
+    # A ride whose fingerprint changed is recomputed
+    assert store.ride(dict(entry, fingerprint='other'))['pwr'][1] == 300
+
+def test_all_time_is_updated_incrementally(tmp_path, make_pwx, monkeypatch):
+    archive = RideArchive(str(tmp_path / "archive"))
+    store = CurveStore(archive)
+    archive_ride(make_pwx, archive, "2025-01-05T08:00:00", [(t, 300, 150) for t in range(30)])
+    best = store.all_time()
+    assert best['pwr'][30] == [300, "2025-01-05_08-00-00"]
+
+    archive_ride(make_pwx, archive, "2025-02-05T08:00:00",
+                 [(t, 500 if t < 5 else 100, 140) for t in range(120)])
+    computed = []
+    original_ride = CurveStore.ride
+    monkeypatch.setattr(CurveStore, 'ride', lambda self, entry: computed.append(entry['base_name'])
+                        or original_ride(self, entry))
+    best = store.all_time()
+    assert computed == ["2025-02-05_08-00-00"]  # only the new ride is looked at
+    assert best['pwr'][5] == [500, "2025-02-05_08-00-00"]
+    assert best['pwr'][30] == [300, "2025-01-05_08-00-00"]
+    assert best['pwr'][120][1] == "2025-02-05_08-00-00"
+    assert best['hr'][10] == [150, "2025-01-05_08-00-00"]
+
+    computed.clear()
+    assert store.all_time() == best
+    assert computed == []
+
+    since = datetime.datetime(2025, 2, 1).astimezone()
+    assert store.best(since=since)['pwr'][30][1] == "2025-02-05_08-00-00"
+
+def test_added_ride_curve_matches_archive(tmp_path, make_pwx, monkeypatch):
+    archive = RideArchive(str(tmp_path / "archive"))
+    store = CurveStore(archive)
+    archive_ride(make_pwx, archive, "2025-01-05T08:00:00", [(t, 300, 150) for t in range(30)])
+    store.all_time()
+
+    ride = read_pwx(make_pwx("2025-02-05T08:00:00", [(t / 2, 500 if t < 10 else 100, 140) for t in range(240)],
+                             channels=('pwr', 'hr')))
+    entry = write_ride(ride, archive.path)
+    archive.add(entry)
+    curve = power_curve.samples_curve(ride.samples)
+    assert curve == store.ride(entry)  # what the conversion worker computes is what the archive gives
+
+    # Merging touches neither the archived samples nor the other rides
+    monkeypatch.setattr(CurveStore, 'ride', lambda self, entry: pytest.fail("recomputed a ride"))
+    best = store.add(entry, curve)
+    assert best['pwr'][5] == [500, "2025-02-05_08-00-00"]
+    assert best['pwr'][30] == [300, "2025-01-05_08-00-00"]
+    monkeypatch.undo()
+    assert store.all_time() == best
+
+def test_format_duration():
+    assert format_duration(5) == "5s"
+    assert format_duration(90) == "1m30s"
+    assert format_duration(1200) == "20m"
+    assert format_duration(5400) == "1h30m"
+    assert format_duration(7200) == "2h"
+
+def test_cli(tmp_path, make_pwx, capsys):
+    archive = RideArchive(str(tmp_path / "archive"))
+    assert power_curve.main([archive.path]) == 1
+    archive_ride(make_pwx, archive, "2025-01-05T08:00:00", [(t, 250, 130) for t in range(70)])
+    assert power_curve.main([archive.path]) == 0
+    out = capsys.readouterr().out
+    assert "1m" in out and "250 W" in out and "2025-01-05_08-00-00" in out
+    assert power_curve.main([archive.path, '--since', '2025-02-01']) == 1
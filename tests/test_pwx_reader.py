@@ -0,0 +1,121 @@
+import datetime
+import os
+import sys
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pwx_reader import read_pwx, parse_start_time, PwxStreamReader, SampleColumns, RideClock, _six_digit_fraction
+
+def test_read_pwx_basic(tmp_pwx_file):
+    ride = read_pwx(tmp_pwx_file)
+
+    assert ride.start_time_str == "2025-12-03T05:48:22"
+    assert ride.start_time.tzinfo is not None
+    assert ride.base_name == "2025-12-03_05-48-22"
+    assert ride.has_summary
+    assert ride.duration == 60.0
+    assert len(ride.samples) == 3
+    assert ride.elapsed_time == 60.0
+
+    samples = ride.samples
+    assert samples.timeoffset[1] == 30.0
+    assert samples.values['hr'][1] == 130.0
+    assert samples.values['pwr'][1] == 210.0
+    assert samples.format_value('alt', 0) == "100"
+
+def test_read_pwx_without_namespace(tmp_path):
+    p = tmp_path / "plain.pwx"
+    p.write_text("""<pwx><workout><time>2025-01-02T03:04:05.500</time>
+    <sample><timeoffset>0</timeoffset><pwr>150</pwr></sample></workout></pwx>""")
+
+    ride = read_pwx(str(p))
+    assert ride.base_name == "2025-01-02_03-04-05"
+    assert not ride.has_summary
+    assert ride.athlete is None
+    assert list(ride.samples.timeoffset) == [0.0]
+    assert list(ride.samples.present['pwr']) == [1]
+    assert list(ride.samples.present['hr']) == [0]
+
+def test_read_pwx_athlete_name(tmp_path):
+    p = tmp_path / "athlete.pwx"
+    p.write_text("""<pwx xmlns="http://www.peaksware.com/PWX/1/0"><workout>
+    <athlete><name> Jane Doe </name><weight>61</weight></athlete><time>2025-01-02T03:04:05</time>
+    <sample><timeoffset>0</timeoffset><pwr>150</pwr></sample></workout></pwx>""")
+
+    assert read_pwx(str(p)).athlete == "Jane Doe"
+
+def test_read_pwx_missing_workout(tmp_path):
+    p = tmp_path / "empty.pwx"
+    p.write_text('<pwx xmlns="http://www.peaksware.com/PWX/1/0"></pwx>')
+
+    with pytest.raises(ValueError):
+        read_pwx(str(p))
+
+def test_stream_reader_ignores_summary_channels(tmp_path):
+    # summarydata carries its own <hr>/<pwr> children that must not leak into samples
+    p = tmp_path / "summary.pwx"
+    p.write_text("""<pwx xmlns="http://www.peaksware.com/PWX/1/0"><workout>
+    <time>2025-01-02T03:04:05</time>
+    <summarydata><duration>2</duration><hr max="150" avg="140"/></summarydata>
+    <sample><timeoffset>0</timeoffset><hr>120</hr></sample>
+    <sample><timeoffset>1</timeoffset><pwr>200</pwr></sample>
+    </workout></pwx>""")
+
+    reader = PwxStreamReader(str(p))
+    samples = list(reader)
+
+    assert samples == [(0.0, {'hr': "120"}), (1.0, {'pwr': "200"})]
+    assert reader.start_time_str == "2025-01-02T03:04:05"
+    assert reader.has_summary
+    assert reader.duration == 2.0
+
+def test_sample_columns_stats():
+    columns = SampleColumns()
+    columns.append(0.0, {'alt': "100.0", 'dist': "0", 'spd': "5.25"})
+    columns.append(1.0, {'alt': "99.5", 'spd': "7"})
+    columns.append(2.0, {'dist': "12.5"})
+    columns.append(3.0, {'alt': "101.25", 'dist': "11"})
+
+    assert len(columns) == 4
+    # Gaps in a channel are skipped, not treated as zero
+    assert columns.elevation_gain() == 1.75
+    assert columns.max_value('dist') == 12.5
+    assert columns.max_value('spd') == 7.0
+    assert columns.max_value('pwr') == 0.0
+    # Verbatim channels keep their original formatting
+    assert columns.format_value('alt', 0) == "100.0"
+    assert columns.format_value('spd', 0) == "5.25"
+    assert columns.format_value('spd', 1) == "7"
+
+@pytest.mark.parametrize("start_time", [
+    datetime.datetime(2025, 12, 31, 23, 59, 30, tzinfo=datetime.timezone(datetime.timedelta(hours=-7))),
+    datetime.datetime(2024, 2, 28, 22, 0, 0, 123456, tzinfo=datetime.timezone(datetime.timedelta(hours=5, minutes=30))),
+    datetime.datetime(2025, 6, 1, 0, 0, 0, tzinfo=datetime.timezone.utc),
+])
+def test_ride_clock_matches_datetime(start_time):
+    clock = RideClock(start_time)
+    offsets = [0.0, 1.0, 0.25, 0.1, 29.9999995, 31.0, 86400.5, 100000.123456, 1e-7]
+    for offset in offsets:
+        expected = start_time + datetime.timedelta(seconds=offset)
+        assert clock.isoformat(offset) == expected.isoformat()
+        assert clock.epoch_ms(offset) == round(expected.timestamp() * 1000)
+    assert clock.epoch_ms_column(offsets) == [clock.epoch_ms(offset) for offset in offsets]
+
+def test_start_time_with_short_fraction(tmp_path):
+    p = tmp_path / "fraction.pwx"
+    p.write_text("""<pwx xmlns="http://www.peaksware.com/PWX/1/0"><workout>
+    <time>2025-11-18T14:29:43.5</time>
+    <sample><timeoffset>0</timeoffset><pwr>200</pwr></sample>
+    </workout></pwx>""")
+    ride = read_pwx(str(p))
+    assert ride.start_time.microsecond == 500000
+    assert ride.base_name == "2025-11-18_14-29-43"
+
+    # Python 3.9's fromisoformat only accepts 3 or 6 digit fractions
+    assert _six_digit_fraction("2025-11-18T14:29:43.5") == "2025-11-18T14:29:43.500000"
+    assert _six_digit_fraction("2025-11-18T14:29:43.1234567+02:00") == "2025-11-18T14:29:43.123456+02:00"
+    assert _six_digit_fraction("2025-11-18T14:29:43") == "2025-11-18T14:29:43"
+    start = parse_start_time("2025-11-18T14:29:43.25+02:00")
+    assert (start.microsecond, start.utcoffset()) == (250000, datetime.timedelta(hours=2))
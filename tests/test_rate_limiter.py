@@ -0,0 +1,75 @@
+import os
+import sys
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from rate_limiter import RateLimiter, DAY
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def make_limiter(limits=(10, 100), read_limits=(10, 100)):
+    # 13:10 UTC: 10 minutes into a 15 minute window
+    clock = FakeClock(20000 * DAY + 13 * 3600 + 10 * 60)
+    return RateLimiter(limits=limits, read_limits=read_limits, poll_share=0.8, clock=clock), clock
+
+def test_headers_update_limits_and_usage():
+    limiter, _ = make_limiter()
+    limiter.update({'X-RateLimit-Limit': '600, 30000', 'X-RateLimit-Usage': '598,1200',
+                    'X-ReadRateLimit-Limit': '300,15000', 'X-ReadRateLimit-Usage': '10,100'})
+    assert limiter.remaining() == (2, 28800)
+    # Junk headers are ignored
+    limiter.update({'X-RateLimit-Limit': 'lots', 'X-RateLimit-Usage': None})
+    assert limiter.remaining() == (2, 28800)
+
+def test_polls_leave_room_for_uploads():
+    limiter, _ = make_limiter()
+    limiter.update({'X-RateLimit-Usage': '8,8'})
+    # 8 of 10 used: polls are capped at 80%, uploads may use the rest
+    assert limiter.delay('poll') == 300  # until the quarter hour
+    assert limiter.delay('upload') == 0
+
+    limiter.acquire('upload', sleep=None)
+    limiter.acquire('upload', sleep=None)
+    assert limiter.delay('upload') == 300
+
+def test_window_and_day_reset():
+    limiter, clock = make_limiter()
+    limiter.update({'X-RateLimit-Usage': '10,50'})
+    assert limiter.delay('upload') == 300
+    clock.now += 300
+    assert limiter.delay('upload') == 0
+    assert limiter.remaining() == (10, 50)
+
+    # A spent daily budget waits for midnight UTC
+    limiter.update({'X-RateLimit-Usage': '0,100'})
+    assert limiter.delay('upload') == 10 * 3600 + 45 * 60
+    clock.now += 10 * 3600 + 45 * 60
+    assert limiter.delay('upload') == 0
+    assert limiter.remaining() == (10, 100)
+
+def test_acquire_waits_instead_of_failing():
+    limiter, clock = make_limiter()
+    limiter.update({'X-RateLimit-Usage': '10,10'})
+    slept = []
+
+    def sleep(seconds):
+        slept.append(seconds)
+        clock.now += seconds
+
+    limiter.acquire('upload', sleep=sleep)
+    assert slept == [300]
+    assert limiter.remaining() == (9, 89)
+
+def test_throttled_blocks_everything():
+    limiter, clock = make_limiter()
+    assert limiter.throttled(retry_after='30') == 30
+    assert limiter.delay('upload') == 30
+    assert limiter.delay('poll') == 30
+    clock.now += 30
+    assert limiter.delay('upload') == 0
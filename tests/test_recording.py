@@ -0,0 +1,65 @@
+import os
+import sys
+from array import array
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pwx_reader import SampleColumns
+from recording import rate_indices, smart_indices, recorded_samples
+
+def columns(rows):
+    """SampleColumns from (timeoffset, {channel: text}) rows."""
+    samples = SampleColumns()
+    for time_offset, values in rows:
+        samples.append(time_offset, values)
+    return samples
+
+def test_rate_indices():
+    # 4 Hz with a little jitter: the first sample of each second, and the last sample
+    timeoffset = array('d', [0, 0.25, 0.49, 0.76, 1.01, 1.24, 1.5, 1.74, 1.99, 2.25, 2.5])
+    assert rate_indices(timeoffset, 1) == [0, 4, 9, 10]
+    assert rate_indices(timeoffset, 0.5) == [0, 3, 4, 6, 9, 10]
+    assert rate_indices(timeoffset, 10) == [0, 10]
+    assert rate_indices(array('d'), 1) == []
+
+def test_smart_keeps_steps_and_edges():
+    # Steady 200 W, a step to 260 W at t=5, then steady again
+    samples = columns([(t, {'pwr': str(200 if t < 5 else 260), 'hr': '140', 'dist': str(t * 8)})
+                       for t in range(9)])
+    # Distance always changes but is not a trigger; the sample before the step is kept
+    assert smart_indices(samples) == [0, 4, 5, 8]
+
+    # Changes smaller than the threshold accumulate against the last kept point
+    samples = columns([(t, {'pwr': str(200 + 2 * t)}) for t in range(6)])
+    assert smart_indices(samples) == [0, 2, 3, 5]
+
+def test_smart_max_gap():
+    samples = columns([(t, {'pwr': '200'}) for t in range(25)])
+    assert smart_indices(samples, max_gap=10) == [0, 10, 20, 24]
+
+def test_smart_ignores_dropouts():
+    rows = [(t, {'pwr': '200', 'hr': '140'}) for t in range(6)]
+    rows[2] = (2, {'pwr': '200'})  # heart rate dropped out for one sample
+    rows[4] = (4, {'hr': '140'})
+    assert smart_indices(columns(rows)) == [0, 5]
+
+    # A channel that first appears mid-ride is a change
+    rows = [(0, {'pwr': '200'}), (1, {'pwr': '200'}), (2, {'pwr': '200', 'hr': '120'}), (3, {'pwr': '200', 'hr': '120'})]
+    assert smart_indices(columns(rows)) == [0, 1, 2, 3]
+
+def test_recorded_samples():
+    samples = columns([(t / 4, {'alt': '1600.10', 'pwr': str(200 + t)}) for t in range(8)])
+    assert recorded_samples(samples) is samples
+
+    points = recorded_samples(samples, 'rate', 1)
+    assert list(points.timeoffset) == [0, 1, 1.75]
+    assert list(points.values['pwr']) == [200, 204, 207]
+    # Verbatim formatting survives the selection
+    assert points.format_value('alt', 1) == "1600.10"
+
+    with pytest.raises(ValueError):
+        recorded_samples(samples, 'rate', 0)
+    with pytest.raises(ValueError):
+        recorded_samples(samples, 'sometimes')
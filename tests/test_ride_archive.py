@@ -0,0 +1,79 @@
+import os
+import sys
+import datetime
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pwx_reader import read_pwx
+from ride_archive import RideArchive, ArchivedRide, write_ride
+from convert_pwx_to_tcx import convert_pwx_to_tcx
+from convert_pwx_to_fit import convert_pwx_to_fit
+
+@pytest.fixture
+def gappy_ride(tmp_path):
+    path = tmp_path / "gappy.pwx"
+    path.write_text("""<pwx xmlns="http://www.peaksware.com/PWX/1/0"><workout>
+    <time>2024-03-01T07:15:00</time>
+    <summarydata><duration>3</duration></summarydata>
+    <sample><timeoffset>0</timeoffset><pwr>200</pwr><alt>1600.10</alt><dist>0</dist></sample>
+    <sample><timeoffset>1.5</timeoffset><alt>1600.2</alt><dist>7.5</dist></sample>
+    <sample><timeoffset>3</timeoffset><pwr>250</pwr><dist>16</dist></sample>
+    </workout></pwx>""")
+    return str(path)
+
+def test_columns_round_trip(gappy_ride, tmp_path):
+    ride = read_pwx(gappy_ride)
+    entry = write_ride(ride, str(tmp_path / "archive"))
+
+    assert entry['base_name'] == "2024-03-01_07-15-00"
+    assert entry['samples'] == 3
+    assert entry['distance_m'] == 16
+    assert entry['channels'] == ['alt', 'dist', 'pwr']
+
+    with RideArchive(str(tmp_path / "archive")).open(entry) as archived:
+        assert len(archived) == 3
+        assert archived.channels == ['alt', 'dist', 'pwr']
+        assert archived.column('hr') is None
+        values, present = archived.column('pwr')
+        assert list(values) == [200.0, 0.0, 250.0]
+        assert list(present) == [1, 0, 1]
+        assert list(archived.columns['timeoffset']) == [0.0, 1.5, 3.0]
+
+def test_archived_ride_converts_like_the_original(gappy_ride, tmp_pwx_file, tmp_path):
+    for source in (gappy_ride, tmp_pwx_file):
+        ride = read_pwx(source)
+        entry = write_ride(ride, str(tmp_path / "archive"))
+        with RideArchive(str(tmp_path / "archive")).open(entry) as archived:
+            rebuilt = archived.to_ride()
+
+        assert rebuilt.base_name == ride.base_name
+        assert rebuilt.fingerprint == ride.fingerprint
+        for convert, suffix in ((convert_pwx_to_tcx, "tcx"), (convert_pwx_to_fit, "fit")):
+            original, from_archive = str(tmp_path / f"a.{suffix}"), str(tmp_path / f"b.{suffix}")
+            convert(source, original, ride=ride)
+            convert(source, from_archive, ride=rebuilt)
+            with open(original, 'rb') as a, open(from_archive, 'rb') as b:
+                assert a.read() == b.read()
+
+def test_manifest(gappy_ride, tmp_pwx_file, tmp_path):
+    archive = RideArchive(str(tmp_path / "archive"))
+    assert archive.rides() == []
+
+    for source in (tmp_pwx_file, gappy_ride, gappy_ride):
+        archive.add(write_ride(read_pwx(source), archive.path))
+    with open(archive.manifest_path, 'a') as f:
+        f.write('{"base_name": "torn')  # crash mid-append
+
+    rides = archive.rides()
+    assert [ride['base_name'] for ride in rides] == ["2024-03-01_07-15-00", "2025-12-03_05-48-22"]
+    since = datetime.datetime.fromisoformat(rides[1]['start'])
+    assert [ride['base_name'] for ride in archive.rides(since=since)] == ["2025-12-03_05-48-22"]
+    assert [ride['base_name'] for ride in archive.rides(until=since)] == ["2024-03-01_07-15-00"]
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "bogus.cols"
+    path.write_bytes(b"not an archive file at all")
+    with pytest.raises(ValueError):
+        ArchivedRide(str(path))
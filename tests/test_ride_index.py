@@ -0,0 +1,109 @@
+import os
+import sys
+import datetime
+import pytest
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import ride_index
+from pwx_reader import read_pwx
+from ride_index import RideIndex, ride_stats, index_archive
+from ride_archive import RideArchive, write_ride
+
+def make_ride(make_pwx, start, samples, athlete=None):
+    """A parsed ride from (timeoffset, watts, bpm, distance) samples."""
+    return read_pwx(make_pwx(start, samples, channels=('pwr', 'hr', 'dist'), athlete=athlete))
+
+def steady(minutes, watts, bpm, speed=8):
+    return [(t, watts, bpm, t * speed) for t in range(0, minutes * 60 + 1, 10)]
+
+@pytest.fixture
+def index(tmp_path):
+    index = RideIndex(str(tmp_path / "rides.sqlite3"))
+    yield index
+    index.close()
+
+def test_ride_stats(tmp_path, make_pwx, tmp_pwx_file):
+    stats = ride_stats(read_pwx(tmp_pwx_file))
+    assert stats['base_name'] == "2025-12-03_05-48-22"
+    assert stats['day'] == "2025-12-03"
+    assert stats['rider'] is None
+    assert stats['duration_s'] == 60
+    assert stats['distance_m'] == 200
+    assert stats['elevation_gain_m'] == 10
+    assert (stats['avg_power'], stats['max_power']) == (210, 220)
+    assert (stats['avg_hr'], stats['max_hr']) == (130, 140)
+    assert (stats['avg_cadence'], stats['max_cadence']) == (85, 90)
+    # 200 W for 30 s, then 210 W for 30 s
+    assert stats['work_kj'] == 12.3
+
+    ride = make_ride(make_pwx, "2025-01-06T07:00:00", [(0, 0, 100, 0)], athlete="Jane")
+    ride.samples.present['pwr'][0] = 0
+    stats = ride_stats(ride)
+    assert stats['rider'] == "Jane"
+    assert stats['avg_power'] is None and stats['work_kj'] is None
+
+def test_add_replaces_and_uses_default_rider(tmp_path, make_pwx, index):
+    ride = make_ride(make_pwx, "2025-01-06T07:00:00", steady(60, 200, 140))
+    index.add(ride_stats(ride), filename="a.pwx", rider="Sam")
+    index.add(ride_stats(ride), filename="a-again.pwx", rider="Sam")
+    rides = index.rides()
+    assert len(rides) == 1
+    assert rides[0]['filename'] == "a-again.pwx"
+    assert rides[0]['rider'] == "Sam"
+
+    named = make_ride(make_pwx, "2025-01-07T07:00:00", steady(30, 300, 160), athlete="Jane")
+    index.add(ride_stats(named), rider="Sam")
+    assert index.get(named.base_name)['rider'] == "Jane"
+
+def test_totals_by_period_and_rider(tmp_path, make_pwx, index):
+    # Monday and Sunday of one week, Monday of the next, and a ride in February
+    for start, minutes, watts, athlete in [("2025-01-06T07:00:00", 60, 200, "Jane"),
+                                           ("2025-01-12T18:00:00", 30, 300, "Sam"),
+                                           ("2025-01-13T07:00:00", 60, 100, "Jane"),
+                                           ("2025-02-01T07:00:00", 90, 150, "Jane")]:
+        index.add(ride_stats(make_ride(make_pwx, start, steady(minutes, watts, 140), athlete)))
+
+    weeks = index.totals(by='week')
+    assert [(row['period'], row['rides']) for row in weeks] == [
+        ("2025-01-06", 2), ("2025-01-13", 1), ("2025-01-27", 1)]
+    assert weeks[0]['duration_s'] == 90 * 60
+    # Weighted by duration: (60 * 200 + 30 * 300) / 90
+    assert weeks[0]['avg_power'] == pytest.approx(233.3, abs=0.1)
+    assert weeks[0]['distance_m'] == (3600 + 1800) * 8
+
+    months = index.totals(by='month', per_rider=True)
+    assert [(row['period'], row['rider'], row['rides']) for row in months] == [
+        ("2025-01", "Jane", 2), ("2025-01", "Sam", 1), ("2025-02", "Jane", 1)]
+
+    riders = index.totals(by=None, per_rider=True)
+    assert [(row['rider'], row['rides']) for row in riders] == [("Jane", 3), ("Sam", 1)]
+
+    jane = index.totals(by='year', rider="Jane", since=datetime.date(2025, 1, 10), until=datetime.date(2025, 2, 1))
+    assert [(row['period'], row['rides']) for row in jane] == [("2025", 1)]
+    assert index.totals(by='week', rider="Nobody") == []
+
+def test_index_archive(tmp_path, make_pwx, index):
+    archive = RideArchive(str(tmp_path / "archive"))
+    ride = make_ride(make_pwx, "2025-01-06T07:00:00", steady(10, 250, 150), athlete="Jane")
+    archive.add(write_ride(ride, archive.path))
+
+    assert index_archive(index, archive.path) == 1
+    row = index.get(ride.base_name)
+    expected = ride_stats(ride)
+    assert {field: row[field] for field in expected} == expected
+
+def test_report(tmp_path, make_pwx, capsys):
+    path = str(tmp_path / "rides.sqlite3")
+    assert ride_index.main([path]) == 1
+    assert "No rides found." in capsys.readouterr().out
+
+    archive = RideArchive(str(tmp_path / "archive"))
+    archive.add(write_ride(make_ride(make_pwx, "2025-01-06T07:00:00", steady(90, 250, 150), "Jane"), archive.path))
+    assert ride_index.main([path, '--from-archive', archive.path, '--by', 'month', '--riders']) == 0
+    out = capsys.readouterr().out
+    assert "Indexed 1 ride(s)" in out
+    assert "2025-01" in out and "Jane" in out and "1:30" in out and "250" in out
+
+    assert ride_index.main([path, '--by', 'all', '--since', '2025-02-01']) == 1
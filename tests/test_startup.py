@@ -0,0 +1,43 @@
+import os
+import sys
+import subprocess
+
+# Add project root and benchmarks to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import monitor_and_convert
+from import_time import DEFERRED_MODULES, MODULE, measure, parse_importtime
+
+def test_heavy_modules_load_on_first_use():
+    modules = measure()
+    assert MODULE in modules
+    assert [name for name in DEFERRED_MODULES if name in modules] == []
+
+def test_import_ignores_command_line():
+    # Importing must not parse argv (pytest's, or anything else's)
+    code = "import sys; sys.argv = ['monitor', '--no-such-flag']; import monitor_and_convert"
+    completed = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(monitor_and_convert.__file__),
+                               capture_output=True, text=True)
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout == ""
+
+def test_configure_from_command_line(tmp_path, monkeypatch):
+    # Every global configure() assigns, so none of them leak into later tests
+    for name in ('BASE_DIRECTORY', 'WORKERS', 'JOURNAL_PATH', 'RIDE_INDEX_PATH', 'strava_uploader'):
+        monkeypatch.setattr(monitor_and_convert, name, getattr(monitor_and_convert, name))
+    monkeypatch.delenv('JOURNAL_PATH', raising=False)
+    monkeypatch.delenv('RIDE_INDEX_PATH', raising=False)
+
+    monitor_and_convert.configure([str(tmp_path), '--workers', '3'])
+
+    assert monitor_and_convert.BASE_DIRECTORY == str(tmp_path)
+    assert monitor_and_convert.WORKERS == 3
+    assert monitor_and_convert.JOURNAL_PATH == os.path.join(str(tmp_path), 'velotron_journal.sqlite3')
+    assert monitor_and_convert.RIDE_INDEX_PATH == os.path.join(str(tmp_path), 'velotron_rides.sqlite3')
+
+def test_parse_importtime():
+    stderr = ("import time: self [us] | cumulative | imported package\n"
+              "import time:       120 |        120 |   dir_watcher\n"
+              "import time:      2000 |       5000 | monitor_and_convert\n")
+    assert parse_importtime(stderr) == {'dir_watcher': (120, 120), 'monitor_and_convert': (2000, 5000)}
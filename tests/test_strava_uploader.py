@@ -1,6 +1,8 @@
 import pytest
 import sys
 import os
+import time
+import threading
 from unittest.mock import MagicMock, patch
 
 # Add project root to path
@@ -13,7 +15,7 @@ def uploader():
     return StravaUploader("client_id", "client_secret", "refresh_token")
 
 def test_refresh_access_token_success(uploader):
-    with patch('requests.post') as mock_post:
+    with patch.object(uploader.session, 'post') as mock_post:
         mock_response = MagicMock()
         mock_response.status_code = 200
         mock_response.json.return_value = {
@@ -28,7 +30,7 @@ def test_refresh_access_token_success(uploader):
         assert uploader.refresh_token == 'new_refresh_token'
 
 def test_refresh_access_token_failure(uploader):
-    with patch('requests.post') as mock_post:
+    with patch.object(uploader.session, 'post') as mock_post:
         mock_response = MagicMock()
         mock_response.status_code = 400
         mock_response.json.return_value = {'message': 'Bad Request'}
@@ -47,7 +49,7 @@ def test_upload_file_success(uploader, tmp_path):
     test_file.write_text("fake tcx content")
     
     with patch.object(uploader, 'ensure_token', return_value=True):
-        with patch('requests.post') as mock_post:
+        with patch.object(uploader.session, 'post') as mock_post:
             mock_response = MagicMock()
             mock_response.status_code = 201
             mock_response.json.return_value = {'id': 12345}
@@ -56,12 +58,33 @@ def test_upload_file_success(uploader, tmp_path):
             result = uploader.upload_file(str(test_file))
             assert result == 12345
 
+def test_upload_gzipped_file(uploader, tmp_path):
+    from strava_uploader import upload_data_type
+    assert upload_data_type("/c/2025-12-03_05-48-22.FIT.gz") == "fit.gz"
+    assert upload_data_type("/c/ride.tcx") == "tcx"
+    assert upload_data_type("/c/ride.gz") == "gz"
+
+    test_file = tmp_path / "ride.tcx.gz"
+    test_file.write_bytes(b"fake gzip")
+    with patch.object(uploader, 'ensure_token', return_value=True):
+        with patch.object(uploader.session, 'post') as mock_post:
+            mock_post.return_value.status_code = 201
+            mock_post.return_value.headers = {}
+            mock_post.return_value.json.return_value = {'id': 42}
+            assert uploader.upload_file(str(test_file)) == 42
+            assert mock_post.call_args.kwargs['data']['data_type'] == 'tcx.gz'
+
+    bad_file = tmp_path / "ride.pwx.gz"
+    bad_file.write_bytes(b"fake gzip")
+    with patch.object(uploader, 'ensure_token', return_value=True):
+        assert uploader.upload_file(str(bad_file)) is False
+
 def test_upload_file_duplicate(uploader, tmp_path):
     test_file = tmp_path / "test.fit"
     test_file.write_text("fake fit content")
     
     with patch.object(uploader, 'ensure_token', return_value=True):
-        with patch('requests.post') as mock_post:
+        with patch.object(uploader.session, 'post') as mock_post:
             from requests.exceptions import HTTPError
             mock_response = MagicMock()
             mock_response.status_code = 409
@@ -73,3 +96,62 @@ def test_upload_file_duplicate(uploader, tmp_path):
             
             result = uploader.upload_file(str(test_file))
             assert result == "duplicate"
+
+def test_session_retries_connection_errors_only_for_safe_requests(uploader):
+    adapter = uploader.session.get_adapter("https://www.strava.com/api/v3/uploads")
+    retry = adapter.max_retries
+    assert retry.connect == 3
+    assert retry.is_retry('GET', 503)
+    assert not retry.is_retry('POST', 503)
+
+def test_requests_use_session_with_timeout(uploader):
+    with patch.object(uploader, 'ensure_token', return_value=True):
+        with patch.object(uploader.session, 'get') as mock_get:
+            mock_get.return_value.json.return_value = {'status': 'ready', 'activity_id': 7}
+            assert uploader.check_upload_status(42) == {'status': 'ready', 'activity_id': 7}
+            assert mock_get.call_args.kwargs['timeout'] is not None
+
+def test_concurrent_ensure_token_refreshes_once(uploader):
+    calls = []
+
+    def slow_post(url, **kwargs):
+        calls.append(url)
+        time.sleep(0.05)
+        response = MagicMock()
+        response.status_code = 200
+        response.json.return_value = {'access_token': 'token', 'expires_at': time.time() + 3600}
+        return response
+
+    with patch.object(uploader.session, 'post', side_effect=slow_post):
+        threads = [threading.Thread(target=uploader.ensure_token) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert len(calls) == 1
+    assert uploader.access_token == 'token'
+
+def test_rate_limited_upload_is_reported_not_failed(uploader, tmp_path):
+    from strava_uploader import RATE_LIMITED
+    test_file = tmp_path / "test.fit"
+    test_file.write_text("fake fit content")
+
+    with patch.object(uploader, 'ensure_token', return_value=True):
+        with patch.object(uploader.session, 'post') as mock_post:
+            mock_post.return_value.status_code = 429
+            mock_post.return_value.headers = {'X-RateLimit-Limit': '200,2000', 'X-RateLimit-Usage': '201,500',
+                                              'Retry-After': '120'}
+            assert uploader.upload_file(str(test_file)) == RATE_LIMITED
+
+    assert uploader.rate_limit.delay('upload') > 100
+
+def test_status_poll_reads_rate_limit_headers(uploader):
+    with patch.object(uploader, 'ensure_token', return_value=True):
+        with patch.object(uploader.session, 'get') as mock_get:
+            mock_get.return_value.status_code = 200
+            mock_get.return_value.headers = {'X-RateLimit-Limit': '200,2000', 'X-RateLimit-Usage': '150,1500'}
+            mock_get.return_value.json.return_value = {'status': 'processing'}
+            uploader.check_upload_status(1)
+
+    assert uploader.rate_limit.remaining() == (50, 500)
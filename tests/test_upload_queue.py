@@ -0,0 +1,151 @@
+import os
+import sys
+import threading
+from unittest.mock import MagicMock
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from upload_queue import UploadQueue
+
+class Collector:
+    """Collects on_result callbacks and lets a test wait for a number of them."""
+
+    def __init__(self, expected):
+        self.results = []
+        self.expected = expected
+        self.done = threading.Event()
+
+    def __call__(self, job, outcome, detail):
+        self.results.append((job.name, outcome, detail))
+        if len(self.results) >= self.expected:
+            self.done.set()
+
+def test_upload_polls_until_activity_ready():
+    uploader = MagicMock()
+    uploader.upload_file.return_value = 111
+    uploader.check_upload_status.side_effect = [{'status': 'processing'}, {'activity_id': 999}]
+    collector = Collector(1)
+
+    queue = UploadQueue(uploader, on_result=collector, poll_delays=(0.01, 0.02))
+    queue.submit("/tmp/ride.fit", activity_type="virtualride")
+    assert collector.done.wait(5)
+    queue.stop(timeout=5)
+
+    assert collector.results == [("ride.fit", 'success', 999)]
+    uploader.upload_file.assert_called_once_with("/tmp/ride.fit", activity_type="virtualride")
+    assert uploader.check_upload_status.call_count == 2
+
+def test_submit_does_not_block_on_polling():
+    uploader = MagicMock()
+    uploader.upload_file.side_effect = [1, 2]
+    uploader.check_upload_status.side_effect = lambda upload_id: {'activity_id': upload_id * 10}
+    collector = Collector(2)
+
+    queue = UploadQueue(uploader, on_result=collector, poll_delays=(0.05,))
+    queue.submit("/tmp/a.fit")
+    queue.submit("/tmp/b.fit")
+    assert collector.done.wait(5)
+    queue.stop(timeout=5)
+
+    assert sorted(collector.results) == [("a.fit", 'success', 10), ("b.fit", 'success', 20)]
+
+def test_duplicate_failure_and_timeout_outcomes():
+    uploader = MagicMock()
+    uploader.upload_file.side_effect = ["duplicate", None, 3, 4]
+    uploader.check_upload_status.side_effect = lambda upload_id: (
+        {'error': 'dup.fit duplicate of activity 1'} if upload_id == 3 else {'status': 'processing'})
+    collector = Collector(4)
+
+    queue = UploadQueue(uploader, on_result=collector, poll_delays=(0.01,), max_attempts=2)
+    for name in ("one.fit", "two.fit", "three.fit", "four.fit"):
+        queue.submit(f"/tmp/{name}")
+    assert collector.done.wait(5)
+    queue.stop(timeout=5)
+
+    outcomes = {name: outcome for name, outcome, _ in collector.results}
+    assert outcomes == {"one.fit": 'duplicate', "two.fit": 'failed',
+                        "three.fit": 'duplicate', "four.fit": 'timeout'}
+
+def test_stop_reports_uploads_still_processing():
+    uploader = MagicMock()
+    uploader.upload_file.return_value = 5
+    collector = Collector(1)
+
+    queue = UploadQueue(uploader, on_result=collector, poll_delays=(60,))
+    queue.submit("/tmp/slow.fit")
+    queue.stop(timeout=5)
+
+    assert collector.results == [("slow.fit", 'timeout', None)]
+    uploader.check_upload_status.assert_not_called()
+
+def test_resume_polls_without_reuploading():
+    uploader = MagicMock()
+    uploader.check_upload_status.return_value = {'activity_id': 321}
+    collector = Collector(1)
+
+    queue = UploadQueue(uploader, on_result=collector, poll_delays=(0.01,))
+    queue.resume("/tmp/ride.fit", 77, key="ride.pwx")
+    assert collector.done.wait(5)
+    queue.stop(timeout=5)
+
+    uploader.upload_file.assert_not_called()
+    uploader.check_upload_status.assert_called_once_with(77)
+    assert collector.results == [("ride.fit", 'success', 321)]
+
+def test_on_uploaded_called_with_upload_id():
+    uploader = MagicMock()
+    uploader.upload_file.return_value = 88
+    uploader.check_upload_status.return_value = {'activity_id': 1}
+    uploaded = []
+    collector = Collector(1)
+
+    queue = UploadQueue(uploader, on_result=collector, on_uploaded=lambda job: uploaded.append((job.key, job.upload_id)),
+                        poll_delays=(0.01,))
+    queue.submit("/tmp/ride.fit", key="ride.pwx")
+    assert collector.done.wait(5)
+    queue.stop(timeout=5)
+
+    assert uploaded == [("ride.pwx", 88)]
+
+class FakeLimiter:
+    """Rate limiter stand-in: a fixed delay per request kind."""
+
+    def __init__(self, upload=0.0, poll=0.0):
+        self.delays = {'upload': upload, 'poll': poll}
+
+    def delay(self, kind):
+        return self.delays[kind]
+
+def test_rate_limited_upload_is_retried(monkeypatch):
+    import upload_queue
+    from strava_uploader import RATE_LIMITED
+    monkeypatch.setattr(upload_queue, 'RATE_LIMIT_RETRY', 0.01)
+
+    uploader = MagicMock()
+    uploader.upload_file.side_effect = [RATE_LIMITED, 5]
+    uploader.check_upload_status.return_value = {'activity_id': 50}
+    collector = Collector(1)
+
+    queue = UploadQueue(uploader, on_result=collector, poll_delays=(0.01,), rate_limit=FakeLimiter())
+    queue.submit("/tmp/ride.fit")
+    assert collector.done.wait(5)
+    queue.stop(timeout=5)
+
+    assert uploader.upload_file.call_count == 2
+    assert collector.results == [("ride.fit", 'success', 50)]
+
+def test_polls_wait_while_uploads_are_held_back():
+    uploader = MagicMock()
+    limiter = FakeLimiter(upload=60)
+    collector = Collector(2)
+
+    queue = UploadQueue(uploader, on_result=collector, poll_delays=(0.01,), rate_limit=limiter)
+    queue.resume("/tmp/sent.fit", 7)
+    queue.submit("/tmp/new.fit")
+    queue.stop(timeout=5)
+
+    # Nothing was sent while the budget was exhausted, and nothing failed
+    uploader.upload_file.assert_not_called()
+    uploader.check_upload_status.assert_not_called()
+    assert sorted(outcome for _, outcome, _ in collector.results) == ['deferred', 'timeout']
@@ -0,0 +1,231 @@
+import os
+import time
+import queue
+import threading
+from collections import deque
+
+from rate_limiter import RATE_LIMITED
+
+# Seconds to wait before each status check; the last delay repeats until max_attempts
+DEFAULT_POLL_DELAYS = (3, 5, 10, 20, 40, 60)
+DEFAULT_MAX_ATTEMPTS = 12
+# Retry delay after a 429 when the rate limiter has no better idea
+RATE_LIMIT_RETRY = 60
+
+_STOP = object()
+
+class UploadJob:
+    """A converted ride on its way to Strava."""
+
+    def __init__(self, file_path, activity_type=None, key=None, upload_id=None):
+        self.file_path = file_path
+        self.activity_type = activity_type
+        self.key = key  # caller's handle for the job, e.g. the PWX filename
+        self.upload_id = upload_id
+        self.attempts = 0
+        self.next_check = 0.0
+        # Timings (time.monotonic based), for metrics
+        self.queued_at = time.monotonic()
+        self.accepted_at = self.queued_at if upload_id is not None else None
+        self.upload_seconds = 0.0   # spent sending the file
+        self.poll_seconds = 0.0     # spent in status check requests
+
+    @property
+    def name(self):
+        return os.path.basename(self.file_path)
+
+class UploadQueue:
+    """Upload rides and wait for Strava to process them on a background thread.
+
+    `submit()` returns immediately so the monitor can move on to the next file. The
+    worker uploads queued files in order and polls pending uploads with increasing
+    delays. Each finished job is reported to `on_result(job, outcome, detail)` where
+    outcome is one of 'success' (detail = activity id), 'duplicate', 'failed' (detail =
+    error message), 'timeout' or 'deferred' (stopped while waiting on the rate limit).
+    `on_uploaded(job)` is called once Strava has accepted the file and `job.upload_id`
+    is known.
+
+    With a `rate_limit` (RateLimiter), work that does not fit in Strava's budget is
+    delayed rather than failed: waiting uploads go first, and status polls are held
+    back while any upload is waiting.
+    """
+
+    def __init__(self, uploader, on_result=None, on_uploaded=None, poll_delays=DEFAULT_POLL_DELAYS,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, rate_limit=None):
+        self.uploader = uploader
+        self.on_result = on_result or self.print_result
+        self.on_uploaded = on_uploaded
+        self.poll_delays = poll_delays
+        self.max_attempts = max_attempts
+        self.rate_limit = rate_limit
+        self.queue = queue.Queue()
+        self.uploads = deque()      # jobs waiting to be uploaded
+        self.uploads_ready_at = 0.0
+        self.pending = []           # uploaded jobs waiting for their next status check
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="strava-upload", daemon=True)
+            self.thread.start()
+
+    def submit(self, file_path, activity_type=None, key=None):
+        """Queue a file for upload."""
+        self.start()
+        self.queue.put(UploadJob(file_path, activity_type, key=key))
+
+    def resume(self, file_path, upload_id, key=None):
+        """Pick up polling for an upload Strava already accepted (e.g. before a restart)."""
+        self.start()
+        self.queue.put(UploadJob(file_path, key=key, upload_id=upload_id))
+
+    def stop(self, timeout=None):
+        """Finish queued uploads, then stop. Uploads still being processed are reported as timeouts."""
+        if self.thread is not None:
+            self.queue.put(_STOP)
+            self.thread.join(timeout)
+            self.thread = None
+
+    def depth(self):
+        """Number of uploads queued or still waiting on Strava."""
+        return self.queue.qsize() + len(self.uploads) + len(self.pending)
+
+    def _run(self):
+        while True:
+            wake_times = [job.next_check for job in self.pending]
+            if self.uploads:
+                wake_times.append(self.uploads_ready_at)
+            timeout = max(0.0, min(wake_times) - time.monotonic()) if wake_times else None
+            try:
+                job = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                job = None
+
+            if job is _STOP:
+                self._upload_ready()
+                for waiting in self.uploads:
+                    self._report(waiting, 'deferred', None)
+                for pending in self.pending:
+                    self._report(pending, 'timeout', None)
+                self.uploads.clear()
+                self.pending = []
+                return
+            if job is not None and job.upload_id is not None:
+                self._schedule(job)
+            elif job is not None:
+                self.uploads.append(job)
+            self._upload_ready()
+            self._poll_due()
+
+    def _request_delay(self, kind):
+        return self.rate_limit.delay(kind) if self.rate_limit is not None else 0.0
+
+    def _upload_ready(self):
+        """Upload waiting jobs in order for as long as the rate limit allows."""
+        while self.uploads:
+            now = time.monotonic()
+            if now < self.uploads_ready_at:
+                return
+            delay = self._request_delay('upload')
+            if delay > 0:
+                self._defer_uploads(delay)
+                return
+            job = self.uploads.popleft()
+            if self._upload(job) == RATE_LIMITED:
+                self.uploads.appendleft(job)
+                self._defer_uploads(max(self._request_delay('upload'), RATE_LIMIT_RETRY))
+                return
+
+    def _defer_uploads(self, delay):
+        self.uploads_ready_at = time.monotonic() + delay
+        print(f"  -> Strava rate limit: delaying {len(self.uploads)} upload(s) by {delay:.0f}s")
+
+    def _upload(self, job):
+        start = time.monotonic()
+        try:
+            # Use virtualride type to ensure Strava trusts the elevation data
+            # and doesn't apply map-based correction to static GPS.
+            result = self.uploader.upload_file(job.file_path, activity_type=job.activity_type)
+        except Exception as e:
+            job.upload_seconds = time.monotonic() - start
+            self._report(job, 'failed', f"Strava upload error: {e}")
+            return
+
+        job.upload_seconds = time.monotonic() - start
+        if result == RATE_LIMITED:
+            return result
+        if result == "duplicate":
+            self._report(job, 'duplicate', None)
+        elif result:
+            job.upload_id = result
+            job.accepted_at = time.monotonic()
+            print(f"  -> Strava upload initiated for {job.name} (ID: {result})")
+            if self.on_uploaded:
+                try:
+                    self.on_uploaded(job)
+                except Exception as e:
+                    print(f"  -> Error recording Strava upload for {job.name}: {e}")
+            self._schedule(job)
+        else:
+            self._report(job, 'failed', "Strava upload failed (check logs for details)")
+
+    def _schedule(self, job):
+        delay = self.poll_delays[min(job.attempts, len(self.poll_delays) - 1)]
+        job.next_check = time.monotonic() + delay
+        self.pending.append(job)
+
+    def _poll_due(self):
+        now = time.monotonic()
+        due = [job for job in self.pending if job.next_check <= now]
+        for job in due:
+            # Uploads come first; polls wait for them and for their own share of the budget
+            delay = self.uploads_ready_at - now if self.uploads else self._request_delay('poll')
+            if delay > 0:
+                job.next_check = now + delay
+                continue
+            self.pending.remove(job)
+            job.attempts += 1
+            start = time.monotonic()
+            try:
+                status = self.uploader.check_upload_status(job.upload_id)
+            except Exception as e:
+                status = None
+                print(f"Error checking Strava upload status: {e}")
+            job.poll_seconds += time.monotonic() - start
+
+            if status == RATE_LIMITED:
+                # Doesn't count as an attempt; try again once the window resets
+                job.attempts -= 1
+                job.next_check = time.monotonic() + max(self._request_delay('poll'), RATE_LIMIT_RETRY)
+                self.pending.append(job)
+            elif status and status.get('activity_id'):
+                self._report(job, 'success', status.get('activity_id'))
+            elif status and status.get('error'):
+                err_msg = status.get('error', '')
+                if 'duplicate' in err_msg.lower() or 'already exists' in err_msg.lower():
+                    self._report(job, 'duplicate', None)
+                else:
+                    self._report(job, 'failed', f"Strava Processing Error: {err_msg}")
+            elif job.attempts >= self.max_attempts:
+                self._report(job, 'timeout', None)
+            else:
+                self._schedule(job)
+
+    def _report(self, job, outcome, detail):
+        try:
+            self.on_result(job, outcome, detail)
+        except Exception as e:
+            print(f"  -> Error reporting Strava result for {job.name}: {e}")
+
+    @staticmethod
+    def print_result(job, outcome, detail):
+        if outcome == 'success':
+            print(f"  -> SUCCESS! {job.name} on Strava: https://www.strava.com/activities/{detail}")
+        elif outcome == 'duplicate':
+            print(f"  -> Note: {job.name} is already on Strava (Duplicate).")
+        elif outcome == 'timeout':
+            print(f"  -> {job.name}: Upload still processing - check your Strava account shortly.")
+        elif outcome == 'deferred':
+            print(f"  -> {job.name}: Upload held back by the Strava rate limit; it will be retried on the next start.")
+        else:
+            print(f"  -> {job.name}: {detail}")